@@ -4,14 +4,17 @@ Creates a connectivity matrix and provide methods to get the connectivity
 between two motes.
 
 The connectivity matrix is indexed by source id, destination id and channel.
-Each cell of the matrix is a dict with the fields `pdr` and `rssi`
+It holds the PDR and the RSSI of each link in two arrays of shape
+(motes, motes, channels), or only the links above a PDR and an RSSI floor
+with conn_sparse.
 
 The connectivity matrix can be filled statically at startup or be updated along
 time if a connectivity trace is given.
 
-The propagate() method is called at every slot. It loops through the
-transmissions occurring during that slot and checks if the transmission fails or
-succeeds.
+The propagate() method is called at every slot where some radio is active
+(or at every slot when conn_active_slot_propagation is disabled). It loops
+through the transmissions occurring during that slot and checks if the
+transmission fails or succeeds.
 """
 from __future__ import print_function
 from __future__ import absolute_import
@@ -23,28 +26,612 @@ from builtins import zip
 from builtins import str
 from builtins import object
 from past.utils import old_div
-import copy
 import sys
-import random
 import math
+import bisect
 import gzip
 import datetime as dt
 import json
 import itertools
+import hashlib
+import shutil
 from sklearn.preprocessing import MinMaxScaler
-from . import SimSettings
 from . import SimLog
 from .Mote.Mote import Mote
 from .Mote import MoteDefines as d
-from matplotlib import pyplot as plt
 import numpy as np
 import os
 # =========================== defines =========================================
 
 CONN_TYPE_TRACE = u'trace'
 
+# default directory of the topologies placed by ConnectivityMatrixRandom
+TOPOLOGY_CACHE_DIR = os.path.normpath(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        os.pardir,
+        u'topologies',
+        u'.cache'
+    )
+)
+
+# RSSI and PDR relationship obtained by experiment; dataset was available
+# at the link shown below:
+# http://wsn.eecs.berkeley.edu/connectivity/?dataset=dust
+RSSI_PDR_DUST = {
+        -97:    0.0000,  # this value is not from experiment
+        -96:    0.1494,
+        -95:    0.2340,
+        -94:    0.4071,
+        # <-- 50% PDR is here, at RSSI=-93.6
+        -93:    0.6359,
+        -92:    0.6866,
+        -91:    0.7476,
+        -90:    0.8603,
+        -89:    0.8702,
+        -88:    0.9324,
+        -87:    0.9427,
+        -86:    0.9562,
+        -85:    0.9611,
+        -84:    0.9739,
+        -83:    0.9745,
+        -82:    0.9844,
+        -81:    0.9854,
+        -80:    0.9903,
+        -79:    1.0000,  # this value is not from experiment
+    }
+
 # =========================== helpers =========================================
 
+class MoteGrid(object):
+    """
+    Uniform grid indexing the motes by coordinate, to find the motes within
+    a given distance of a point. The cells are as large as that distance, so
+    the motes within that distance are in the 3x3 cells around the point.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}  # (column, row) -> list of values
+
+    def add(self, coordinate, value):
+        cell = self._get_cell(coordinate)
+        if cell not in self.cells:
+            self.cells[cell] = []
+        self.cells[cell].append(value)
+
+    def get_neighbor_candidates(self, coordinate):
+        """
+        Return the values added at most cell_size away from coordinate,
+        among others.
+        """
+        (column, row) = self._get_cell(coordinate)
+        returnVal = []
+        for neighbor_column in range(column - 1, column + 2):
+            for neighbor_row in range(row - 1, row + 2):
+                returnVal += self.cells.get((neighbor_column, neighbor_row), [])
+        return returnVal
+
+    def _get_cell(self, coordinate):
+        return (
+            int(math.floor(old_div(coordinate[0], self.cell_size))),
+            int(math.floor(old_div(coordinate[1], self.cell_size)))
+        )
+
+def dBm_to_mW_array(dBm):
+    """
+    Convert each value of dBm to mW with math.pow(), as
+    Connectivity._dBm_to_mW() does; np.power() doesn't always give the same
+    last bit. Each distinct value is converted once.
+    """
+    (values, inverse) = np.unique(dBm, return_inverse=True)
+    mW = np.array(
+        [math.pow(10.0, value / 10.0) for value in values.tolist()],
+        dtype=float
+    )
+    return mW[inverse].reshape(np.shape(dBm))
+
+class DenseLinkTable(object):
+    """
+    PDR and RSSI of all the links, in two arrays of shape (motes, motes,
+    channels). Channels are given by their index in the hopping sequence.
+    The RSSI values are also kept in mW, for the interference computations.
+    """
+
+    def __init__(self, num_motes, num_channels, link_none):
+        shape = (num_motes, num_motes, num_channels)
+        self.pdr = np.full(shape, link_none[u'pdr'], dtype=np.float32)
+        self.rssi = np.full(shape, link_none[u'rssi'], dtype=np.float32)
+        self.rssi_mW = np.full(
+            shape,
+            math.pow(10.0, link_none[u'rssi'] / 10.0),
+            dtype=float
+        )
+
+    def get_pdr(self, src_id, dst_id, channel_index):
+        return float(self.pdr[src_id, dst_id, channel_index])
+
+    def get_rssi(self, src_id, dst_id, channel_index):
+        return float(self.rssi[src_id, dst_id, channel_index])
+
+    def get_rssi_mW(self, src_id, dst_id, channel_index):
+        return float(self.rssi_mW[src_id, dst_id, channel_index])
+
+    def set_pdr(self, src_id, dst_id, channel_index, pdr):
+        self.pdr[src_id, dst_id, channel_index] = pdr
+
+    def set_rssi(self, src_id, dst_id, channel_index, rssi):
+        self.rssi[src_id, dst_id, channel_index] = rssi
+        self.rssi_mW[src_id, dst_id, channel_index] = math.pow(
+            10.0,
+            float(self.rssi[src_id, dst_id, channel_index]) / 10.0
+        )
+
+    def get_pdr_array(self, src_ids, dst_ids, channel_index):
+        return self.pdr[
+            src_ids[:, np.newaxis], dst_ids[np.newaxis, :], channel_index
+        ].astype(float)
+
+    def get_rssi_array(self, src_ids, dst_ids, channel_index):
+        return self.rssi[
+            src_ids[:, np.newaxis], dst_ids[np.newaxis, :], channel_index
+        ].astype(float)
+
+    def get_rssi_mW_array(self, src_ids, dst_ids, channel_index):
+        return self.rssi_mW[
+            src_ids[:, np.newaxis], dst_ids[np.newaxis, :], channel_index
+        ]
+
+    def set_links(self, src_ids, dst_ids, channel_indexes, pdr, rssi, rssi_mW=None):
+        if channel_indexes is None:
+            # self.pdr[src_ids, dst_ids] has one row of channels per link
+            if pdr.ndim == 1:
+                pdr = pdr[:, np.newaxis]
+            if rssi.ndim == 1:
+                rssi = rssi[:, np.newaxis]
+            if (rssi_mW is not None) and (rssi_mW.ndim == 1):
+                rssi_mW = rssi_mW[:, np.newaxis]
+            index = (src_ids, dst_ids)
+        else:
+            index = (src_ids, dst_ids, channel_indexes)
+
+        self.pdr[index] = pdr
+        self.rssi[index] = rssi
+        if rssi_mW is None:
+            rssi_mW = dBm_to_mW_array(self.rssi[index])
+        self.rssi_mW[index] = rssi_mW
+
+class SparseLinkTable(object):
+    """
+    PDR and RSSI of the links above a PDR and an RSSI floor; all the other
+    links have the values of link_none. set_links() creates the links whose
+    PDR and RSSI are both above the floors, set_pdr() and set_rssi() the
+    ones whose value is above its floor. Once created, a link is updated
+    whatever the values set.
+
+    The links are rows of arrays of shape (links, channels), found by
+    (src_id, dst_id) in self.rows. The neighbors of the motes are kept in
+    CSR form: the destinations of the links of source s are
+    neighbor_ids[indptr[s]:indptr[s+1]]. The CSR arrays are rebuilt when
+    links were created since they were last built.
+    """
+
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, num_motes, num_channels, link_none, min_pdr, min_rssi):
+        self.num_motes = num_motes
+        self.num_channels = num_channels
+        self.link_none = link_none
+        self.min_pdr = min_pdr
+        self.min_rssi = min_rssi
+
+        self.rows = {}  # (src_id, dst_id) -> row in self.pdr and self.rssi
+        self.pdr = np.full(
+            (self.INITIAL_CAPACITY, num_channels),
+            link_none[u'pdr'],
+            dtype=np.float32
+        )
+        self.rssi = np.full(
+            (self.INITIAL_CAPACITY, num_channels),
+            link_none[u'rssi'],
+            dtype=np.float32
+        )
+        self.none_rssi_mW = math.pow(10.0, link_none[u'rssi'] / 10.0)
+        self.rssi_mW = np.full(
+            (self.INITIAL_CAPACITY, num_channels),
+            self.none_rssi_mW,
+            dtype=float
+        )
+        self.indptr = np.zeros(num_motes + 1, dtype=np.intp)
+        self.neighbor_ids = np.zeros(0, dtype=np.intp)
+        self.link_rows = np.zeros(0, dtype=np.intp)
+        self.link_keys = np.zeros(0, dtype=np.intp)
+        self.csr_is_valid = True
+
+    # === per link
+
+    def get_pdr(self, src_id, dst_id, channel_index):
+        row = self.rows.get((src_id, dst_id))
+        if row is None:
+            return self.link_none[u'pdr']
+        return float(self.pdr[row, channel_index])
+
+    def get_rssi(self, src_id, dst_id, channel_index):
+        row = self.rows.get((src_id, dst_id))
+        if row is None:
+            return self.link_none[u'rssi']
+        return float(self.rssi[row, channel_index])
+
+    def get_rssi_mW(self, src_id, dst_id, channel_index):
+        row = self.rows.get((src_id, dst_id))
+        if row is None:
+            return self.none_rssi_mW
+        return float(self.rssi_mW[row, channel_index])
+
+    def set_pdr(self, src_id, dst_id, channel_index, pdr):
+        row = self._get_row(src_id, dst_id, create=pdr > self.min_pdr)
+        if row is not None:
+            self.pdr[row, channel_index] = pdr
+
+    def set_rssi(self, src_id, dst_id, channel_index, rssi):
+        row = self._get_row(src_id, dst_id, create=rssi > self.min_rssi)
+        if row is not None:
+            self.rssi[row, channel_index] = rssi
+            self.rssi_mW[row, channel_index] = math.pow(
+                10.0,
+                float(self.rssi[row, channel_index]) / 10.0
+            )
+
+    # === bulk
+
+    def get_pdr_array(self, src_ids, dst_ids, channel_index):
+        return self._get_array(
+            self.pdr, self.link_none[u'pdr'], src_ids, dst_ids, channel_index
+        )
+
+    def get_rssi_array(self, src_ids, dst_ids, channel_index):
+        return self._get_array(
+            self.rssi, self.link_none[u'rssi'], src_ids, dst_ids, channel_index
+        )
+
+    def get_rssi_mW_array(self, src_ids, dst_ids, channel_index):
+        return self._get_array(
+            self.rssi_mW, self.none_rssi_mW, src_ids, dst_ids, channel_index
+        )
+
+    def set_links(self, src_ids, dst_ids, channel_indexes, pdr, rssi, rssi_mW=None):
+        num_links = len(src_ids)
+        (pdr, rssi) = np.broadcast_arrays(pdr, rssi)
+        if pdr.ndim < 2:
+            pdr = np.broadcast_to(pdr, (num_links,))
+            rssi = np.broadcast_to(rssi, (num_links,))
+        # a link with one value per channel is created when one of its
+        # channels is above the floor
+        create = (pdr > self.min_pdr) & (rssi > self.min_rssi)
+        if create.ndim == 2:
+            create = create.any(axis=1)
+
+        # links to set; the links below the floor are only updated
+        links = []
+        rows = []
+        for (i, link) in enumerate(zip(src_ids.tolist(), dst_ids.tolist())):
+            row = self._get_row(link[0], link[1], create=create[i])
+            if row is not None:
+                links.append(i)
+                rows.append(row)
+
+        if rssi_mW is not None:
+            rssi_mW = np.broadcast_to(rssi_mW, pdr.shape)[links]
+        if channel_indexes is None:
+            index = (rows,)
+            if pdr.ndim == 1:
+                # the same values on all the channels
+                (pdr, rssi) = (pdr[:, np.newaxis], rssi[:, np.newaxis])
+                if rssi_mW is not None:
+                    rssi_mW = rssi_mW[:, np.newaxis]
+        else:
+            index = (rows, channel_indexes[links])
+        self.pdr[index] = pdr[links]
+        self.rssi[index] = rssi[links]
+        if rssi_mW is None:
+            rssi_mW = dBm_to_mW_array(self.rssi[index])
+        self.rssi_mW[index] = rssi_mW
+
+    # === neighbors
+
+    def get_neighbors(self, src_id):
+        """
+        Return the ids of the destinations of the links of src_id.
+        """
+        if not self.csr_is_valid:
+            self._build_csr()
+        return self.neighbor_ids[self.indptr[src_id]:self.indptr[src_id + 1]]
+
+    # === private
+
+    def _get_row(self, src_id, dst_id, create):
+        row = self.rows.get((src_id, dst_id))
+        if (row is None) and create:
+            row = len(self.rows)
+            if row == len(self.pdr):
+                self._grow()
+            self.rows[(src_id, dst_id)] = row
+            self.csr_is_valid = False
+        return row
+
+    def _grow(self):
+        new_rows = len(self.pdr)
+        self.pdr = np.concatenate([
+            self.pdr,
+            np.full((new_rows, self.num_channels), self.link_none[u'pdr'], dtype=np.float32)
+        ])
+        self.rssi = np.concatenate([
+            self.rssi,
+            np.full((new_rows, self.num_channels), self.link_none[u'rssi'], dtype=np.float32)
+        ])
+        self.rssi_mW = np.concatenate([
+            self.rssi_mW,
+            np.full((new_rows, self.num_channels), self.none_rssi_mW, dtype=float)
+        ])
+
+    def _get_array(self, values, default, src_ids, dst_ids, channel_index):
+        if not self.csr_is_valid:
+            self._build_csr()
+        returnVal = np.full(
+            (len(src_ids), len(dst_ids)),
+            default,
+            dtype=float
+        )
+        if len(self.link_keys) == 0:
+            return returnVal
+
+        # the links of the CSR arrays are sorted by src_id * num_motes +
+        # dst_id; look up the ones of the pairs with a binary search
+        keys = (
+            src_ids[:, np.newaxis] * self.num_motes + dst_ids[np.newaxis, :]
+        )
+        positions = np.searchsorted(self.link_keys, keys)
+        positions[positions == len(self.link_keys)] = 0
+        found = self.link_keys[positions] == keys
+        returnVal[found] = values[self.link_rows[positions[found]], channel_index]
+        return returnVal
+
+    def _build_csr(self):
+        links = sorted(self.rows.items())
+        src_dst = np.array(
+            [link for (link, _) in links],
+            dtype=np.intp
+        ).reshape(-1, 2)
+        self.indptr = np.zeros(self.num_motes + 1, dtype=np.intp)
+        np.cumsum(
+            np.bincount(src_dst[:, 0], minlength=self.num_motes),
+            out=self.indptr[1:]
+        )
+        self.neighbor_ids = src_dst[:, 1].copy()
+        # row in self.pdr and self.rssi of each link, and its key for
+        # _get_array()
+        self.link_rows = np.array([row for (_, row) in links], dtype=np.intp)
+        self.link_keys = src_dst[:, 0] * self.num_motes + src_dst[:, 1]
+        self.csr_is_valid = True
+
+class K7TraceReader(object):
+    """
+    Reads the rows of a K7 connectivity trace file, a given number at a
+    time, into one array per column (see COLUMNS). The dates are turned
+    into ASNs of slot_duration. The rows up to the first link appearing
+    twice initialize the connectivity matrix: they get ASN 0.
+
+    A reader can be pickled; the unpickled reader opens the file again and
+    goes on from the same row.
+    """
+
+    # columns and their types; the channel of a row without channel, which
+    # applies to all the channels, is CHANNEL_ALL
+    COLUMNS = [
+        (u'asn',     np.int64),
+        (u'src_id',  np.int32),
+        (u'dst_id',  np.int32),
+        (u'channel', np.int32),
+        (u'pdr',     np.float32),
+        (u'rssi',    np.float32),
+    ]
+    CHANNEL_ALL = -1
+
+    def __init__(self, file_path, slot_duration, rssi_none):
+        self.file_path = file_path
+        self.slot_duration = slot_duration
+        self.rssi_none = rssi_none
+
+        self.num_rows_read = 0
+        self.last_asn = 0
+        self.is_at_end = False
+        # the rows are sorted by date and share few dates; parse a date
+        # only when it changes
+        self.last_date = None
+        # links of the rows of the initialization; None once it's done
+        self.initialized_links = set([])
+
+        self._open()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state[u'tracefile']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.is_at_end:
+            self.tracefile = None
+        else:
+            self._open()
+            for _ in itertools.islice(self.tracefile, self.num_rows_read):
+                pass
+
+    def read(self, num_rows=None):
+        """
+        Return the next num_rows rows, or all the remaining rows when
+        num_rows is None; fewer rows, or none, at the end of the file.
+        """
+        columns = dict((name, []) for (name, _) in self.COLUMNS)
+        if self.is_at_end:
+            lines = []
+        else:
+            lines = itertools.islice(self.tracefile, num_rows)
+
+        for line in lines:
+            vals = line.strip().split(u',')
+
+            date = vals[self.index[u'datetime']]
+            if date != self.last_date:
+                time_delta = dt.datetime.strptime(
+                    date,
+                    u'%Y-%m-%dT%H:%M:%S.%f'
+                ) - self.start_date
+                self.last_date = date
+                self.last_date_asn = int(
+                    time_delta.total_seconds() /
+                    float(self.slot_duration)
+                )
+            asn = self.last_date_asn
+
+            src_id = int(vals[self.index[u'src']])
+            dst_id = int(vals[self.index[u'dst']])
+            if vals[self.index[u'channel']]:
+                channel = int(vals[self.index[u'channel']])
+            else:
+                channel = self.CHANNEL_ALL
+
+            mean_rssi = vals[self.index[u'mean_rssi']]
+            if mean_rssi == u'' or (mean_rssi == u'None'):
+                rssi = self.rssi_none
+            else:
+                rssi = float(mean_rssi)
+
+            if self.initialized_links is not None:
+                link = (src_id, dst_id, channel)
+                if link in self.initialized_links:
+                    # we've already initlized this link
+                    # we don't need to keep the links any more
+                    self.initialized_links = None
+                else:
+                    # this link has not been initialized. for this
+                    # purpose, set ASN 0 to this row so that this
+                    # row will be used to in the first _update()
+                    # call
+                    asn = 0
+                    # add the link to the list
+                    self.initialized_links.add(link)
+
+            columns[u'asn'].append(asn)
+            columns[u'src_id'].append(src_id)
+            columns[u'dst_id'].append(dst_id)
+            columns[u'channel'].append(channel)
+            columns[u'pdr'].append(float(vals[self.index[u'pdr']]))
+            columns[u'rssi'].append(rssi)
+
+        rows = dict(
+            (name, np.array(columns[name], dtype=dtype))
+            for (name, dtype) in self.COLUMNS
+        )
+        num_rows_read = len(rows[u'asn'])
+        if num_rows_read:
+            if (
+                    (rows[u'asn'][0] < self.last_asn)
+                    or
+                    np.any(np.diff(rows[u'asn']) < 0)
+                ):
+                raise ValueError(
+                    u'The rows of the trace file must be sorted by date'
+                )
+            self.last_asn = int(rows[u'asn'][-1])
+            self.num_rows_read += num_rows_read
+
+        if (num_rows is None) or (num_rows_read < num_rows):
+            self.close()
+
+        return rows
+
+    def close(self):
+        if self.tracefile is not None:
+            self.tracefile.close()
+            self.tracefile = None
+        self.is_at_end = True
+
+    def _open(self):
+        self.tracefile = gzip.open(self.file_path, u'rt', encoding=u'utf-8')
+        self.header = json.loads(self.tracefile.readline())
+        csv_header = self.tracefile.readline().strip().split(u',')
+        self.index = dict((name, i) for (i, name) in enumerate(csv_header))
+        self.start_date = dt.datetime.strptime(
+            self.header[u'start_date'],
+            u'%Y-%m-%dT%H:%M:%S.%f'
+        )
+
+class RssiPdrTable(object):
+    """
+    PDR as a function of the RSSI, interpolated linearly between the points
+    of an experimental dataset (RSSI in dBm -> PDR), which don't need to be
+    integers. get_pdr() looks up the points around an RSSI value with a
+    binary search, get_pdr_array() interpolates an array of RSSI values at
+    once. Below the lowest RSSI of the dataset, where the PDR must be 0, the
+    PDR is 0; from the highest one, it's the PDR of the highest one.
+    """
+
+    def __init__(self, rssi_pdr):
+        rssi_values = sorted(rssi_pdr)
+        pdr_values = [rssi_pdr[rssi] for rssi in rssi_values]
+        assert pdr_values[0] == 0
+        assert all(0 <= pdr <= 1.0 for pdr in pdr_values)
+
+        self.min_rssi = rssi_values[0]
+
+        # the points of the dataset, and the increase of the PDR per dB up
+        # to the next point
+        self.rssi_values = np.array(rssi_values, dtype=float)
+        self.pdr_values = np.array(pdr_values, dtype=float)
+        self.rssis = self.rssi_values.tolist()
+        self.pdrs = self.pdr_values.tolist()
+        self.slopes = [
+            (pdr_high - pdr_low) / (rssi_high - rssi_low)
+            for (rssi_low, rssi_high, pdr_low, pdr_high) in zip(
+                self.rssis[:-1], self.rssis[1:],
+                self.pdrs[:-1], self.pdrs[1:]
+            )
+        ]
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Load a dataset from a JSON file holding an object which maps RSSI
+        values (dBm) to PDR values, e.g. {"-97": 0.0, "-96": 0.15, ...}.
+        """
+        with open(file_path, u'r') as f:
+            rssi_pdr = json.load(f)
+        return cls(dict((float(rssi), pdr) for (rssi, pdr) in rssi_pdr.items()))
+
+    def get_pdr(self, rssi):
+        # index of the highest point at or below rssi
+        index = bisect.bisect_right(self.rssis, rssi) - 1
+        if index < 0:
+            return 0.0
+        elif index >= len(self.slopes):
+            return self.pdrs[-1]
+        else:
+            # linear interpolation
+            return (
+                self.slopes[index] * (rssi - self.rssis[index]) +
+                self.pdrs[index]
+            )
+
+    def get_pdr_array(self, rssi):
+        """
+        Same as get_pdr() for an array of RSSI values.
+        """
+        return np.interp(rssi, self.rssi_values, self.pdr_values)
+
+# the dataset used unless conn_rssi_pdr_table is set
+DUST_RSSI_PDR_TABLE = RssiPdrTable(RSSI_PDR_DUST)
+
 # =========================== classes =========================================
 
 
@@ -52,6 +639,7 @@ class Connectivity(object):
     # ===== start singleton
     _instance = None
     _init = False
+    _independent = False # set on instances returned by create()
 
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
@@ -68,16 +656,61 @@ class Connectivity(object):
         cls._init = True
         # ==== end singleton
 
-        # store params
+        self._initialize(sim_engine)
+
+    @classmethod
+    def create(cls, sim_engine):
+        """
+        Return a new connectivity for sim_engine, independent of the
+        singleton (see SimContext).
+        """
+        self = super(Connectivity, cls).__new__(cls)
+        self._independent = True
+        self._initialize(sim_engine)
+        return self
 
-        # singletons (quicker access, instead of recreating every time)
+    def _initialize(self, sim_engine):
+
+        # store params
         assert sim_engine
-        self.settings = SimSettings.SimSettings()
+        self.settings = sim_engine.context.settings
         self.engine = sim_engine
-        self.log = SimLog.SimLog().log
+        self.log = sim_engine.context.log
+        self.random = sim_engine.context.random
 
         # short-hands and local variables
         self.num_channels = self.settings.phy_numChans
+        self.active_slot_propagation = getattr(
+            self.settings,
+            u'conn_active_slot_propagation',
+            True
+        )
+        self.active_mote_ids = []  # motes whose radio is on in this slot
+
+        # RSSI to PDR relationship, the dust dataset unless a JSON file with
+        # another one is given
+        rssi_pdr_table_file = getattr(
+            self.settings,
+            u'conn_rssi_pdr_table',
+            None
+        )
+        if rssi_pdr_table_file is None:
+            self.rssi_pdr_table = DUST_RSSI_PDR_TABLE
+        else:
+            self.rssi_pdr_table = RssiPdrTable.load(rssi_pdr_table_file)
+
+        # decide the receptions of all the listeners of a channel at once,
+        # with random values drawn from a NumPy generator seeded with the
+        # random seed of the run
+        self.vectorized_propagation = getattr(
+            self.settings,
+            u'conn_vectorized_propagation',
+            False
+        )
+        if self.vectorized_propagation:
+            self.np_random = np.random.default_rng(sim_engine.random_seed)
+        else:
+            self.np_random = None
 
         # instantiate a connectivity matrix
         conn_class_name = self.settings.conn_class
@@ -85,13 +718,26 @@ class Connectivity(object):
         matrix_class = getattr(sys.modules[__name__], matrix_class_name)
         self.matrix = matrix_class(self)
 
-        # schedule propagation task
-        self._schedule_propagate()
+        # schedule propagation task; with active-slot propagation, it's
+        # scheduled by register_active_radio() instead
+        if not self.active_slot_propagation:
+            self._schedule_propagate()
 
     def destroy(self):
-        cls = type(self)
-        cls._instance = None
-        cls._init = False
+        if not self._independent:
+            cls = type(self)
+            cls._instance = None
+            cls._init = False
+
+    def reseed(self):
+        """
+        Reseed the NumPy generators of the connectivity from the random
+        seed of the engine, once the engine is reseeded (see
+        SimSnapshot.restore()).
+        """
+        if self.np_random is not None:
+            self.np_random = np.random.default_rng(self.engine.random_seed)
+        self.matrix.reseed()
 
     def get_pdr(self, src_id, dst_id, channel):
         assert isinstance(src_id, int)
@@ -107,6 +753,22 @@ class Connectivity(object):
 
         return self.matrix.get_rssi(src_id, dst_id, channel)
 
+    def register_active_radio(self, mote_id):
+        """
+        Called by a radio entering TX or RX; schedules propagate() for the
+        current slot when the first radio of the slot registers.
+        """
+        if not self.active_slot_propagation:
+            return
+
+        if not self.active_mote_ids:
+            self.engine.scheduleInCurrentSlot(
+                cb=self.propagate,
+                uniqueTag=(None, u'Connectivity.propagate'),
+                intraSlotOrder=d.INTRASLOTORDER_PROPAGATE,
+            )
+        self.active_mote_ids.append(mote_id)
+
     def propagate(self):
         """ Simulate the propagation of frames in a slot. """
 
@@ -114,12 +776,23 @@ class Connectivity(object):
         asn = self.engine.getAsn()
         slotOffset = asn % self.settings.tsch_slotframeLength
 
+        # motes to consider; keep them sorted by id so that random values are
+        # drawn in the same order in both modes
+        if self.active_slot_propagation:
+            motes = [
+                self.engine.motes[mote_id]
+                for mote_id in sorted(self.active_mote_ids)
+            ]
+            self.active_mote_ids = []
+        else:
+            motes = self.engine.motes
+
         # get all motes TXing or RXing on this slot organized by channel
         transmissions_by_channel = {}
         receivers_by_channel = {}
 
         # organize all transmissions and receptions by channel
-        for mote in self.engine.motes:
+        for mote in motes:
             # get all transmissions
             if mote.radio.state == d.RADIO_STATE_TX:
                 assert mote.radio.onGoingTransmission
@@ -174,178 +847,380 @@ class Connectivity(object):
         for channel in set(transmissions_by_channel.keys()) & set(receivers_by_channel.keys()):
             assert channel in d.TSCH_HOPPING_SEQUENCE[:self.num_channels]
 
-            for listener_id in receivers_by_channel[channel]:
-                # list the transmissions that listener can hear and lock to the earliest one
-                lockon_transmission = None
-                lockon_random_value = None
-                interfering_transmissions = []
-                detected_transmissions = 0
-
-                # deal with collisions
-                if len(transmissions_by_channel[channel]) > 1:
-                    for t in transmissions_by_channel[channel]:
-                        # random_value will be used for comparison against PDR
-                        random_value = random.random()
-
-                        peamble_pdr = self.get_pdr(
-                            src_id=t[u'tx_mote_id'],
-                            dst_id=listener_id,
-                            channel=channel,
-                        )
+            if self.vectorized_propagation:
+                self._propagate_channel_vectorized(
+                    channel,
+                    transmissions_by_channel[channel],
+                    receivers_by_channel[channel]
+                )
+            else:
+                self._propagate_channel(
+                    channel,
+                    transmissions_by_channel[channel],
+                    receivers_by_channel[channel]
+                )
+
+            # after processing all listeners send back ACK to transmitter if possible
+            for t in transmissions_by_channel[channel]:
+                # decide whether transmitter received an ACK
+                if t[u'numACKs'] == 0:
+                    isACKed = False
+                elif t[u'numACKs'] == 1:
+                    isACKed = True
+                else:
+                    # we do not expect multiple ACKs (would indicate
+                    # duplicate MAC addresses)
+                    raise SystemError()
+
+                # indicate to source packet was sent
+                self.engine.motes[t[u'tx_mote_id']].radio.txDone(isACKed)
+
+        # verify all radios off
+        for mote in motes:
+            assert mote.radio.state == d.RADIO_STATE_OFF
+            assert mote.radio.channel is None
+
+        # schedule next propagation
+        if not self.active_slot_propagation:
+            self._schedule_propagate()
+
+    def _propagate_channel(self, channel, transmissions, listener_ids):
+        """
+        Decide which transmission each listener of a channel receives,
+        one listener and one transmission at a time.
+        """
+        if self.matrix.is_sparse:
+            # a listener can only hear the transmitters it has a link from;
+            # the other transmissions are skipped without drawing a random
+            # value
+            neighbors = dict(
+                (
+                    t[u'tx_mote_id'],
+                    set(self.matrix.get_neighbors(t[u'tx_mote_id']).tolist())
+                )
+                for t in transmissions
+            )
+        else:
+            neighbors = None
+
+        for listener_id in listener_ids:
+            if neighbors is None:
+                heard_transmissions = transmissions
+            else:
+                heard_transmissions = [
+                    t for t in transmissions
+                    if listener_id in neighbors[t[u'tx_mote_id']]
+                ]
+                if not heard_transmissions:
+                    self.engine.motes[listener_id].radio.rxDone(packet=None)
+                    continue
+
+            # list the transmissions that listener can hear and lock to the earliest one
+            lockon_transmission = None
+            lockon_random_value = None
+            interfering_transmissions = []
+            detected_transmissions = 0
+
+            # deal with collisions
+            if len(transmissions) > 1:
+                for t in heard_transmissions:
+                    # random_value will be used for comparison against PDR
+                    random_value = self.random.random()
+
+                    peamble_pdr = self.get_pdr(
+                        src_id=t[u'tx_mote_id'],
+                        dst_id=listener_id,
+                        channel=channel,
+                    )
 
-                        # you can interpret the following line as decision for
-                        # reception of the preamble of 't'
-                        if random_value > peamble_pdr:
-                            # reception failed, continue to the next transmission
-                            continue
-
-                        # update counter
-                        detected_transmissions += 1
-
-                        # begin locking to the first heard transmission
-                        if lockon_transmission is None:
-                            lockon_transmission = t
-                            lockon_random_value = random_value
-                            continue
-
-                        # then update the locked transmission if it's earlier than the previous earliest
-                        if t[u'txTime'] < lockon_transmission[u'txTime']:
-                            # add previous locked on tranmission to the interference list
-                            interfering_transmissions += [t]
-                            # and lock to the new earliest transmission
-                            lockon_transmission = t
-                            lockon_random_value = random_value
-                        else:
-                            interfering_transmissions += [t]
-
-                    # check if it received anything
+                    # you can interpret the following line as decision for
+                    # reception of the preamble of 't'
+                    if random_value > peamble_pdr:
+                        # reception failed, continue to the next transmission
+                        continue
+
+                    # update counter
+                    detected_transmissions += 1
+
+                    # begin locking to the first heard transmission
                     if lockon_transmission is None:
-                        # nope, set the receiver to idle listen and cotinue to next one
-                        sentAck = self.engine.motes[listener_id].radio.rxDone(
-                            packet=None,
-                        )
+                        lockon_transmission = t
+                        lockon_random_value = random_value
                         continue
 
-                    # something was received, continue execution
-                    self.log(
-                        SimLog.LOG_PROP_INTERFERENCE,
-                        {
-                            u'_mote_id': listener_id,
-                            u'channel': lockon_transmission[u'channel'],
-                            u'lockon_transmission': (
-                                lockon_transmission[u'packet']
-                            ),
-                            u'interfering_transmissions': [
-                                t[u'packet']
-                                for t in interfering_transmissions
-                            ]
-                        }
-                    )
+                    # then update the locked transmission if it's earlier than the previous earliest
+                    if t[u'txTime'] < lockon_transmission[u'txTime']:
+                        # add previous locked on tranmission to the interference list
+                        interfering_transmissions += [t]
+                        # and lock to the new earliest transmission
+                        lockon_transmission = t
+                        lockon_random_value = random_value
+                    else:
+                        interfering_transmissions += [t]
 
-                    # calculate the resulting pdr when taking
-                    # interferers into account
-                    packet_pdr = self._compute_pdr_with_interference(
-                        listener_id=listener_id,
-                        lockon_transmission=lockon_transmission,
-                        interfering_transmissions=interfering_transmissions
+                # check if it received anything
+                if lockon_transmission is None:
+                    # nope, set the receiver to idle listen and cotinue to next one
+                    sentAck = self.engine.motes[listener_id].radio.rxDone(
+                        packet=None,
                     )
+                    continue
 
-                # no collision, easy peasy
-                elif len(transmissions_by_channel[channel]) == 1:
-                    # there's no point in testing the preamble here, so we'll skip it
-                    detected_transmissions = 1
+                # something was received, continue execution
+                self.log(
+                    SimLog.LOG_PROP_INTERFERENCE,
+                    lambda: {
+                        u'_mote_id': listener_id,
+                        u'channel': lockon_transmission[u'channel'],
+                        u'lockon_transmission': (
+                            lockon_transmission[u'packet']
+                        ),
+                        u'interfering_transmissions': [
+                            t[u'packet']
+                            for t in interfering_transmissions
+                        ]
+                    }
+                )
 
-                    lockon_random_value = random.random()
-                    lockon_transmission = transmissions_by_channel[channel][0]
-                    packet_pdr = self.get_pdr(
-                        src_id=lockon_transmission[u'tx_mote_id'],
-                        dst_id=listener_id,
+                # calculate the resulting pdr when taking
+                # interferers into account
+                packet_pdr = self._compute_pdr_with_interference(
+                    listener_id=listener_id,
+                    lockon_transmission=lockon_transmission,
+                    interfering_transmissions=interfering_transmissions
+                )
+
+            # no collision, easy peasy
+            elif len(transmissions) == 1:
+                # there's no point in testing the preamble here, so we'll skip it
+                detected_transmissions = 1
+
+                lockon_random_value = self.random.random()
+                lockon_transmission = heard_transmissions[0]
+                packet_pdr = self.get_pdr(
+                    src_id=lockon_transmission[u'tx_mote_id'],
+                    dst_id=listener_id,
+                    channel=channel
+                )
+
+            # this souldn't really happen
+            else:
+                assert False
+
+            # lockon transmission selected
+            # all other transmissions are now intereferers
+            assert (
+                detected_transmissions ==
+                (len(interfering_transmissions) + 1)
+            )
+
+            # decide whether listener receives
+            # lockon_transmission or not
+            if lockon_random_value < packet_pdr:
+                # listener receives!
+
+                # lockon_transmission received correctly
+                receivedAck = self.engine.motes[listener_id].radio.rxDone(
+                    packet=lockon_transmission[u'packet'],
+                )
+
+                if receivedAck and self.settings.conn_simulate_ack_drop:
+                    pdr_of_return_link = self.get_pdr(
+                        src_id=listener_id,
+                        dst_id=lockon_transmission[u'tx_mote_id'],
                         channel=channel
                     )
+                    receivedAck = self.random.random() < pdr_of_return_link
 
-                # this souldn't really happen
+                if receivedAck:
+                    # keep track of the number of ACKs received by
+                    # that transmission
+                    lockon_transmission[u'numACKs'] += 1
                 else:
-                    assert False
+                    # ACK is lost in the air
+                    pass
+            else:
+                # lockon_transmission NOT received correctly
+                # (interference)
+                receivedAck = self.engine.motes[listener_id].radio.rxDone(
+                    packet=None,
+                )
+                self.log(
+                    SimLog.LOG_PROP_DROP_LOCKON,
+                    lambda: {
+                        u'_mote_id': listener_id,
+                        u'channel': lockon_transmission[u'channel'],
+                        u'lockon_transmission': (
+                            lockon_transmission[u'packet']
+                        )
+                    }
+                )
+                assert receivedAck is False
 
-                # lockon transmission selected
-                # all other transmissions are now intereferers
-                assert (
-                    detected_transmissions ==
-                    (len(interfering_transmissions) + 1)
+            # done processing this listener
+
+    def _propagate_channel_vectorized(self, channel, transmissions, listener_ids):
+        """
+        Same as _propagate_channel(), deciding the receptions of all the
+        listeners of the channel at once. The random values are drawn from
+        self.np_random, one per listener and transmission.
+        """
+        random_values = self.np_random.random(
+            (len(listener_ids), len(transmissions))
+        )
+        (heard, lockon_indexes, interferers, packet_pdr) = self._resolve_receptions(
+            channel,
+            transmissions,
+            listener_ids,
+            random_values
+        )
+        rows = np.arange(len(listener_ids))
+        received = (random_values[rows, lockon_indexes] < packet_pdr).tolist()
+        if self.settings.conn_simulate_ack_drop:
+            ack_random_values = self.np_random.random(len(listener_ids)).tolist()
+
+        # Python lists are faster to go through one item at a time
+        heard = heard.tolist()
+        lockon_indexes = lockon_indexes.tolist()
+        interferers = interferers.tolist()
+
+        for (i, listener_id) in enumerate(listener_ids):
+            radio = self.engine.motes[listener_id].radio
+
+            if not heard[i]:
+                # nothing heard, set the receiver to idle listen
+                radio.rxDone(packet=None)
+                continue
+
+            lockon_transmission = transmissions[lockon_indexes[i]]
+
+            if len(transmissions) > 1:
+                self.log(
+                    SimLog.LOG_PROP_INTERFERENCE,
+                    lambda: {
+                        u'_mote_id': listener_id,
+                        u'channel': lockon_transmission[u'channel'],
+                        u'lockon_transmission': (
+                            lockon_transmission[u'packet']
+                        ),
+                        u'interfering_transmissions': [
+                            t[u'packet']
+                            for (t, is_interferer) in zip(transmissions, interferers[i])
+                            if is_interferer
+                        ]
+                    }
                 )
 
-                # decide whether listener receives
-                # lockon_transmission or not
-                if lockon_random_value < packet_pdr:
-                    # listener receives!
+            if received[i]:
+                receivedAck = radio.rxDone(
+                    packet=lockon_transmission[u'packet'],
+                )
 
-                    # lockon_transmission received correctly
-                    receivedAck = self.engine.motes[listener_id].radio.rxDone(
-                        packet=lockon_transmission[u'packet'],
+                if receivedAck and self.settings.conn_simulate_ack_drop:
+                    pdr_of_return_link = self.get_pdr(
+                        src_id=listener_id,
+                        dst_id=lockon_transmission[u'tx_mote_id'],
+                        channel=channel
                     )
+                    receivedAck = ack_random_values[i] < pdr_of_return_link
 
-                    if receivedAck and self.settings.conn_simulate_ack_drop:
-                        pdr_of_return_link = self.get_pdr(
-                            src_id=listener_id,
-                            dst_id=lockon_transmission[u'tx_mote_id'],
-                            channel=channel
+                if receivedAck:
+                    lockon_transmission[u'numACKs'] += 1
+            else:
+                receivedAck = radio.rxDone(packet=None)
+                self.log(
+                    SimLog.LOG_PROP_DROP_LOCKON,
+                    lambda: {
+                        u'_mote_id': listener_id,
+                        u'channel': lockon_transmission[u'channel'],
+                        u'lockon_transmission': (
+                            lockon_transmission[u'packet']
                         )
-                        receivedAck = random.random() < pdr_of_return_link
+                    }
+                )
+                assert receivedAck is False
 
-                    if receivedAck:
-                        # keep track of the number of ACKs received by
-                        # that transmission
-                        lockon_transmission[u'numACKs'] += 1
-                    else:
-                        # ACK is lost in the air
-                        pass
-                else:
-                    # lockon_transmission NOT received correctly
-                    # (interference)
-                    receivedAck = self.engine.motes[listener_id].radio.rxDone(
-                        packet=None,
-                    )
-                    self.log(
-                        SimLog.LOG_PROP_DROP_LOCKON,
-                        {
-                            u'_mote_id': listener_id,
-                            u'channel': lockon_transmission[u'channel'],
-                            u'lockon_transmission': (
-                                lockon_transmission[u'packet']
-                            )
-                        }
-                    )
-                    assert receivedAck is False
+    def _resolve_receptions(self, channel, transmissions, listener_ids, random_values):
+        """
+        Decide, for each listener of a channel, which transmission it locks
+        on and the PDR of that transmission, given the random values drawn
+        for each listener (row) and transmission (column).
 
-                # done processing this listener
+        Returns four arrays indexed by listener: whether it heard a
+        transmission, the index of the transmission it locks on, the mask
+        of the interfering transmissions and the resulting PDR.
+        """
+        num_listeners = len(listener_ids)
+        rows = np.arange(num_listeners)
+        tx_ids = [t[u'tx_mote_id'] for t in transmissions]
+
+        # (listeners, transmissions)
+        pdr = self.matrix.get_pdr_array(tx_ids, listener_ids, channel).T
+
+        if len(transmissions) == 1:
+            # no collision; there's no point in testing the preamble
+            heard = np.ones(num_listeners, dtype=bool)
+            lockon_indexes = np.zeros(num_listeners, dtype=np.intp)
+            interferers = np.zeros((num_listeners, 1), dtype=bool)
+            return (heard, lockon_indexes, interferers, pdr[:, 0])
+
+        # reception of the preambles; lock on the earliest transmission heard
+        detected = random_values <= pdr
+        heard = detected.any(axis=1)
+        tx_times = np.array([t[u'txTime'] for t in transmissions], dtype=float)
+        lockon_indexes = np.argmin(
+            np.where(detected, tx_times[np.newaxis, :], np.inf),
+            axis=1
+        )
 
-            # after processing all listeners send back ACK to transmitter if possible
-            for t in transmissions_by_channel[channel]:
-                # decide whether transmitter received an ACK
-                if t[u'numACKs'] == 0:
-                    isACKed = False
-                elif t[u'numACKs'] == 1:
-                    isACKed = True
-                else:
-                    # we do not expect multiple ACKs (would indicate
-                    # duplicate MAC addresses)
-                    raise SystemError()
+        # as in _propagate_channel(), the interfering transmissions are the
+        # ones detected after the first detected one
+        interferers = detected.copy()
+        interferers[rows, np.argmax(detected, axis=1)] = False
 
-                # indicate to source packet was sent
-                self.engine.motes[t[u'tx_mote_id']].radio.txDone(isACKed)
+        # === compute the SINR
 
-        # verify all radios off
-        for mote in self.engine.motes:
-            assert mote.radio.state == d.RADIO_STATE_OFF
-            assert mote.radio.channel is None
+        noise_dBm = np.array(
+            [self.engine.motes[i].radio.noisepower for i in listener_ids],
+            dtype=float
+        )
+        noise_mW = np.power(10.0, noise_dBm / 10.0)
+        rssi_mW = self.matrix.get_rssi_mW_array(tx_ids, listener_ids, channel).T
 
-        # schedule next propagation
-        self._schedule_propagate()
+        # S = RSSI - N, I = RSSI - N (not below 0)
+        above_noise_mW = rssi_mW - noise_mW[:, np.newaxis]
+        signal_mW = above_noise_mW[rows, lockon_indexes]
+        interference_mW = np.where(
+            interferers,
+            np.maximum(above_noise_mW, 0.0),
+            0.0
+        ).sum(axis=1)
+
+        with np.errstate(divide=u'ignore', invalid=u'ignore'):
+            sinr_dB = 10 * np.log10(signal_mW / (interference_mW + noise_mW))
+
+            # === compute the interference PDR
+
+            interference_rssi = 10 * np.log10(
+                np.power(10.0, (sinr_dB + noise_dBm) / 10.0) + noise_mW
+            )
+        interference_pdr = self.rssi_pdr_table.get_pdr_array(interference_rssi)
+
+        # === compute the resulting PDR; RSSI has not to be below the noise
+        # level, see _compute_pdr_with_interference()
+
+        packet_pdr = np.where(
+            signal_mW < 0.0,
+            -10.0,
+            pdr[rows, lockon_indexes] * interference_pdr
+        )
+
+        return (heard, lockon_indexes, interferers, packet_pdr)
 
     def _schedule_propagate(self):
         '''
         schedule a propagation task in the middle of the next slot.
-        FIXME: only schedule for next active slot.
+        Only used when conn_active_slot_propagation is disabled.
         '''
         self.engine.scheduleAtAsn(
             asn=self.engine.getAsn() + 1,
@@ -380,14 +1255,15 @@ class Connectivity(object):
 
         # === compute the SINR
 
-        noise_mW = self._dBm_to_mW(
-            self.engine.motes[listener_id].radio.noisepower
-        )
+        noise_dBm = self.engine.motes[listener_id].radio.noisepower
+        noise_mW = self._dBm_to_mW(noise_dBm)
 
         # S = RSSI - N
 
-        signal_mW = self._dBm_to_mW(
-            self.get_rssi(lockon_tx_mote_id, listener_id, channel)
+        signal_mW = self.matrix.get_rssi_mW(
+            lockon_tx_mote_id,
+            listener_id,
+            channel
         )
         signal_mW -= noise_mW
         if signal_mW < 0.0:
@@ -400,8 +1276,10 @@ class Connectivity(object):
         totalInterference_mW = 0.0
         for interfering_tran in interfering_transmissions:
             interfering_tx_mote_id = interfering_tran[u'tx_mote_id']
-            interference_mW = self._dBm_to_mW(
-                self.get_rssi(interfering_tx_mote_id, listener_id, channel)
+            interference_mW = self.matrix.get_rssi_mW(
+                interfering_tx_mote_id,
+                listener_id,
+                channel
             )
             interference_mW -= noise_mW
             if interference_mW < 0.0:
@@ -415,17 +1293,13 @@ class Connectivity(object):
 
         # === compute the interference PDR
 
-        # shorthand
-        noise_dBm = self.engine.motes[listener_id].radio.noisepower
-
         # RSSI of the interfering transmissions
         interference_rssi = self._mW_to_dBm(
-            self._dBm_to_mW(sinr_dB + noise_dBm) +
-            self._dBm_to_mW(noise_dBm)
+            self._dBm_to_mW(sinr_dB + noise_dBm) + noise_mW
         )
 
         # PDR of the interfering transmissions
-        interference_pdr = self._rssi_to_pdr(interference_rssi)
+        interference_pdr = self.rssi_pdr_table.get_pdr(interference_rssi)
 
         # === compute the resulting PDR
 
@@ -447,54 +1321,6 @@ class Connectivity(object):
     def _mW_to_dBm(mW):
         return 10 * math.log10(mW)
 
-    @staticmethod
-    def _rssi_to_pdr(rssi):
-        """
-        rssi and pdr relationship obtained by experiment below
-        http://wsn.eecs.berkeley.edu/connectivity/?dataset=dust
-        """
-
-        rssi_pdr_table = {
-            -97:    0.0000,  # this value is not from experiment
-            -96:    0.1494,
-            -95:    0.2340,
-            -94:    0.4071,
-            # <-- 50% PDR is here, at RSSI=-93.6
-            -93:    0.6359,
-            -92:    0.6866,
-            -91:    0.7476,
-            -90:    0.8603,
-            -89:    0.8702,
-            -88:    0.9324,
-            -87:    0.9427,
-            -86:    0.9562,
-            -85:    0.9611,
-            -84:    0.9739,
-            -83:    0.9745,
-            -82:    0.9844,
-            -81:    0.9854,
-            -80:    0.9903,
-            -79:    1.0000,  # this value is not from experiment
-        }
-
-        minRssi = min(rssi_pdr_table.keys())
-        maxRssi = max(rssi_pdr_table.keys())
-
-        floorRssi = int(math.floor(rssi))
-        if floorRssi < minRssi:
-            pdr = 0.0
-        elif floorRssi >= maxRssi:
-            pdr = 1.0
-        else:
-            pdrLow = rssi_pdr_table[floorRssi]
-            pdrHigh = rssi_pdr_table[floorRssi+1]
-            # linear interpolation
-            pdr = (pdrHigh - pdrLow) * (rssi - float(floorRssi)) + pdrLow
-
-        assert 0 <= pdr <= 1.0
-
-        return pdr
-
 
 class ConnectivityMatrixBase(object):
     LINK_PERFECT = {u'pdr': 1.00, u'rssi': -10}
@@ -506,20 +1332,47 @@ class ConnectivityMatrixBase(object):
         self.engine = connectivity.engine
         self.settings = connectivity.settings
         self.log = connectivity.log
-        self._matrix = {}
+        self.random = connectivity.random
+        self.rssi_pdr_table = connectivity.rssi_pdr_table
 
         # short hands
         self.num_channels = self.settings.phy_numChans
 
-        # at the beginning, connectivity matrix indicates no connectivity at all
-        for src_id in self.mote_id_list:
-            self._matrix[src_id] = {}
-            for dst_id in self.mote_id_list:
-                self._matrix[src_id][dst_id] = {}
-                for channel in d.TSCH_HOPPING_SEQUENCE[:self.num_channels]:
-                    self._matrix[src_id][dst_id][channel] = copy.copy(
-                        self.LINK_NONE
-                    )
+        # the matrix is indexed by mote id, which is the index of the mote in
+        # engine.motes, and by the index of the channel in the hopping
+        # sequence
+        assert self.mote_id_list == list(range(len(self.mote_id_list)))
+        self.channel_index = dict(
+            (channel, index) for (index, channel) in
+            enumerate(d.TSCH_HOPPING_SEQUENCE[:self.num_channels])
+        )
+
+        # at the beginning, connectivity matrix indicates no connectivity at
+        # all; with conn_sparse, only the links above a PDR or RSSI floor are
+        # stored
+        self.is_sparse = getattr(self.settings, u'conn_sparse', False)
+        if self.is_sparse:
+            self.links = SparseLinkTable(
+                num_motes=len(self.mote_id_list),
+                num_channels=self.num_channels,
+                link_none=self.LINK_NONE,
+                min_pdr=getattr(
+                    self.settings,
+                    u'conn_sparse_min_pdr',
+                    self.LINK_NONE[u'pdr']
+                ),
+                min_rssi=getattr(
+                    self.settings,
+                    u'conn_sparse_min_rssi',
+                    self.LINK_NONE[u'rssi']
+                ),
+            )
+        else:
+            self.links = DenseLinkTable(
+                num_motes=len(self.mote_id_list),
+                num_channels=self.num_channels,
+                link_none=self.LINK_NONE,
+            )
 
         self._additional_initialization()
 
@@ -529,24 +1382,122 @@ class ConnectivityMatrixBase(object):
         pass
 
     def set_pdr(self, src_id, dst_id, channel, pdr):
-        self._matrix[src_id][dst_id][channel][u'pdr'] = pdr
+        self.links.set_pdr(src_id, dst_id, self.channel_index[channel], pdr)
 
     def set_pdr_both_directions(self, mote_id_1, mote_id_2, channel, pdr):
-        self._matrix[mote_id_1][mote_id_2][channel][u'pdr'] = pdr
-        self._matrix[mote_id_2][mote_id_1][channel][u'pdr'] = pdr
+        channel_index = self.channel_index[channel]
+        self.links.set_pdr(mote_id_1, mote_id_2, channel_index, pdr)
+        self.links.set_pdr(mote_id_2, mote_id_1, channel_index, pdr)
 
     def get_pdr(self, src_id, dst_id, channel):
-        return self._matrix[src_id][dst_id][channel][u'pdr']
+        return self.links.get_pdr(src_id, dst_id, self.channel_index[channel])
 
     def set_rssi(self, src_id, dst_id, channel, rssi):
-        self._matrix[src_id][dst_id][channel][u'rssi'] = rssi
+        self.links.set_rssi(src_id, dst_id, self.channel_index[channel], rssi)
 
     def set_rssi_both_directions(self, mote_id_1, mote_id_2, channel, rssi):
-        self._matrix[mote_id_1][mote_id_2][channel][u'rssi'] = rssi
-        self._matrix[mote_id_2][mote_id_1][channel][u'rssi'] = rssi
+        channel_index = self.channel_index[channel]
+        self.links.set_rssi(mote_id_1, mote_id_2, channel_index, rssi)
+        self.links.set_rssi(mote_id_2, mote_id_1, channel_index, rssi)
 
     def get_rssi(self, src_id, dst_id, channel):
-        return self._matrix[src_id][dst_id][channel][u'rssi']
+        return self.links.get_rssi(src_id, dst_id, self.channel_index[channel])
+
+    def get_rssi_mW(self, src_id, dst_id, channel):
+        """
+        Return the RSSI of get_rssi() in mW. The values in mW are updated
+        with the RSSIs, not computed for each interference computation.
+        """
+        return self.links.get_rssi_mW(
+            src_id,
+            dst_id,
+            self.channel_index[channel]
+        )
+
+    def get_pdr_array(self, src_ids, dst_ids, channel):
+        """
+        Return the PDRs from each of src_ids (rows) to each of dst_ids
+        (columns) on channel.
+        """
+        return self.links.get_pdr_array(
+            np.asarray(src_ids, dtype=np.intp),
+            np.asarray(dst_ids, dtype=np.intp),
+            self.channel_index[channel]
+        )
+
+    def get_rssi_array(self, src_ids, dst_ids, channel):
+        """
+        Return the RSSIs from each of src_ids (rows) to each of dst_ids
+        (columns) on channel.
+        """
+        return self.links.get_rssi_array(
+            np.asarray(src_ids, dtype=np.intp),
+            np.asarray(dst_ids, dtype=np.intp),
+            self.channel_index[channel]
+        )
+
+    def get_rssi_mW_array(self, src_ids, dst_ids, channel):
+        """
+        Return the RSSIs of get_rssi_array() in mW.
+        """
+        return self.links.get_rssi_mW_array(
+            np.asarray(src_ids, dtype=np.intp),
+            np.asarray(dst_ids, dtype=np.intp),
+            self.channel_index[channel]
+        )
+
+    def get_neighbors(self, src_id):
+        """
+        Return the ids of the motes src_id has a link to. Only available
+        with conn_sparse; all the other motes have LINK_NONE with src_id.
+        """
+        return self.links.get_neighbors(src_id)
+
+    def set_links(self, src_ids, dst_ids, pdr, rssi, channels=None):
+        """
+        Set the PDR and the RSSI of the links from src_ids[i] to dst_ids[i],
+        on channels[i], or on all the channels when channels is None. pdr
+        and rssi are either a value for all the links or one value per link;
+        when channels is None, they can also hold one row per link, of one
+        value per channel of the hopping sequence.
+        """
+        if channels is None:
+            channel_indexes = None
+        else:
+            channel_indexes = np.array(
+                [self.channel_index[channel] for channel in channels],
+                dtype=np.intp
+            )
+
+        self.links.set_links(
+            np.asarray(src_ids, dtype=np.intp),
+            np.asarray(dst_ids, dtype=np.intp),
+            channel_indexes,
+            np.asarray(pdr, dtype=np.float32),
+            np.asarray(rssi, dtype=np.float32)
+        )
+
+    def set_links_both_directions(self, mote_ids_1, mote_ids_2, pdr, rssi, channels=None):
+        """
+        Same as set_links(), for the links in both directions.
+        """
+        pdr = np.asarray(pdr, dtype=np.float32)
+        rssi = np.asarray(rssi, dtype=np.float32)
+        if channels is not None:
+            channels = list(channels) * 2
+
+        self.set_links(
+            src_ids=np.concatenate([mote_ids_1, mote_ids_2]),
+            dst_ids=np.concatenate([mote_ids_2, mote_ids_1]),
+            pdr=np.concatenate([pdr, pdr]) if pdr.ndim else pdr,
+            rssi=np.concatenate([rssi, rssi]) if rssi.ndim else rssi,
+            channels=channels
+        )
+
+    def reseed(self):
+        # the matrices drawing their own random values reseed them here,
+        # from self.random
+        pass
 
     def dump(self):
         output = []
@@ -554,22 +1505,21 @@ class ConnectivityMatrixBase(object):
 
         # header
         line = []
-        for src_id in self._matrix:
+        for src_id in self.mote_id_list:
             line += [str(src_id)]
         line = '\t|'.join(line)
         output += [u'\t|'+line]
 
         # body
         channel = d.TSCH_HOPPING_SEQUENCE[0]
-        for src_id in self._matrix:
+        for src_id in self.mote_id_list:
             line = []
             line += [str(src_id)]
-            for dst_id in self._matrix[src_id]:
+            for dst_id in self.mote_id_list:
                 if src_id == dst_id:
                     line += [u'N/A']
                 else:
-                    line += [str(self._matrix[src_id]
-                                 [dst_id][channel][u'pdr'])]
+                    line += [str(self.get_pdr(src_id, dst_id, channel))]
             line = u'\t|'.join(line)
             output += [line]
 
@@ -583,13 +1533,13 @@ class ConnectivityMatrixFullyMeshed(ConnectivityMatrixBase):
     """
 
     def _additional_initialization(self):
-        perfect_pdr = self.LINK_PERFECT[u'pdr']
-        perfect_rssi = self.LINK_PERFECT[u'rssi']
-        for src_id in self.mote_id_list:
-            for dst_id in self.mote_id_list:
-                for channel in d.TSCH_HOPPING_SEQUENCE[:self.num_channels]:
-                    self.set_pdr(src_id, dst_id, channel, perfect_pdr)
-                    self.set_rssi(src_id, dst_id, channel, perfect_rssi)
+        (src_ids, dst_ids) = np.meshgrid(self.mote_id_list, self.mote_id_list)
+        self.set_links(
+            src_ids.ravel(),
+            dst_ids.ravel(),
+            self.LINK_PERFECT[u'pdr'],
+            self.LINK_PERFECT[u'rssi']
+        )
 
 
 class ConnectivityMatrixLinear(ConnectivityMatrixBase):
@@ -600,25 +1550,12 @@ class ConnectivityMatrixLinear(ConnectivityMatrixBase):
     """
 
     def _additional_initialization(self):
-        perfect_pdr = self.LINK_PERFECT[u'pdr']
-        perfect_rssi = self.LINK_PERFECT[u'rssi']
-        parent_id = None
-        for child_id in self.mote_id_list:
-            if parent_id is not None:
-                for channel in d.TSCH_HOPPING_SEQUENCE[:self.num_channels]:
-                    self.set_pdr_both_directions(
-                        child_id,
-                        parent_id,
-                        channel,
-                        perfect_pdr
-                    )
-                    self.set_rssi_both_directions(
-                        child_id,
-                        parent_id,
-                        channel,
-                        perfect_rssi
-                    )
-            parent_id = child_id
+        self.set_links_both_directions(
+            self.mote_id_list[1:],
+            self.mote_id_list[:-1],
+            self.LINK_PERFECT[u'pdr'],
+            self.LINK_PERFECT[u'rssi']
+        )
 
 
 class ConnectivityMatrixK7(ConnectivityMatrixBase):
@@ -626,6 +1563,9 @@ class ConnectivityMatrixK7(ConnectivityMatrixBase):
     Replay K7 connectivity trace.
     """
 
+    # bump when the format of the converted trace changes
+    TRACE_CACHE_VERSION = 1
+
     def _additional_initialization(self):
         """Fill the matrix using the connectivity trace file.  The
         connectivity matrix is initialized with values representing
@@ -635,94 +1575,85 @@ class ConnectivityMatrixK7(ConnectivityMatrixBase):
         """
 
         # additional local variables
-        self.trace = []
         self.start_date = None
         # the offset at which we stopped reading the trace
         self.trace_position = 0
         self.asn_of_next_update = 0
 
-        # load trace into memory and save metas (headers)
-        with gzip.open(self.settings.conn_trace, u'r') as tracefile:
-            self.trace_header = json.loads(
-                tracefile.readline().decode('utf-8'))
-            self.csv_header = tracefile.readline().decode('utf-8').strip().split(u',')
-            self.start_date = dt.datetime.strptime(
-                self.trace_header[u'start_date'],
-                u'%Y-%m-%dT%H:%M:%S.%f'
+        # load trace (one array per column) and save metas (headers).
+        # with conn_trace_streaming, self.trace only holds the next
+        # conn_trace_read_ahead rows of the trace file, starting at
+        # trace_offset; they're replaced by the following rows once applied
+        self.trace_offset = 0
+        if getattr(self.settings, u'conn_trace_streaming', False):
+            self.trace_reader = K7TraceReader(
+                file_path=self.settings.conn_trace,
+                slot_duration=self.settings.tsch_slotDuration,
+                rssi_none=self.LINK_NONE[u'rssi']
             )
-            stop_date = dt.datetime.strptime(
-                self.trace_header[u'stop_date'],
-                u'%Y-%m-%dT%H:%M:%S.%f'
+            self.read_ahead = getattr(
+                self.settings,
+                u'conn_trace_read_ahead',
+                10000
             )
+            self.trace_header = self.trace_reader.header
+            self.trace = self.trace_reader.read(self.read_ahead)
+        else:
+            self.trace_reader = None
+            (self.trace_header, self.trace) = self._load_trace()
+        self.start_date = dt.datetime.strptime(
+            self.trace_header[u'start_date'],
+            u'%Y-%m-%dT%H:%M:%S.%f'
+        )
+        stop_date = dt.datetime.strptime(
+            self.trace_header[u'stop_date'],
+            u'%Y-%m-%dT%H:%M:%S.%f'
+        )
 
-            # check if the simulation settings match the trace file
+        # check if the simulation settings match the trace file
 
-            if self.settings.exec_numMotes != self.trace_header[u'node_count']:
-                print(
-                    u'Wrong configuration. exec_numMotes is {0}, should be {1}'.format(
-                        self.settings.exec_numMotes,
-                        self.trace_header[u'node_count']
-                    )
-                )
-                assert (
-                    self.settings.exec_numMotes ==
+        if self.settings.exec_numMotes != self.trace_header[u'node_count']:
+            print(
+                u'Wrong configuration. exec_numMotes is {0}, should be {1}'.format(
+                    self.settings.exec_numMotes,
                     self.trace_header[u'node_count']
                 )
+            )
+            assert (
+                self.settings.exec_numMotes ==
+                self.trace_header[u'node_count']
+            )
 
-            # check if all the channels in the hopping sequence are
-            # covered by ones listed in the header
-            if set(d.TSCH_HOPPING_SEQUENCE).issubset(
-                set(self.trace_header[u'channels'])
-            ):
-                # the channels listed in the trace file are valid
-                pass
-            else:
-                raise ValueError(
-                    u'All the channels in TSCH_HOPPING_SEQUENCE ' +
-                    u'must be covered by the trace file\n' +
-                    u'TSCH_HOPPING_SEQUENCE: {0}\n'.format(
-                        sorted(d.TSCH_HOPPING_SEQUENCE)
-                    ) +
-                    u'Channels in the trace: {0}\n'.format(
-                        sorted(self.trace_header[u'channels'])
-                    ) +
-                    u'Check SimEngine/Mote/MoteDefines.py'
-                )
-
-            numSlotframes = (
-                old_div((stop_date - self.start_date).total_seconds(),
-                        self.settings.tsch_slotDuration)
+        # check if all the channels in the hopping sequence are
+        # covered by ones listed in the header
+        if set(d.TSCH_HOPPING_SEQUENCE).issubset(
+            set(self.trace_header[u'channels'])
+        ):
+            # the channels listed in the trace file are valid
+            pass
+        else:
+            raise ValueError(
+                u'All the channels in TSCH_HOPPING_SEQUENCE ' +
+                u'must be covered by the trace file\n' +
+                u'TSCH_HOPPING_SEQUENCE: {0}\n'.format(
+                    sorted(d.TSCH_HOPPING_SEQUENCE)
+                ) +
+                u'Channels in the trace: {0}\n'.format(
+                    sorted(self.trace_header[u'channels'])
+                ) +
+                u'Check SimEngine/Mote/MoteDefines.py'
             )
-            if self.settings.exec_numSlotframesPerRun > numSlotframes:
-                raise ValueError(u'exec_numSlotframesPerRun is too long')
-
-            initialization_is_done = False
-            initialized_links = set([])
-
-            for line in tracefile:
-                row = self._parse_line(line.decode('utf-8'))
-                # make sure that PDR is a float
-                row[u'pdr'] = float(row[u'pdr'])
-                if not initialization_is_done:
-                    link = (row[u'src_id'], row[u'dst_id'], row[u'channel'])
-                    if link in initialized_links:
-                        # we've already initlized this link
-                        initialization_is_done = True
-                        # we don't need to keep the links any more
-                        initialized_links = None
-                    else:
-                        # this link has not been initialized. for this
-                        # purpose, set ASN 0 to this row so that this
-                        # row will be used to in the first _update()
-                        # call
-                        row[u'asn'] = 0
-                        # add the link to the list
-                        initialized_links.add(link)
-                self.trace.append(row)
-
-            # initialize the matrix with the first part of the trace
-            # file
-            self._update()
+
+        numSlotframes = (
+            old_div((stop_date - self.start_date).total_seconds(),
+                    self.settings.tsch_slotDuration)
+        )
+        if self.settings.exec_numSlotframesPerRun > numSlotframes:
+            raise ValueError(u'exec_numSlotframesPerRun is too long')
+
+        # initialize the matrix with the first part of the trace
+        # file
+        self._update()
 
     # ======================= private =========================================
 
@@ -730,28 +1661,37 @@ class ConnectivityMatrixK7(ConnectivityMatrixBase):
         assert self.asn_of_next_update >= self.engine.getAsn()
         # Read the connectivity trace and fill the connectivity
         # matrix
-        assert self.trace_position < len(self.trace)
+        assert (
+            self.trace_position <
+            self.trace_offset + len(self.trace[u'asn'])
+        )
         start_trace_position = self.trace_position
-        while True:
-            row = self.trace[self.trace_position]
 
-            # return next update ASN
+        # the rows are sorted by ASN; apply the ones up to the current ASN,
+        # reading ahead once all the rows read so far are applied
+        while True:
+            start = self.trace_position - self.trace_offset
+            end = int(
+                np.searchsorted(
+                    self.trace[u'asn'],
+                    self.engine.asn,
+                    side=u'right'
+                )
+            )
+            if end > start:
+                self._set_connectivity(slice(start, end))
+            self.trace_position = self.trace_offset + end
 
-            if row[u'asn'] > self.engine.asn:
-                asn_of_next_update = row[u'asn']
+            if (end < len(self.trace[u'asn'])) or (not self._read_ahead()):
                 break
 
-            # update matrix value
-
-            self._set_connectivity(row)
-
-            # increment trace_position
-            self.trace_position += 1
-
-            if self.trace_position == len(self.trace):
-                # we hit the bottom of the trace
-                asn_of_next_update = None
-                break
+        # return next update ASN
+        end = self.trace_position - self.trace_offset
+        if end == len(self.trace[u'asn']):
+            # we hit the bottom of the trace
+            asn_of_next_update = None
+        else:
+            asn_of_next_update = int(self.trace[u'asn'][end])
 
         # update 'asn_of_next_update' with a new ASN, which can be
         # None
@@ -761,6 +1701,9 @@ class ConnectivityMatrixK7(ConnectivityMatrixBase):
             {
                 u'start_trace_position': start_trace_position,
                 u'end_trace_position': self.trace_position,
+                u'read_ahead_position': (
+                    self.trace_offset + len(self.trace[u'asn'])
+                ),
                 u'asn_of_next_update': self.asn_of_next_update
             }
         )
@@ -773,63 +1716,144 @@ class ConnectivityMatrixK7(ConnectivityMatrixBase):
                 intraSlotOrder=d.INTRASLOTORDER_STARTSLOT
             )
 
-    def _set_connectivity(self, row):
-        """Modify the connectivity matrix.  If no channel is given
-        (i.e. channel is None), set all channels to the same value.
+    def _read_ahead(self):
+        """Replace the rows of self.trace, which are all applied, by the
+        next rows of the trace file.  Return False at the end of the
+        trace file, or when the whole trace is loaded.
         """
-        for channel in d.TSCH_HOPPING_SEQUENCE[:self.num_channels]:
-            if (
-                (row[u'channel'] is None)
-                or
-                (row[u'channel'] == channel)
-            ):
-                self.set_pdr(
-                    row[u'src_id'],
-                    row[u'dst_id'],
-                    channel,
-                    row[u'pdr']
-                )
-                self.set_rssi(
-                    row[u'src_id'],
-                    row[u'dst_id'],
-                    channel,
-                    row[u'mean_rssi']
-                )
-
-    def _parse_line(self, line):
-
-        # === read and parse line
-
-        vals = line.strip().split(u',')
-        row = dict(list(zip(self.csv_header, vals)))
-
-        # === change row format
-
-        row[u'src_id'] = int(row[u'src']) if row[u'src'] else None
-        del row[u'src']
-        row[u'dst_id'] = int(row[u'dst']) if row[u'dst'] else None
-        del row[u'dst']
-        row[u'channel'] = int(row[u'channel']) if row[u'channel'] else None
-        row[u'datetime'] = dt.datetime.strptime(
-            row[u'datetime'], u'%Y-%m-%dT%H:%M:%S.%f'
+        if self.trace_reader is None:
+            return False
+
+        rows = self.trace_reader.read(self.read_ahead)
+        if len(rows[u'asn']) == 0:
+            return False
+
+        self.trace_offset += len(self.trace[u'asn'])
+        self.trace = rows
+        return True
+
+    def _set_connectivity(self, rows):
+        """Set the values of the given rows of the trace in the
+        connectivity matrix.  A row without channel (CHANNEL_ALL) sets
+        all channels to the same value.  When several rows give the
+        values of a link, the last one wins.
+        """
+        channels = self.trace[u'channel'][rows]
+        hopping_sequence = np.array(d.TSCH_HOPPING_SEQUENCE[:self.num_channels])
+
+        # one (row, channel index) pair per value to set, in the order of
+        # the rows
+        (row_indexes, channel_indexes) = np.nonzero(
+            (channels[:, np.newaxis] == hopping_sequence[np.newaxis, :])
+            |
+            (channels[:, np.newaxis] == K7TraceReader.CHANNEL_ALL)
+        )
+        src_ids = self.trace[u'src_id'][rows][row_indexes]
+        dst_ids = self.trace[u'dst_id'][rows][row_indexes]
+
+        # keep the last value of each link
+        link_ids = (
+            (
+                src_ids.astype(np.int64) * len(self.mote_id_list) +
+                dst_ids
+            ) * self.num_channels +
+            channel_indexes
+        )
+        (_, last_indexes) = np.unique(link_ids[::-1], return_index=True)
+        last_indexes = len(link_ids) - 1 - last_indexes
+
+        row_indexes = row_indexes[last_indexes]
+        self.links.set_links(
+            src_ids[last_indexes].astype(np.intp),
+            dst_ids[last_indexes].astype(np.intp),
+            channel_indexes[last_indexes],
+            self.trace[u'pdr'][rows][row_indexes],
+            self.trace[u'rssi'][rows][row_indexes]
         )
 
-        # rssi
-
-        if row[u'mean_rssi'] == u'' or (row[u'mean_rssi'] == u'None'):
-            row[u'mean_rssi'] = self.LINK_NONE[u'rssi']
-        else:
-            row[u'mean_rssi'] = float(row[u'mean_rssi'])
+    # === trace conversion
 
-        # === add ASN value to row
+    def _load_trace(self):
+        """Return the header of the trace file and its rows, as a
+        dict of arrays (see K7TraceReader.COLUMNS).  The trace file is
+        converted once; the following runs memory-map the arrays
+        saved in the cache directory (conn_trace_cache_dir, by
+        default .cache next to the trace file).
+        """
+        cache_path = self._get_trace_cache_path()
+        if not os.path.exists(cache_path):
+            (header, trace) = self._convert_trace()
+            try:
+                self._save_trace_cache(cache_path, header, trace)
+            except OSError:
+                # the cache directory is not writable; use the converted
+                # trace as is
+                return (header, trace)
+
+        with open(os.path.join(cache_path, u'header.json'), u'r') as f:
+            header = json.load(f)
+        # plain arrays over the mapped files; slicing a np.memmap is slower
+        trace = dict(
+            (
+                name,
+                np.load(
+                    os.path.join(cache_path, name + u'.npy'),
+                    mmap_mode=u'r'
+                ).view(np.ndarray)
+            )
+            for (name, _) in K7TraceReader.COLUMNS
+        )
+        return (header, trace)
 
-        time_delta = row[u'datetime'] - self.start_date
-        row[u'asn'] = int(
-            time_delta.total_seconds() /
-            float(self.settings.tsch_slotDuration)
+    def _get_trace_cache_path(self):
+        """The converted trace depends on the content of the trace
+        file and on the slot duration, which turns dates into ASNs.
+        """
+        trace_file = self.settings.conn_trace
+        cache_dir = getattr(self.settings, u'conn_trace_cache_dir', None)
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(trace_file), u'.cache')
+
+        trace_hash = hashlib.sha1()
+        with open(trace_file, u'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                trace_hash.update(chunk)
+
+        return os.path.join(
+            cache_dir,
+            u'{0}-{1}-{2}-v{3}'.format(
+                os.path.basename(trace_file),
+                trace_hash.hexdigest(),
+                repr(float(self.settings.tsch_slotDuration)),
+                self.TRACE_CACHE_VERSION
+            )
         )
 
-        return row
+    def _convert_trace(self):
+        """Parse the trace file into one array per column."""
+        trace_reader = K7TraceReader(
+            file_path=self.settings.conn_trace,
+            slot_duration=self.settings.tsch_slotDuration,
+            rssi_none=self.LINK_NONE[u'rssi']
+        )
+        trace = trace_reader.read()
+        return (trace_reader.header, trace)
+
+    def _save_trace_cache(self, cache_path, header, trace):
+        # write into a temporary directory which is then renamed, so that
+        # another run never reads a partial cache
+        tmp_path = u'{0}.{1}.tmp'.format(cache_path, os.getpid())
+        os.makedirs(tmp_path)
+        for (name, _) in K7TraceReader.COLUMNS:
+            np.save(os.path.join(tmp_path, name + u'.npy'), trace[name])
+        with open(os.path.join(tmp_path, u'header.json'), u'w') as f:
+            json.dump(header, f)
+
+        try:
+            os.rename(tmp_path, cache_path)
+        except OSError:
+            # another run saved the same trace in the meantime
+            shutil.rmtree(tmp_path)
 
 
 class ConnectivityMatrixRandom(ConnectivityMatrixBase):
@@ -843,11 +1867,41 @@ class ConnectivityMatrixRandom(ConnectivityMatrixBase):
     every transmission.
     """
 
+    # bump when the placement or the format of the cached topologies changes
+    TOPOLOGY_CACHE_VERSION = 1
+
     def _additional_initialization(self):
+        self._init_topology()
+
+    def _init_topology(self):
+        """Place the motes, or load their placement from the topology
+        cache, and set their links.  Return the links set, as
+        _place_motes() does.
+        """
         # additional local variables
         self.coordinates = {}  # (x, y) indexed by mote_id
-        self.pister_hack = PisterHackModel(self.engine)
-        self.filepath = "../topologies/coordinates"
+        self.pister_hack = PisterHackModel(self.engine, self.rssi_pdr_table)
+        self.motes_by_id = dict((mote.id, mote) for mote in self.engine.motes)
+
+        # the placement only depends on the placement settings, on the radios
+        # of the motes and on the state of the random number generator; the
+        # topology cache is keyed by all of them and holds the coordinates,
+        # the links and the state of the random number generator after the
+        # placement, so that a cached topology gives the same run as a
+        # placed one. bin/plot_topology.py renders the cached topologies.
+        cache_path = self._get_topology_cache_path()
+        if os.path.exists(cache_path):
+            placed_links = self._load_topology(cache_path)
+        else:
+            placed_links = self._place_motes()
+            self._save_topology(cache_path, placed_links)
+        return placed_links
+
+    def _place_motes(self):
+        """Place the motes and set their links.  Return the links set, as
+        a list of (src_ids, dst_ids, pdr, rssi).
+        """
+        placed_links = []
 
         # ConnectivityRandom doesn't need the connectivity matrix. Instead, it
         # initializes coordinates of the motes. Its algorithm is:
@@ -881,12 +1935,6 @@ class ConnectivityMatrixRandom(ConnectivityMatrixBase):
         shape = []
         available_position = [x for x in range(nodes_len)]
 
-        filepath_topo_len = f"{self.filepath}-{topology}-{nodes_len}"
-        filepath_topo_len_json = filepath_topo_len + ".json"
-        filepath_topo_len_png = filepath_topo_len + ".png"
-        if os.path.exists(filepath_topo_len_json):
-            topology = 'saved'
-
         if topology == 'grid':
             loop_n = int(np.sqrt(nodes_len))
             if loop_n**2 == nodes_len:
@@ -929,19 +1977,14 @@ class ConnectivityMatrixRandom(ConnectivityMatrixBase):
 
             position = [(val[0], val[1]) for val in grid_]
 
-        elif topology == "saved":
-            # reading the data from the file
-            with open(filepath_topo_len_json) as f:
-                data = f.read()
-            js = json.loads(data)
-
-            assert nodes_len == len(js.keys())
-
-            position = {}
-            # convert to set
-            for key in js.keys():
-                row, col = js[key]
-                position[int(key)] = (row, col)
+        # the motes already deployed, in the order of deployment, and a grid
+        # indexing them by coordinate; only the motes within radio range of a
+        # tentative coordinate are evaluated
+        motes = [self._get_mote(mote_id) for mote_id in self.mote_id_list]
+        max_distance = self.pister_hack.get_max_distance(motes)
+        deployed_motes = []
+        deployed_coordinates = np.zeros((nodes_len, 2))
+        deployed_grid = MoteGrid(max_distance)
 
         # determine coordinates of the motes
         for idx, target_mote_id in enumerate(self.mote_id_list):
@@ -952,57 +1995,58 @@ class ConnectivityMatrixRandom(ConnectivityMatrixBase):
                 if target_mote_id == 0:
                     if topology != 'random':
                         choice = available_position[0]
-                        self.coordinates[target_mote_id] = position[choice]
+                        coordinate = position[choice]
                         available_position.remove(choice)
                     else:
-                        self.coordinates[target_mote_id] = (0, 0)
+                        coordinate = (0, 0)
+                    self._deploy_mote(
+                        target_mote_id,
+                        coordinate,
+                        deployed_motes,
+                        deployed_coordinates,
+                        deployed_grid
+                    )
                     mote_is_deployed = True
                     continue
 
                 if topology == 'grid':
-                    choice = random.choice(available_position)
+                    choice = self.random.choice(available_position)
                     coordinate = position[choice]
                 elif topology == 'random':
                     coordinate = (
-                        random_square_side * random.random(),
-                        random_square_side * random.random()
+                        random_square_side * self.random.random(),
+                        random_square_side * self.random.random()
                     )
-                elif topology == 'saved':
-                    choice = target_mote_id
-                    coordinate = position[choice]
+
+                # the random parts of the RSSI values are drawn for all the
+                # deployed motes, in the order of deployment, so that the
+                # topology only depends on the random seed
+                random_values = np.array(
+                    [self.random.random() for _ in deployed_motes]
+                )
+
+                # RSSI and PDR values with the deployed motes within radio
+                # range; the PDR with the other ones is 0
+                neighbors = np.array(
+                    sorted(deployed_grid.get_neighbor_candidates(coordinate)),
+                    dtype=np.intp
+                )
+                rssi = self.pister_hack.compute_rssi_array(
+                    {
+                        u'mote': self._get_mote(target_mote_id),
+                        u'coordinate': coordinate
+                    },
+                    [deployed_motes[i] for i in neighbors],
+                    deployed_coordinates[neighbors],
+                    random_values[neighbors]
+                )
+                pdr = self.pister_hack.convert_rssi_to_pdr_array(rssi)
 
                 # count deployed motes who have enough PDR values to this
                 # mote
-                good_pdr_count = 0
-                base_channel = d.TSCH_HOPPING_SEQUENCE[0]
-                for deployed_mote_id in self.coordinates:
-                    rssi = self.pister_hack.compute_rssi(
-                        {
-                            u'mote': self._get_mote(target_mote_id),
-                            u'coordinate': coordinate
-                        },
-                        {
-                            u'mote': self._get_mote(deployed_mote_id),
-                            u'coordinate': self.coordinates[deployed_mote_id]
-                        }
-                    )
-                    pdr = self.pister_hack.convert_rssi_to_pdr(rssi)
-                    # memorize the rssi and pdr values at the base channel
-                    self.set_pdr_both_directions(
-                        target_mote_id,
-                        deployed_mote_id,
-                        base_channel,
-                        pdr
-                    )
-                    self.set_rssi_both_directions(
-                        target_mote_id,
-                        deployed_mote_id,
-                        base_channel,
-                        rssi
-                    )
-
-                    if init_min_pdr <= pdr:
-                        good_pdr_count += 1
+                good_pdr_count = int(np.count_nonzero(init_min_pdr <= pdr))
+                if init_min_pdr <= 0:
+                    good_pdr_count += len(deployed_motes) - len(neighbors)
 
                 # determine whether we deploy this mote or not
                 if (
@@ -1018,98 +2062,293 @@ class ConnectivityMatrixRandom(ConnectivityMatrixBase):
                         (init_min_neighbors <= good_pdr_count)
                     )
                 ):
-                    # fix the coordinate of the mote
-                    self.coordinates[target_mote_id] = coordinate
-                    # copy the rssi and pdr values to other channels
-                    for deployed_mote_id in list(self.coordinates.keys()):
-                        rssi = self.get_rssi(
-                            target_mote_id,
-                            deployed_mote_id,
-                            base_channel
-                        )
-                        pdr = self.get_pdr(
-                            target_mote_id,
-                            deployed_mote_id,
-                            base_channel
+                    # fix the coordinate of the mote, and set the rssi and
+                    # pdr values on all the channels
+                    placed_links.append(
+                        (
+                            [target_mote_id] * len(neighbors),
+                            [deployed_motes[i].id for i in neighbors],
+                            pdr,
+                            rssi
                         )
-                        for channel in d.TSCH_HOPPING_SEQUENCE[:self.num_channels]:
-                            if channel == base_channel:
-                                # do nothing
-                                pass
-                            else:
-                                self.set_pdr_both_directions(
-                                    target_mote_id,
-                                    deployed_mote_id,
-                                    channel,
-                                    pdr
-                                )
-                                self.set_rssi_both_directions(
-                                    target_mote_id,
-                                    deployed_mote_id,
-                                    channel,
-                                    rssi
-                                )
+                    )
+                    self.set_links_both_directions(*placed_links[-1])
+                    self._deploy_mote(
+                        target_mote_id,
+                        coordinate,
+                        deployed_motes,
+                        deployed_coordinates,
+                        deployed_grid
+                    )
 
                     mote_is_deployed = True
                     if topology == 'grid':
                         available_position.remove(choice)
                 else:
-                    # remove memorized values at channel 0
-                    for deployed_mote_id in self.coordinates:
-                        self._clear_rssi(
-                            target_mote_id,
-                            deployed_mote_id,
-                            base_channel
-                        )
-                        self._clear_pdr(
-                            target_mote_id,
-                            deployed_mote_id,
-                            base_channel
-                        )
                     # try another random coordinate
                     continue
 
-        if topology != "saved":
-            pos = self.coordinates
-            data = [list(x) for x in pos.values()]
-            data = np.array(data)
-            x, y = data.T
-            plt.scatter(x, y)
-            center_ = self.coordinates[0]
-            plt.scatter(center_[0], center_[1], color='r')
-            for key, value in self.coordinates.items():
-                plt.annotate(key, (value[0], value[1]))
-
-            plt.savefig(
-                filepath_topo_len_png,
-                bbox_inches='tight',
-                pad_inches=0,
-                format='png',
+        return placed_links
+
+    # === topology cache
+
+    def _get_topology_cache_path(self):
+        placement = {
+            u'version':            self.TOPOLOGY_CACHE_VERSION,
+            u'num_motes':          len(self.mote_id_list),
+            u'topology':           self.settings.conn_topology,
+            u'random_square_side': self.settings.conn_random_square_side,
+            u'init_min_pdr':       self.settings.conn_random_init_min_pdr,
+            u'init_min_neighbors': self.settings.conn_random_init_min_neighbors,
+            u'grid_max_distance':  self.settings.conn_grid_max_distance,
+            u'radios':             [
+                [mote.radio.txPower, mote.radio.antennaGain]
+                for mote in self.engine.motes
+            ],
+            u'rssi_pdr':           [
+                self.rssi_pdr_table.rssi_values.tolist(),
+                self.rssi_pdr_table.pdr_values.tolist()
+            ],
+            u'random_state':       self.random.getstate(),
+        }
+        placement_hash = hashlib.sha1(
+            json.dumps(placement, sort_keys=True).encode(u'utf-8')
+        )
+
+        cache_dir = getattr(self.settings, u'conn_topology_cache_dir', None)
+        if cache_dir is None:
+            cache_dir = TOPOLOGY_CACHE_DIR
+        return os.path.join(
+            cache_dir,
+            u'topology-{0}-{1}-{2}.npz'.format(
+                self.settings.conn_topology,
+                len(self.mote_id_list),
+                placement_hash.hexdigest()
             )
-            plt.close()
-            with open(filepath_topo_len_json, 'w') as f:
-                f.write(json.dumps(self.coordinates, indent=4))
+        )
+
+    def _save_topology(self, cache_path, placed_links):
+        if placed_links:
+            (src_ids, dst_ids, pdr, rssi) = [
+                np.concatenate(
+                    [np.asarray(link[i], dtype=dtype) for link in placed_links]
+                )
+                for (i, dtype) in enumerate([np.intp, np.intp, float, float])
+            ]
+        else:
+            (src_ids, dst_ids) = (np.zeros(0, dtype=np.intp),) * 2
+            (pdr, rssi) = (np.zeros(0),) * 2
+        (version, internal_state, gauss_next) = self.random.getstate()
+
+        # write into a temporary file which then replaces the cache file, so
+        # that another run never reads a partial topology
+        tmp_path = u'{0}.{1}.tmp'.format(cache_path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(tmp_path, u'wb') as f:
+                np.savez(
+                    f,
+                    coordinates=np.array(
+                        [self.coordinates[mote_id] for mote_id in self.mote_id_list],
+                        dtype=float
+                    ),
+                    link_src_ids=src_ids,
+                    link_dst_ids=dst_ids,
+                    link_pdr=pdr,
+                    link_rssi=rssi,
+                    random_version=version,
+                    random_internal_state=np.array(internal_state, dtype=np.int64),
+                    random_gauss_next=(
+                        np.nan if gauss_next is None else gauss_next
+                    ),
+                )
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # the cache directory is not writable; the topology is not saved
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _load_topology(self, cache_path):
+        with np.load(cache_path) as topology:
+            coordinates = topology[u'coordinates'].tolist()
+            self.coordinates = dict(
+                (mote_id, tuple(coordinates[i]))
+                for (i, mote_id) in enumerate(self.mote_id_list)
+            )
+            placed_links = [
+                (
+                    topology[u'link_src_ids'],
+                    topology[u'link_dst_ids'],
+                    topology[u'link_pdr'],
+                    topology[u'link_rssi']
+                )
+            ]
+            self.set_links_both_directions(*placed_links[0])
+            gauss_next = float(topology[u'random_gauss_next'])
+            self.random.setstate(
+                (
+                    int(topology[u'random_version']),
+                    tuple(topology[u'random_internal_state'].tolist()),
+                    None if math.isnan(gauss_next) else gauss_next
+                )
+            )
+        return placed_links
+
+    def _deploy_mote(self, mote_id, coordinate, deployed_motes, deployed_coordinates, deployed_grid):
+        self.coordinates[mote_id] = coordinate
+        deployed_coordinates[len(deployed_motes)] = coordinate
+        deployed_grid.add(coordinate, len(deployed_motes))
+        deployed_motes.append(self._get_mote(mote_id))
 
     def _get_mote(self, mote_id):
         # there must be a mote having mote_id. otherwise, the following line
         # raises an exception.
-        return [mote for mote in self.engine.motes if mote.id == mote_id][0]
+        return self.motes_by_id[mote_id]
+
+
+class ConnectivityMatrixFading(ConnectivityMatrixRandom):
+    """Random topology whose links vary over time
+
+    The motes are placed as by ConnectivityMatrixRandom; the RSSI of a
+    placed link becomes its mean RSSI.  Every conn_fading_period slots,
+    the RSSI of each link on each channel is set to its mean RSSI plus
+    a fading value, and its PDR to the one of that RSSI.  The fading
+    values follow a first-order autoregressive (AR(1)) process of
+    standard deviation conn_fading_std dB, whose values at two
+    consecutive updates have a correlation of conn_fading_correlation.
+    The fading is the same in both directions of a link and independent
+    from one channel to another.
+
+    The fading values of conn_fading_block_size updates are drawn at
+    once, for all the links, and then applied one update after the
+    other, as the rows of a K7 trace.  Only the links within radio range
+    at the placement vary; the other ones remain LINK_NONE.
+    """
 
-    def _clear_rssi(self, mote_id_1, mote_id_2, channel):
-        self.set_rssi_both_directions(
-            mote_id_1,
-            mote_id_2,
-            channel,
-            self.LINK_NONE[u'rssi']
+    def _additional_initialization(self):
+        placed_links = self._init_topology()
+
+        # for quick access
+        self.fading_period = getattr(self.settings, u'conn_fading_period', 100)
+        self.fading_std = getattr(self.settings, u'conn_fading_std', 4.0)
+        self.fading_correlation = getattr(
+            self.settings,
+            u'conn_fading_correlation',
+            0.9
+        )
+        self.fading_block_size = getattr(
+            self.settings,
+            u'conn_fading_block_size',
+            20
         )
+        assert 0 <= self.fading_correlation < 1
+
+        # the placed links, with their mean RSSI; the values of a link are
+        # set in both directions, the links from src to dst being followed
+        # by the links from dst to src
+        if placed_links:
+            (src_ids, dst_ids, self.mean_rssi) = [
+                np.concatenate(
+                    [np.asarray(link[i], dtype=dtype) for link in placed_links]
+                )
+                for (i, dtype) in [(0, np.intp), (1, np.intp), (3, np.float32)]
+            ]
+        else:
+            (src_ids, dst_ids) = (np.zeros(0, dtype=np.intp),) * 2
+            self.mean_rssi = np.zeros(0, dtype=np.float32)
+        self.link_src_ids = np.concatenate([src_ids, dst_ids])
+        self.link_dst_ids = np.concatenate([dst_ids, src_ids])
+
+        # the fading values are drawn from a generator of their own, seeded
+        # by the random number generator of the simulation; the first ones
+        # follow the stationary distribution of the process
+        self.fading_random = np.random.default_rng(self.random.getrandbits(64))
+        self.fading_state = self.fading_std * self.fading_random.standard_normal(
+            (len(self.mean_rssi), self.num_channels),
+            dtype=np.float32
+        )
+        self.fading_block = None
+        self.block_position = 0
+
+        self._update()
+
+    def reseed(self):
+        # the rest of the current block is drawn again from the fading of the
+        # last update
+        self.fading_random = np.random.default_rng(self.random.getrandbits(64))
+        if self.fading_block is not None:
+            self.fading_state = (
+                self.fading_block[u'rssi'][self.block_position - 1]
+                - self.mean_rssi[:, np.newaxis]
+            )
+            self.fading_block = None
 
-    def _clear_pdr(self, mote_id_1, mote_id_2, channel):
-        self.set_rssi_both_directions(
-            mote_id_1,
-            mote_id_2,
-            channel,
-            self.LINK_NONE[u'pdr']
+    # ======================= private =========================================
+
+    def _update(self):
+        if (
+                (self.fading_block is None)
+                or
+                (self.block_position == len(self.fading_block[u'rssi']))
+            ):
+            self._draw_fading_block()
+
+        # all the RSSIs differ; converting them into mW with np.power()
+        # rather than one by one with math.pow() (see dBm_to_mW_array())
+        # may change their last bit
+        pdr = self.fading_block[u'pdr'][self.block_position]
+        rssi = self.fading_block[u'rssi'][self.block_position]
+        rssi_mW = np.power(10.0, rssi.astype(float) / 10.0)
+        self.links.set_links(
+            self.link_src_ids,
+            self.link_dst_ids,
+            None,
+            np.concatenate([pdr, pdr]),
+            np.concatenate([rssi, rssi]),
+            np.concatenate([rssi_mW, rssi_mW])
+        )
+        self.block_position += 1
+
+        asn_of_next_update = self.engine.getAsn() + self.fading_period
+        self.log(
+            SimLog.LOG_CONN_MATRIX_FADING_UPDATE,
+            {
+                u'block_position': self.block_position,
+                u'asn_of_next_update': asn_of_next_update
+            }
         )
+        self.engine.scheduleAtAsn(
+            asn=asn_of_next_update,
+            cb=self._update,
+            uniqueTag=(u'ConnectivityMatrixFading', u'update matrix'),
+            intraSlotOrder=d.INTRASLOTORDER_STARTSLOT
+        )
+
+    def _draw_fading_block(self):
+        """Draw the RSSI and the PDR of the links for the next
+        conn_fading_block_size updates, as arrays of shape (updates,
+        links, channels).
+        """
+        # x[k] = a * x[k-1] + sqrt(1 - a^2) * std * e[k]; the innovations
+        # of the whole block are drawn at once
+        correlation = self.fading_correlation
+        fading = self.fading_random.standard_normal(
+            (self.fading_block_size,) + self.fading_state.shape,
+            dtype=np.float32
+        )
+        fading *= self.fading_std * math.sqrt(1 - correlation ** 2)
+        fading[0] += correlation * self.fading_state
+        for k in range(1, len(fading)):
+            fading[k] += correlation * fading[k - 1]
+        self.fading_state = fading[-1].copy()
+
+        rssi = fading
+        rssi += self.mean_rssi[np.newaxis, :, np.newaxis]
+        self.fading_block = {
+            u'rssi': rssi,
+            u'pdr': self.rssi_pdr_table.get_pdr_array(rssi).astype(np.float32),
+        }
+        self.block_position = 0
 
 
 class PisterHackModel(object):
@@ -1118,36 +2357,12 @@ class PisterHackModel(object):
     TWO_DOT_FOUR_GHZ = 2400000000  # Hz
     SPEED_OF_LIGHT = 299792458  # m/s
 
-    # RSSI and PDR relationship obtained by experiment; dataset was available
-    # at the link shown below:
-    # http://wsn.eecs.berkeley.edu/connectivity/?dataset=dust
-    RSSI_PDR_TABLE = {
-        -97:    0.0000,  # this value is not from experiment
-        -96:    0.1494,
-        -95:    0.2340,
-        -94:    0.4071,
-        # <-- 50% PDR is here, at RSSI=-93.6
-        -93:    0.6359,
-        -92:    0.6866,
-        -91:    0.7476,
-        -90:    0.8603,
-        -89:    0.8702,
-        -88:    0.9324,
-        -87:    0.9427,
-        -86:    0.9562,
-        -85:    0.9611,
-        -84:    0.9739,
-        -83:    0.9745,
-        -82:    0.9844,
-        -81:    0.9854,
-        -80:    0.9903,
-        -79:    1.0000,  # this value is not from experiment
-    }
-
-    def __init__(self, sim_engine):
+    def __init__(self, sim_engine, rssi_pdr_table=DUST_RSSI_PDR_TABLE):
 
         # singleton
         self.engine = sim_engine
+        self.random = sim_engine.random
+        self.rssi_pdr_table = rssi_pdr_table
 
         # remember what RSSI value is computed for a mote at an ASN; the same
         # RSSI value will be returned for the same motes and the ASN.
@@ -1192,7 +2407,7 @@ class PisterHackModel(object):
         # distributed between friis and (friis - 40)
         rssi = (
             mu +
-            random.uniform(
+            self.random.uniform(
                 old_div(-self.PISTER_HACK_LOWER_SHIFT, 2),
                 old_div(+self.PISTER_HACK_LOWER_SHIFT, 2)
             )
@@ -1200,24 +2415,65 @@ class PisterHackModel(object):
 
         return rssi
 
-    def convert_rssi_to_pdr(self, rssi):
-        minRssi = min(self.RSSI_PDR_TABLE.keys())
-        maxRssi = max(self.RSSI_PDR_TABLE.keys())
+    def compute_rssi_array(self, src, dst_motes, dst_coordinates, random_values):
+        """Same as compute_rssi() from src to each of dst_motes, located at
+        dst_coordinates (array of shape (len(dst_motes), 2)). The uniformly
+        distributed part of the RSSI is taken from random_values (values
+        of random.random()) instead of being drawn.
+        """
 
-        if rssi < minRssi:
-            pdr = 0.0
-        elif rssi > maxRssi:
-            pdr = 1.0
-        else:
-            floor_rssi = int(math.floor(rssi))
-            pdr_low = self.RSSI_PDR_TABLE[floor_rssi]
-            pdr_high = self.RSSI_PDR_TABLE[floor_rssi + 1]
-            # linear interpolation
-            pdr = (pdr_high - pdr_low) * (rssi - float(floor_rssi)) + pdr_low
+        # distance in meters
+        distance = 1000 * np.sqrt(
+            np.square(dst_coordinates[:, 0] - src[u'coordinate'][0]) +
+            np.square(dst_coordinates[:, 1] - src[u'coordinate'][1])
+        )
+
+        # sqrt and inverse of the free space path loss (fspl)
+        free_space_path_loss = (
+            self.SPEED_OF_LIGHT /
+            (4 * math.pi * distance * self.TWO_DOT_FOUR_GHZ)
+        )
 
-        assert pdr >= 0.0
-        assert pdr <= 1.0
-        return pdr
+        # simple friis equation in Pr = Pt + Gt + Gr + 20log10(fspl)
+        pr = (
+            src[u'mote'].radio.txPower +
+            src[u'mote'].radio.antennaGain +
+            np.array([mote.radio.antennaGain for mote in dst_motes], dtype=float) +
+            (20 * np.log10(free_space_path_loss))
+        )
+
+        # mean RSSI, plus a value uniformly distributed between -20 and +20
+        mu = pr - old_div(self.PISTER_HACK_LOWER_SHIFT, 2)
+        low = old_div(-self.PISTER_HACK_LOWER_SHIFT, 2)
+        high = old_div(+self.PISTER_HACK_LOWER_SHIFT, 2)
+        return mu + (low + (high - low) * random_values)
+
+    def get_max_distance(self, motes):
+        """Return the distance (in kilometers) beyond which the PDR between
+        any two of motes is 0, whatever the random part of the RSSI.
+        """
+
+        # highest RSSI at one meter, i.e. with a distance of 1 in
+        # compute_mean_rssi(), plus the highest random part
+        max_rssi_at_one_meter = (
+            max(mote.radio.txPower + mote.radio.antennaGain for mote in motes) +
+            max(mote.radio.antennaGain for mote in motes) +
+            20 * math.log10(
+                old_div(self.SPEED_OF_LIGHT,
+                        (4 * math.pi * self.TWO_DOT_FOUR_GHZ))
+            )
+        )
+
+        # the RSSI decreases by 20 dB per decade of distance
+        min_rssi = self.rssi_pdr_table.min_rssi
+        return math.pow(10, (max_rssi_at_one_meter - min_rssi) / 20.0) / 1000
+
+    def convert_rssi_to_pdr_array(self, rssi):
+        """Same as convert_rssi_to_pdr() for an array of RSSI values."""
+        return self.rssi_pdr_table.get_pdr_array(rssi)
+
+    def convert_rssi_to_pdr(self, rssi):
+        return self.rssi_pdr_table.get_pdr(rssi)
 
     @staticmethod
     def _get_distance_in_meters(a, b):
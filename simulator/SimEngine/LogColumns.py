@@ -0,0 +1,285 @@
+"""
+\brief Columnar copy of the log lines, one file per log type.
+
+With the log_columnar setting, SimLog also stores the lines it logs in
+columns, which lets the tools load only the log types and the keys they need
+instead of reading every line of the log file. The lines of a run are
+turned into columns by chunks of log_columnar_chunk_size lines of a type,
+which are kept in temporary files, and the chunks are put together at the
+end of the run, into one NumPy .npz file per log type:
+
+    <log file without .dat>.columns/<run_id>/<log type>.npz
+
+The nested dicts of a line are flattened into one column per key, named after
+the path to the key (u'packet.net.srcIp'); u'_type' is not stored. The type of
+a column follows its values:
+
+    booleans                  bool
+    integers                  int64
+    numbers, some missing     float64, NaN where a line has no value
+    strings                   str
+    anything else             str, the JSON encoding of each value (lists,
+                              mixed types, strings with missing values)
+
+read_columns() returns the columns of a log type across the runs.
+"""
+from __future__ import absolute_import
+
+# =========================== imports =========================================
+
+import json
+import numbers
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# =========================== defines =========================================
+
+COLUMNS_EXTENSION = u'.columns'
+FILE_EXTENSION    = u'.npz'
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# =========================== helpers =========================================
+
+def _flatten(line, prefix, row):
+    for (key, value) in line.items():
+        name = prefix + str(key)
+        if isinstance(value, dict):
+            _flatten(value, name + u'.', row)
+        elif isinstance(value, (list, tuple)):
+            # encoded right away, since the lists of a logged line may
+            # change afterwards
+            row[name] = json.dumps(value)
+        else:
+            row[name] = value
+
+def _to_array(values):
+    kinds = set()
+    for value in values:
+        if value is None:
+            kinds.add(u'none')
+        elif isinstance(value, (bool, np.bool_)):
+            kinds.add(u'bool')
+        elif isinstance(value, numbers.Integral):
+            kinds.add(u'int')
+        elif isinstance(value, numbers.Real):
+            kinds.add(u'float')
+        elif isinstance(value, str):
+            kinds.add(u'str')
+        else:
+            kinds.add(u'other')
+
+    try:
+        if kinds == set([u'bool']):
+            return np.array(values, dtype=bool)
+        elif kinds <= set([u'bool', u'int']):
+            return np.array(values, dtype=np.int64)
+        elif kinds <= set([u'bool', u'int', u'float', u'none']):
+            return np.array(
+                [np.nan if value is None else value for value in values],
+                dtype=np.float64
+            )
+        elif kinds == set([u'str']):
+            return np.array(values, dtype=str)
+    except OverflowError:
+        # integers beyond int64
+        pass
+    return np.array([json.dumps(value) for value in values], dtype=str)
+
+def _to_columns(rows):
+    keys = dict.fromkeys(key for row in rows for key in row)
+    return dict(
+        (key, _to_array([row.get(key) for row in rows])) for key in keys
+    )
+
+def _load_columns(file_path, keys=None):
+    with np.load(file_path) as columns:
+        return dict(
+            (key, columns[key]) for key in columns.files
+            if (keys is None) or (key in keys)
+        )
+
+def _concatenate_columns(chunks, lengths, keys=None):
+    # chunks of the columns of a log type, of lengths lines
+    if keys is None:
+        keys = dict.fromkeys(key for chunk in chunks for key in chunk)
+    return dict(
+        (key, _concatenate([chunk.get(key) for chunk in chunks], lengths))
+        for key in keys
+    )
+
+def _concatenate(parts, lengths):
+    # parts of a column across runs; None where a run doesn't have the column
+    present = [part for part in parts if part is not None]
+    if all(part.dtype.kind in u'biuf' for part in present):
+        parts = [
+            np.full(length, np.nan) if part is None else part
+            for (part, length) in zip(parts, lengths)
+        ]
+    elif any(part is None for part in parts) or any(
+            part.dtype.kind != u'U' for part in present
+        ):
+        parts = [
+            np.full(length, None, dtype=object) if part is None
+            else part.astype(object)
+            for (part, length) in zip(parts, lengths)
+        ]
+    return np.concatenate(parts)
+
+# =========================== sink ============================================
+
+class ColumnarLogSink(object):
+    """
+    Stores the lines logged by a run, by log type, until write() writes
+    their columns. Every chunk_size lines of a type, their columns are moved
+    to a temporary file, so that the memory used doesn't grow with the run.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.rows       = {} # flattened lines not in a chunk yet, by log type
+        self.chunks     = {} # (columns or file path, length), by log type
+        self.parts_dir  = None # temporary directory of the chunks
+
+    def append(self, line):
+        row = {}
+        _flatten(line, u'', row)
+        del row[u'_type']
+        rows = self.rows.setdefault(line[u'_type'], [])
+        rows.append(row)
+        if len(rows) >= self.chunk_size:
+            self._spill(line[u'_type'])
+
+    def write(self, log_file_path, run_id):
+        """
+        Write the columns of the lines stored so far, for the run run_id of
+        the log file log_file_path, and forget the lines.
+        """
+        run_dir = os.path.join(get_columns_dir(log_file_path), str(run_id))
+        if os.path.isdir(run_dir):
+            # a run being done again
+            shutil.rmtree(run_dir)
+        os.makedirs(run_dir)
+
+        for log_type in list(dict.fromkeys(list(self.chunks) + list(self.rows))):
+            chunks = self._get_chunks(log_type)
+            np.savez_compressed(
+                os.path.join(run_dir, log_type + FILE_EXTENSION),
+                **_concatenate_columns(
+                    [columns for (columns, _) in chunks],
+                    [length for (_, length) in chunks]
+                )
+            )
+        self._clear()
+
+    def __getstate__(self):
+        # a snapshot holds the chunks themselves, since the temporary files
+        # are removed at the end of the run
+        state = self.__dict__.copy()
+        state[u'rows'] = {}
+        state[u'chunks'] = dict(
+            (log_type, self._get_chunks(log_type))
+            for log_type in dict.fromkeys(list(self.chunks) + list(self.rows))
+        )
+        state[u'parts_dir'] = None
+        return state
+
+    # ======================== private ========================================
+
+    def _spill(self, log_type):
+        if self.parts_dir is None:
+            self.parts_dir = tempfile.mkdtemp(prefix=u'columns-')
+        chunks = self.chunks.setdefault(log_type, [])
+        file_path = os.path.join(
+            self.parts_dir,
+            u'{0}-{1}{2}'.format(log_type, len(chunks), FILE_EXTENSION)
+        )
+        rows = self.rows.pop(log_type)
+        np.savez(file_path, **_to_columns(rows))
+        chunks.append((file_path, len(rows)))
+
+    def _get_chunks(self, log_type):
+        # the chunks of log_type in memory, followed by the lines not in a
+        # chunk yet
+        chunks = [
+            (
+                _load_columns(columns) if isinstance(columns, str) else columns,
+                length
+            )
+            for (columns, length) in self.chunks.get(log_type, [])
+        ]
+        rows = self.rows.get(log_type, [])
+        if rows:
+            chunks.append((_to_columns(rows), len(rows)))
+        return chunks
+
+    def _clear(self):
+        if self.parts_dir is not None:
+            shutil.rmtree(self.parts_dir, ignore_errors=True)
+        self.rows      = {}
+        self.chunks    = {}
+        self.parts_dir = None
+
+# =========================== readers =========================================
+
+def get_columns_dir(log_file_path):
+    """
+    Return the directory of the columns of a log file.
+    """
+    return os.path.splitext(log_file_path)[0] + COLUMNS_EXTENSION
+
+def get_run_ids(columns_dir):
+    """
+    Return the run_ids which have columns in columns_dir, in order.
+    """
+    if not os.path.isdir(columns_dir):
+        return []
+    return sorted(
+        int(name) for name in os.listdir(columns_dir) if name.isdigit()
+    )
+
+def read_columns(columns_dir, log_type, keys=None, run_ids=None):
+    """
+    Return the columns of log_type as a dict of arrays indexed by key, the
+    lines of the runs run_ids (default: all) one after the other. Only the
+    given keys are loaded (default: all). A key of some of the runs only is
+    NaN, or None, in the lines of the other runs.
+    """
+    if run_ids is None:
+        run_ids = get_run_ids(columns_dir)
+
+    runs    = []
+    lengths = [] # number of lines of each run
+    for run_id in run_ids:
+        file_path = os.path.join(
+            columns_dir,
+            str(run_id),
+            log_type + FILE_EXTENSION
+        )
+        if not os.path.exists(file_path):
+            continue
+        with np.load(file_path) as columns:
+            lengths.append(len(columns[u'_asn']))
+        runs.append(_load_columns(file_path, keys))
+
+    if not runs:
+        return dict((key, np.array([])) for key in (keys or []))
+    return _concatenate_columns(runs, lengths, keys)
+
+def merge_columns(log_file_path, merged_log_file_path):
+    """
+    Move the columns of the runs of a log file to the ones of the merged log
+    file, replacing the columns of the same runs if any.
+    """
+    columns_dir = get_columns_dir(log_file_path)
+    merged_columns_dir = get_columns_dir(merged_log_file_path)
+    for run_id in get_run_ids(columns_dir):
+        if not os.path.isdir(merged_columns_dir):
+            os.makedirs(merged_columns_dir)
+        merged_run_dir = os.path.join(merged_columns_dir, str(run_id))
+        if os.path.isdir(merged_run_dir):
+            shutil.rmtree(merged_run_dir)
+        shutil.move(os.path.join(columns_dir, str(run_id)), merged_run_dir)
@@ -0,0 +1,397 @@
+"""
+\brief Formats of the log files.
+
+A log file holds the lines logged by SimLog, either as JSON lines (the
+default) or, with the log_format setting set to 'binary', as binary records.
+
+A binary log file is a series of segments, one per SimLog which wrote into
+the file; the concatenation of binary log files is a binary log file. A
+segment starts with MAGIC, followed by records. A record is the length of its
+body (little-endian uint32) followed by the body, a tuple serialized by
+marshal:
+
+    (KIND_SCHEMA, type_id, type, keys)   declares the keys of a log type,
+                                         before its first line
+    (KIND_LINE, type_id, asn, run_id, values)
+                                         a line of a declared type; values
+                                         are in the order of the keys
+    (KIND_DICT, line)                    a line as is: the config line, or
+                                         a line without _asn
+
+The type ids are only valid in their segment. The values of a line are
+written as JSON would write them (tuples become lists, the keys of dicts
+become strings, ...), so that read_log_file() reads the lines of both formats
+as the same dicts.
+
+With the log_compression setting set to 'gzip', each run writes its lines,
+in either format, into a gzip member of its own, which can be decompressed
+independently of the other ones; the concatenation of compressed log files is
+a compressed log file. The index file next to a compressed log file holds one
+JSON line per run: its run_id, and the offset and length of its member in the
+log file, which lets a reader decompress only the runs it reads.
+"""
+from __future__ import absolute_import
+
+# =========================== imports =========================================
+
+import gzip
+import io
+import json
+import marshal
+import os
+import shutil
+import struct
+import zlib
+
+# =========================== defines =========================================
+
+FORMAT_JSON   = u'json'
+FORMAT_BINARY = u'binary'
+
+MAGIC = b'6TiSCHlog\x01'
+
+KIND_SCHEMA = 0
+KIND_LINE   = 1
+KIND_DICT   = 2
+
+# the keys of a line which are in the header of a binary record
+HEADER_KEYS = (u'_asn', u'_type', u'_run_id')
+
+COMPRESSION_GZIP = u'gzip'
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+INDEX_EXTENSION = u'.index'
+
+_LENGTH = struct.Struct(u'<I')
+_MARSHAL_VERSION = 4
+_GZIP_COMPRESSLEVEL = 6
+_CHUNK_SIZE = 1 << 16
+
+# same output as json.dumps(line, sort_keys=True), without creating an
+# encoder for each line
+_JSON_ENCODER = json.JSONEncoder(sort_keys=True)
+
+# =========================== helpers =========================================
+
+_JSON_SCALAR_TYPES = frozenset([str, int, float, bool, type(None)])
+
+def _is_json_native(value):
+    # whether JSON gives the value back as it is
+    pending = [value]
+    while pending:
+        value = pending.pop()
+        value_type = type(value)
+        if value_type in _JSON_SCALAR_TYPES:
+            continue
+        elif value_type is dict:
+            for key in value:
+                if type(key) is not str:
+                    return False
+            pending.extend(value.values())
+        elif value_type is list:
+            pending.extend(value)
+        else:
+            return False
+    return True
+
+def _to_json_types(value):
+    return json.loads(_JSON_ENCODER.encode(value))
+
+# =========================== encoders ========================================
+
+class JsonLogEncoder(object):
+    """
+    Encode lines as JSON lines.
+    """
+    mode = u''
+
+    def header(self):
+        return u''
+
+    def encode(self, line, sort_keys=True):
+        if sort_keys:
+            return _JSON_ENCODER.encode(line) + u'\n'
+        else:
+            return json.dumps(line) + u'\n'
+
+class BinaryLogEncoder(object):
+    """
+    Encode lines as binary records. An encoder writes one segment; it
+    declares each log type in the first record of that type.
+    """
+    mode = u'b'
+
+    def __init__(self):
+        self.schemas = {} # type_id indexed by (type, keys)
+        # (type_id, keys, keys of the line) of the last line of each type
+        self.last_schemas = {}
+
+    def header(self):
+        return MAGIC
+
+    def encode(self, line, sort_keys=True):
+        if not _is_json_native(line):
+            # the line a JSON log file would give
+            line = _to_json_types(line)
+
+        if u'_asn' not in line:
+            # the config line
+            return self._record((KIND_DICT, line))
+
+        type_name = line[u'_type']
+        returnVal = b''
+        schema = self.last_schemas.get(type_name)
+        if (schema is None) or (line.keys() != schema[2]):
+            keys = tuple(sorted(key for key in line if key not in HEADER_KEYS))
+            type_id = self.schemas.get((type_name, keys))
+            if type_id is None:
+                type_id = len(self.schemas)
+                self.schemas[(type_name, keys)] = type_id
+                returnVal += self._record(
+                    (KIND_SCHEMA, type_id, type_name, keys)
+                )
+            schema = (type_id, keys, frozenset(keys + HEADER_KEYS))
+            self.last_schemas[type_name] = schema
+        (type_id, keys, _) = schema
+
+        returnVal += self._record(
+            (
+                KIND_LINE,
+                type_id,
+                line[u'_asn'],
+                line[u'_run_id'],
+                [line[key] for key in keys]
+            )
+        )
+        return returnVal
+
+    def _record(self, body):
+        body = marshal.dumps(body, _MARSHAL_VERSION)
+        return _LENGTH.pack(len(body)) + body
+
+def get_encoder(log_format):
+    if log_format == FORMAT_JSON:
+        return JsonLogEncoder()
+    elif log_format == FORMAT_BINARY:
+        return BinaryLogEncoder()
+    else:
+        raise ValueError(u'unknown log format: {0}'.format(log_format))
+
+# =========================== files ===========================================
+
+def open_output_file(file_path, mode, compression=None):
+    """
+    Open a log file to write, in the given mode ('a' or 'ab'). With
+    compression, the lines are written into a new gzip member at the end of
+    the file.
+    """
+    if compression is None:
+        return open(file_path, mode)
+    elif compression == COMPRESSION_GZIP:
+        if u'b' not in mode:
+            mode += u't'
+        return gzip.open(file_path, mode, compresslevel=_GZIP_COMPRESSLEVEL)
+    else:
+        raise ValueError(u'unknown log compression: {0}'.format(compression))
+
+def is_compressed(file_path):
+    with open(file_path, u'rb') as f:
+        return f.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+
+def read_segment(file_path, offset, length=None):
+    """
+    Return the decompressed content of the gzip member at offset in a
+    compressed log file, of the given length (default: up to the end of the
+    file). The member may be unfinished, as long as it was flushed.
+    """
+    with open(file_path, u'rb') as f:
+        f.seek(offset)
+        data = f.read() if length is None else f.read(length)
+    return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(data)
+
+# ==== index
+
+def get_index_path(file_path):
+    """
+    Return the path of the index of a compressed log file.
+    """
+    return os.path.splitext(file_path)[0] + INDEX_EXTENSION
+
+def read_index(file_path):
+    """
+    Return the entries of the index of a compressed log file, as dicts with
+    the keys run_id, offset and length; None if it has no index.
+    """
+    index_path = get_index_path(file_path)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, u'r') as f:
+        return [json.loads(line) for line in f]
+
+def append_index(file_path, entries):
+    with open(get_index_path(file_path), u'a') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, sort_keys=True) + u'\n')
+
+def append_log_file(file_path, merged_file):
+    """
+    Append a compressed log file to the merged one, opened in mode 'ab', and
+    the entries of its index to the index of the merged one.
+    """
+    offset = merged_file.tell()
+    with open(file_path, u'rb') as f:
+        shutil.copyfileobj(f, merged_file)
+    entries = read_index(file_path) or []
+    for entry in entries:
+        entry[u'offset'] += offset
+    append_index(merged_file.name, entries)
+
+def truncate_index(file_path, end):
+    """
+    Remove the entries of the runs beyond end from the index of a compressed
+    log file, once it is truncated to end.
+    """
+    entries = read_index(file_path)
+    if entries is None:
+        return
+    os.remove(get_index_path(file_path))
+    append_index(
+        file_path,
+        [
+            entry for entry in entries
+            if entry[u'offset'] + entry[u'length'] <= end
+        ]
+    )
+
+# =========================== readers =========================================
+
+class _GzipMembersReader(io.RawIOBase):
+    """
+    Decompress the gzip members of a compressed log file one after the
+    other. Unlike gzip.open(), the last member may be unfinished, such as the
+    one of a run being written.
+    """
+
+    def __init__(self, file_path):
+        self.file = open(file_path, u'rb')
+        self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.data = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.data:
+            if self.decompressor.eof:
+                # the next member
+                chunk = self.decompressor.unused_data
+                self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                chunk = self.decompressor.unconsumed_tail
+            if not chunk:
+                chunk = self.file.read(_CHUNK_SIZE)
+                if not chunk:
+                    return 0
+            self.data = self.decompressor.decompress(chunk, _CHUNK_SIZE)
+        length = min(len(buffer), len(self.data))
+        buffer[:length] = self.data[:length]
+        self.data = self.data[length:]
+        return length
+
+    def close(self):
+        self.file.close()
+        super(_GzipMembersReader, self).close()
+
+def _open_log_file(file_path, mode):
+    # mode is 'r' or 'rb'
+    if is_compressed(file_path):
+        f = io.BufferedReader(_GzipMembersReader(file_path))
+        return f if u'b' in mode else io.TextIOWrapper(f)
+    else:
+        return open(file_path, mode)
+
+def get_file_format(file_path):
+    """
+    Return the format of a log file, FORMAT_BINARY or FORMAT_JSON, compressed
+    or not.
+    """
+    with _open_log_file(file_path, u'rb') as f:
+        if f.read(len(MAGIC)) == MAGIC:
+            return FORMAT_BINARY
+        else:
+            return FORMAT_JSON
+
+def read_log_file(file_path, run_id=None):
+    """
+    Yield the lines of a log file, of either format, as dicts. With run_id,
+    only the lines of that run; the index of a compressed log file lets only
+    its gzip members be decompressed.
+    """
+    log_format = get_file_format(file_path)
+
+    index = read_index(file_path) if run_id is not None else None
+    if index is not None:
+        for entry in index:
+            if entry[u'run_id'] != run_id:
+                continue
+            data = read_segment(file_path, entry[u'offset'], entry[u'length'])
+            if log_format == FORMAT_BINARY:
+                lines = _read_binary_records(io.BytesIO(data), file_path)
+            else:
+                lines = _read_json_lines(io.StringIO(data.decode(u'utf-8')))
+            for line in lines:
+                yield line
+        return
+
+    if log_format == FORMAT_BINARY:
+        with _open_log_file(file_path, u'rb') as f:
+            lines = _read_binary_records(f, file_path)
+            for line in lines:
+                if (run_id is None) or (line[u'_run_id'] == run_id):
+                    yield line
+    else:
+        with _open_log_file(file_path, u'r') as f:
+            for line in _read_json_lines(f):
+                if (run_id is None) or (line[u'_run_id'] == run_id):
+                    yield line
+
+def _read_json_lines(f):
+    for line in f:
+        yield json.loads(line)
+
+def _read_binary_records(f, file_path):
+    schemas = {}
+    while True:
+        head = f.read(_LENGTH.size)
+        if not head:
+            break
+        if (
+                (head == MAGIC[:_LENGTH.size])
+                and
+                (f.read(len(MAGIC) - _LENGTH.size) == MAGIC[_LENGTH.size:])
+            ):
+            # a new segment
+            schemas = {}
+            continue
+        (length,) = _LENGTH.unpack(head)
+        body = marshal.loads(f.read(length))
+
+        kind = body[0]
+        if kind == KIND_LINE:
+            (_, type_id, asn, run_id, values) = body
+            (type_name, keys) = schemas[type_id]
+            line = dict(zip(keys, values))
+            line[u'_asn'] = asn
+            line[u'_type'] = type_name
+            line[u'_run_id'] = run_id
+            yield line
+        elif kind == KIND_SCHEMA:
+            (_, type_id, type_name, keys) = body
+            schemas[type_id] = (type_name, keys)
+        elif kind == KIND_DICT:
+            yield body[1]
+        else:
+            raise ValueError(
+                u'{0}: unknown record kind {1}'.format(file_path, kind)
+            )
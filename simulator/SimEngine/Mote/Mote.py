@@ -7,7 +7,6 @@ from __future__ import absolute_import
 
 from builtins import str
 from builtins import object
-import threading
 
 import netaddr
 
@@ -36,18 +35,20 @@ class Mote(object):
     IPV6_ADDR_TYPE_LINK_LOCAL = u'link-local'
     IPV6_ADDR_TYPE_GLOBAL     = u'global'
 
-    def __init__(self, id, eui64=None):
+    def __init__(self, id, context, eui64=None):
 
         # store params
         self.id                        = id
+        self.context                   = context
 
-        # admin
-        self.dataLock                  = threading.RLock()
+        # simulation context (quicker access, handed down to the stack)
+        self.log                       = context.log
+        self.log_enabled               = context.log_enabled
+        self.engine                    = context.engine
+        self.settings                  = context.settings
 
-        # singletons (quicker access, instead of recreating every time)
-        self.log                       = SimEngine.SimLog.SimLog().log
-        self.engine                    = SimEngine.SimEngine.SimEngine()
-        self.settings                  = SimEngine.SimSettings.SimSettings()
+        # admin
+        self.dataLock                  = self.engine.create_lock()
 
         # stack state
         self.dagRoot                   = False
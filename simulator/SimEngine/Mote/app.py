@@ -8,7 +8,6 @@ from __future__ import absolute_import
 from builtins import range
 from builtins import object
 from abc import abstractmethod
-import random
 
 # Mote sub-modules
 
@@ -26,7 +25,7 @@ def App(mote):
     """factory method for application
     """
 
-    settings = SimEngine.SimSettings.SimSettings()
+    settings = mote.settings
 
     # use mote.id to determine whether it is the root or not instead of using
     # mote.dagRoot because mote.dagRoot is not initialized when application is
@@ -45,10 +44,10 @@ class AppBase(object):
         # store params
         self.mote       = mote
 
-        # singletons (quicker access, instead of recreating every time)
-        self.engine     = SimEngine.SimEngine.SimEngine()
-        self.settings   = SimEngine.SimSettings.SimSettings()
-        self.log        = SimEngine.SimLog.SimLog().log
+        # shorthands to the simulation context of the mote
+        self.engine     = mote.engine
+        self.settings   = mote.settings
+        self.log        = mote.log
 
         # local variables
         self.appcounter = 0
@@ -199,12 +198,12 @@ class AppPeriodic(AppBase):
 
         if self.sending_first_packet:
             # compute initial time within the range of [next asn, next asn+pkPeriod]
-            delay = self.settings.tsch_slotDuration + (self.settings.app_pkPeriod * random.random())
+            delay = self.settings.tsch_slotDuration + (self.settings.app_pkPeriod * self.engine.random.random())
             self.sending_first_packet = False
         else:
             # compute random delay
             assert self.settings.app_pkPeriodVar < 1
-            delay = self.settings.app_pkPeriod * (1 + random.uniform(-self.settings.app_pkPeriodVar, self.settings.app_pkPeriodVar))
+            delay = self.settings.app_pkPeriod * (1 + self.engine.random.uniform(-self.settings.app_pkPeriodVar, self.settings.app_pkPeriodVar))
 
         # schedule
         self.engine.scheduleIn(
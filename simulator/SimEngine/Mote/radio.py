@@ -29,10 +29,10 @@ class Radio(object):
         # store params
         self.mote                           = mote
 
-        # singletons (quicker access, instead of recreating every time)
-        self.engine                         = SimEngine.SimEngine.SimEngine()
-        self.settings                       = SimEngine.SimSettings.SimSettings()
-        self.log                            = SimEngine.SimLog.SimLog().log
+        # shorthands to the simulation context of the mote
+        self.engine                         = mote.engine
+        self.settings                       = mote.settings
+        self.log                            = mote.log
 
         # local variables
         self.onGoingTransmission            = None    # ongoing transmission (used by propagate)
@@ -77,6 +77,9 @@ class Radio(object):
             u'packet':  packet,
         }
 
+        # have the propagation model consider this radio in this slot
+        self.engine.connectivity.register_active_radio(self.mote.id)
+
     def txDone(self, isACKed):
         """end of tx slot"""
         self.state = d.RADIO_STATE_OFF
@@ -111,6 +114,9 @@ class Radio(object):
         self.state = d.RADIO_STATE_RX
         self.channel = channel
 
+        # have the propagation model consider this radio in this slot
+        self.engine.connectivity.register_active_radio(self.mote.id)
+
     def rxDone(self, packet):
         """end of RX radio activity"""
 
@@ -151,7 +157,7 @@ class Radio(object):
 
     def _schedule_log_stats(self):
         next_log_asn = self.engine.getAsn() + self.log_stats_interval_asn
-        self.engine.scheduleAtAsn(
+        self.engine.scheduleTimerAtAsn(
             asn = next_log_asn,
             cb = self._log_stats,
             uniqueTag = (self.mote.id, u'log_radio_stats'),
@@ -16,7 +16,6 @@ from __future__ import division
 from builtins import str
 from builtins import object
 from past.utils import old_div
-import random
 import math
 import sys
 
@@ -49,10 +48,10 @@ class Rpl(object):
         # store params
         self.mote = mote
 
-        # singletons (quicker access, instead of recreating every time)
-        self.engine = SimEngine.SimEngine.SimEngine()
-        self.settings = SimEngine.SimSettings.SimSettings()
-        self.log = SimEngine.SimLog.SimLog().log
+        # shorthands to the simulation context of the mote
+        self.engine = mote.engine
+        self.settings = mote.settings
+        self.log = mote.log
 
         self.trickle_method = self.settings.trickle_method or ""
 
@@ -347,7 +346,7 @@ class Rpl(object):
         return self.engine.is_scheduled(str(self.mote.id) + u'dis')
 
     def start_dis_timer(self):
-        self.engine.scheduleIn(
+        self.engine.scheduleTimerIn(
             delay=self.settings.rpl_disPeriod,
             cb=self.handle_dis_timer,
             uniqueTag=str(self.mote.id) + u'dis',
@@ -545,14 +544,14 @@ class Rpl(object):
             asnDiff = 1
         else:
             asnDiff = int(math.ceil(
-                old_div(random.uniform(
+                old_div(self.engine.random.uniform(
                     0.8 * self.settings.rpl_daoPeriod,
                     1.2 * self.settings.rpl_daoPeriod
                 ), self.settings.tsch_slotDuration))
             )
 
         # schedule sending a DAO
-        self.engine.scheduleAtAsn(
+        self.engine.scheduleTimerAtAsn(
             asn=asnNow + asnDiff,
             cb=self._action_sendDAO,
             uniqueTag=(self.mote.id, u'_action_sendDAO'),
@@ -3,7 +3,6 @@ from __future__ import absolute_import
 
 from builtins import range
 from builtins import object
-import random
 import sys
 from abc import abstractmethod
 
@@ -21,7 +20,7 @@ from . import sixp
 
 class SchedulingFunction(object):
     def __new__(cls, mote):
-        settings    = SimEngine.SimSettings.SimSettings()
+        settings    = mote.settings
         class_name  = u'SchedulingFunction{0}'.format(settings.sf_class)
         return getattr(sys.modules[__name__], class_name)(mote)
 
@@ -34,10 +33,10 @@ class SchedulingFunctionBase(object):
         # store params
         self.mote            = mote
 
-        # singletons (quicker access, instead of recreating every time)
-        self.settings        = SimEngine.SimSettings.SimSettings()
-        self.engine          = SimEngine.SimEngine.SimEngine()
-        self.log             = SimEngine.SimLog.SimLog().log
+        # shorthands to the simulation context of the mote
+        self.settings        = mote.settings
+        self.engine          = mote.engine
+        self.log             = mote.log
 
     # ======================= public ==========================================
 
@@ -666,7 +665,7 @@ class SchedulingFunctionMSF(SchedulingFunctionBase):
             pass
 
         # schedule next housekeeping
-        self.engine.scheduleIn(
+        self.engine.scheduleTimerIn(
             delay         = d.MSF_HOUSEKEEPINGCOLLISION_PERIOD,
             cb            = self._housekeeping_collision,
             uniqueTag     = (self.mote.id, u'_housekeeping_collision'),
@@ -777,11 +776,11 @@ class SchedulingFunctionMSF(SchedulingFunctionBase):
             # we don't have enough available cells; no cell is selected
             selected_slots = []
         else:
-            selected_slots = random.sample(available_slots, cell_list_len)
+            selected_slots = self.engine.random.sample(available_slots, cell_list_len)
 
         cell_list = []
         for slot_offset in selected_slots:
-            channel_offset = random.randint(0, self.settings.phy_numChans - 1)
+            channel_offset = self.engine.random.randint(0, self.settings.phy_numChans - 1)
             cell_list.append(
                 {
                     'slotOffset'   : slot_offset,
@@ -808,7 +807,7 @@ class SchedulingFunctionMSF(SchedulingFunctionBase):
         ]
 
         if cell_list_len <= len(occupied_cells):
-            cell_list = random.sample(cell_list, cell_list_len)
+            cell_list = self.engine.random.sample(cell_list, cell_list_len)
 
         return cell_list
 
@@ -932,7 +931,7 @@ class SchedulingFunctionMSF(SchedulingFunctionBase):
         if len(candidate_cells) < request[u'app'][u'numCells']:
             cell_list = candidate_cells
         else:
-            cell_list = random.sample(
+            cell_list = self.engine.random.sample(
                 candidate_cells,
                 request[u'app'][u'numCells']
             )
@@ -1110,7 +1109,7 @@ class SchedulingFunctionMSF(SchedulingFunctionBase):
                 (num_cells <= len(candidate_cell_list))
             ):
             code = d.SIXP_RC_SUCCESS
-            cell_list = random.sample(candidate_cell_list, num_cells)
+            cell_list = self.engine.random.sample(candidate_cell_list, num_cells)
 
             def callback(event, packet):
                 if event == d.SIXP_CALLBACK_EVENT_MAC_ACK_RECEPTION:
@@ -1325,7 +1324,7 @@ class SchedulingFunctionMSF(SchedulingFunctionBase):
             if available_slots:
                 # prepare response
                 ncls = min(num_cells, len(available_slots))
-                selected_slots = random.sample(available_slots, ncls)
+                selected_slots = self.engine.random.sample(available_slots, ncls)
                 for cell in candidate_cells:
                     if cell[u'slotOffset'] in selected_slots:
                         cell_list.append(cell)
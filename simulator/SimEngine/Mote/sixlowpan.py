@@ -13,7 +13,6 @@ from builtins import object
 from abc import abstractmethod
 import copy
 import math
-import random
 
 import netaddr
 
@@ -34,10 +33,10 @@ class Sixlowpan(object):
         # store params
         self.mote                 = mote
 
-        # singletons (quicker access, instead of recreating every time)
-        self.settings             = SimEngine.SimSettings.SimSettings()
-        self.engine               = SimEngine.SimEngine.SimEngine()
-        self.log                  = SimEngine.SimLog.SimLog().log
+        # shorthands to the simulation context of the mote
+        self.settings             = mote.settings
+        self.engine               = mote.engine
+        self.log                  = mote.log
 
         # local variables
         self.fragmentation        = globals()[self.settings.fragmentation](self)
@@ -399,14 +398,14 @@ class Fragmentation(object):
         # store params
         self.sixlowpan            = sixlowpan
 
-        # singletons (quicker access, instead of recreating every time)
-        self.settings             = SimEngine.SimSettings.SimSettings()
-        self.engine               = SimEngine.SimEngine.SimEngine()
-        self.log                  = SimEngine.SimLog.SimLog().log
+        # shorthands to the simulation context of the mote
+        self.settings             = sixlowpan.settings
+        self.engine               = sixlowpan.engine
+        self.log                  = sixlowpan.log
 
         # local variables
         self.mote                 = sixlowpan.mote
-        self.next_datagram_tag    = random.randint(0, 2**16-1)
+        self.next_datagram_tag    = self.engine.random.randint(0, 2**16-1)
         # "reassembly_buffers" has mote instances as keys. Each value is a list.
         # A list is indexed by incoming datagram_tags.
         #
@@ -8,7 +8,6 @@ from builtins import str
 from builtins import object
 from past.utils import old_div
 import math
-import random
 
 import SimEngine
 from . import MoteDefines as d
@@ -21,10 +20,10 @@ class ACPBTrickle(object):
     def __init__(self, callback, mote):
         assert callback is not None
 
-        # shorthand to singletons
-        self.engine = SimEngine.SimEngine.SimEngine()
-        self.settings = SimEngine.SimSettings.SimSettings()
-        self.log = SimEngine.SimLog.SimLog().log
+        # shorthand to the simulation context
+        self.engine = mote.engine
+        self.settings = mote.settings
+        self.log = mote.log
 
         self.mote = mote
 
@@ -208,7 +207,7 @@ class ACPBTrickle(object):
 
         logss = f'\nLOG, {self.t_start}, {self.t_end}, {self.interval}, \n'
 
-        self.t = random.uniform(self.t_start, self.t_end)
+        self.t = self.engine.random.uniform(self.t_start, self.t_end)
         assert self.t_start <= self.t_end <= self.interval, logss
         assert self.t_start <= self.t <= self.t_end, logss
 
@@ -248,20 +247,20 @@ class ACPBTrickle(object):
         def end_t():
             self.end_t_record = self.getOpsMC()
 
-        self.engine.scheduleAtAsn(
+        self.engine.scheduleTimerAtAsn(
             asn=self.correctASN(asn_t),
             cb=t_callback,
             uniqueTag=self.unique_tag_base + u'_at_t',
             intraSlotOrder=d.INTRASLOTORDER_STACKTASKS)
 
-        self.engine.scheduleAtAsn(
+        self.engine.scheduleTimerAtAsn(
             asn=self.correctASN(asn_start),
             cb=start_t,
             uniqueTag=self.unique_tag_base + u'_at_start_t',
             intraSlotOrder=d.INTRASLOTORDER_STACKTASKS)
 
         if self.t_end < self.interval:
-            self.engine.scheduleAtAsn(
+            self.engine.scheduleTimerAtAsn(
                 asn=self.correctASN(asn_end),
                 cb=end_t,
                 uniqueTag=self.unique_tag_base + u'_at_end_t',
@@ -285,7 +284,7 @@ class ACPBTrickle(object):
             end_t()
             i_callback()
 
-        self.engine.scheduleAtAsn(
+        self.engine.scheduleTimerAtAsn(
             asn=self.correctASN(asn_i),
             cb=i_callback if self.t_end < self.interval else end_t_i_callback,
             uniqueTag=self.unique_tag_base + u'_at_i',
@@ -8,7 +8,6 @@ from builtins import str
 from builtins import object
 from past.utils import old_div
 import math
-import random
 import numpy as np
 import SimEngine
 from . import MoteDefines as d
@@ -21,10 +20,10 @@ class RiataTrickle(object):
     def __init__(self, callback, mote):
         assert callback is not None
 
-        # shorthand to singletons
-        self.engine = SimEngine.SimEngine.SimEngine()
-        self.settings = SimEngine.SimSettings.SimSettings()
-        self.log = SimEngine.SimLog.SimLog().log
+        # shorthand to the simulation context
+        self.engine = mote.engine
+        self.settings = mote.settings
+        self.log = mote.log
 
         self.mote = mote
 
@@ -187,7 +186,7 @@ class RiataTrickle(object):
             self.t_start = half_interval
             self.t_end = self.interval
 
-        self.t = random.uniform(self.t_start, self.t_end)
+        self.t = self.engine.random.uniform(self.t_start, self.t_end)
         assert self.t_start <= self.t_end <= self.interval
         assert self.t_start <= self.t <= self.t_end
 
@@ -210,7 +209,7 @@ class RiataTrickle(object):
 
         def t_callback():
             self.is_dio_sent = False
-            self.is_explore = random.uniform(0, 1) < self.epsilon
+            self.is_explore = self.engine.random.uniform(0, 1) < self.epsilon
             if self.is_explore:
                 # populate
                 if self.m_riata not in self.counter_riata:
@@ -238,20 +237,20 @@ class RiataTrickle(object):
         def end_t():
             self.end_t_record = self.getOpsMC()
 
-        self.engine.scheduleAtAsn(
+        self.engine.scheduleTimerAtAsn(
             asn=self.correctASN(asn_t),
             cb=t_callback,
             uniqueTag=self.unique_tag_base + u'_at_t',
             intraSlotOrder=d.INTRASLOTORDER_STACKTASKS)
 
-        self.engine.scheduleAtAsn(
+        self.engine.scheduleTimerAtAsn(
             asn=self.correctASN(self.asn_t_start),
             cb=start_t,
             uniqueTag=self.unique_tag_base + u'_at_start_t',
             intraSlotOrder=d.INTRASLOTORDER_STACKTASKS)
 
         if self.t_end < self.interval:
-            self.engine.scheduleAtAsn(
+            self.engine.scheduleTimerAtAsn(
                 asn=self.correctASN(self.asn_t_end),
                 cb=end_t,
                 uniqueTag=self.unique_tag_base + u'_at_end_t',
@@ -286,7 +285,7 @@ class RiataTrickle(object):
             end_t()
             i_callback()
 
-        self.engine.scheduleAtAsn(
+        self.engine.scheduleTimerAtAsn(
             asn=self.correctASN(asn_i),
             cb=i_callback if self.t_end < self.interval else end_t_i_callback,
             uniqueTag=self.unique_tag_base + u'_at_i',
@@ -8,7 +8,6 @@ from builtins import str
 from builtins import object
 from past.utils import old_div
 import math
-import random
 import numpy as np
 import SimEngine
 from . import MoteDefines as d
@@ -21,10 +20,10 @@ class TrickleTimer(object):
     def __init__(self, callback, mote):
         assert callback is not None
 
-        # shorthand to singletons
-        self.engine = SimEngine.SimEngine.SimEngine()
-        self.settings = SimEngine.SimSettings.SimSettings()
-        self.log = SimEngine.SimLog.SimLog().log
+        # shorthand to the simulation context
+        self.engine = mote.engine
+        self.settings = mote.settings
+        self.log = mote.log
 
         self.mote = mote
 
@@ -194,7 +193,7 @@ class TrickleTimer(object):
             self.t_start = half_interval * (self.ptransmit or 0) # small, allow more. large, stable/less.
             self.t_end = half_interval + (half_interval * (self.pstable or 0)) # small, allow more. large, stable/less.
 
-        self.t = random.uniform(self.t_start, self.t_end)
+        self.t = self.engine.random.uniform(self.t_start, self.t_end)
         assert self.t_start <= self.t_end <= self.interval
         assert self.t_start <= self.t <= self.t_end
 
@@ -218,7 +217,7 @@ class TrickleTimer(object):
         def t_callback():
             self.is_dio_sent = False
             self.current_action = 0
-            self.is_explore = random.uniform(
+            self.is_explore = self.engine.random.uniform(
                 0, 1) < self.epsilon if getattr(self.settings, "algo_use_ql", False) else 1
             # self.qul = self.mote.tsch.get_queue_left()
 
@@ -248,20 +247,20 @@ class TrickleTimer(object):
         def end_t():
             self.end_t_record = self.getOpsMC()
 
-        self.engine.scheduleAtAsn(
+        self.engine.scheduleTimerAtAsn(
             asn=self.correctASN(asn_t),
             cb=t_callback,
             uniqueTag=self.unique_tag_base + u'_at_t',
             intraSlotOrder=d.INTRASLOTORDER_STACKTASKS)
 
-        self.engine.scheduleAtAsn(
+        self.engine.scheduleTimerAtAsn(
             asn=self.correctASN(self.asn_t_start),
             cb=start_t,
             uniqueTag=self.unique_tag_base + u'_at_start_t',
             intraSlotOrder=d.INTRASLOTORDER_STACKTASKS)
 
         if self.t_end < self.interval:
-            self.engine.scheduleAtAsn(
+            self.engine.scheduleTimerAtAsn(
                 asn=self.correctASN(self.asn_t_end),
                 cb=end_t,
                 uniqueTag=self.unique_tag_base + u'_at_end_t',
@@ -292,7 +291,7 @@ class TrickleTimer(object):
             end_t()
             i_callback()
 
-        self.engine.scheduleAtAsn(
+        self.engine.scheduleTimerAtAsn(
             asn=self.correctASN(asn_i),
             cb=i_callback if self.t_end < self.interval else end_t_i_callback,
             uniqueTag=self.unique_tag_base + u'_at_i',
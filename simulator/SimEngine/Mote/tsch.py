@@ -12,7 +12,6 @@ from builtins import object
 from past.utils import old_div
 import copy
 from itertools import chain
-import random
 import math
 
 import netaddr
@@ -38,10 +37,11 @@ class Tsch(object):
         # store params
         self.mote = mote
 
-        # singletons (quicker access, instead of recreating every time)
-        self.engine = SimEngine.SimEngine.SimEngine()
-        self.settings = SimEngine.SimSettings.SimSettings()
-        self.log = SimEngine.SimLog.SimLog().log
+        # shorthands to the simulation context of the mote
+        self.engine = mote.engine
+        self.settings = mote.settings
+        self.log = mote.log
+        self.log_enabled = mote.log_enabled
 
         # local variables
         self.slotframes = {}
@@ -256,7 +256,8 @@ class Tsch(object):
         self.slotframes[slotframe_handle] = SlotFrame(
             mote_id=self.mote.id,
             slotframe_handle=slotframe_handle,
-            num_slots=length
+            num_slots=length,
+            log=self.log
         )
         # sort by handle
         slotframes = {}
@@ -631,7 +632,7 @@ class Tsch(object):
             if asn_t_start is not None and asn_t_end is not None and cur_asn is not None:
                 if asn_t_start <= cur_asn and cur_asn <= asn_t_end:
                     if pkt[u'type'] != d.PKT_TYPE_DIO:
-                        if random.uniform(0, 1) < (self.mote.rpl.trickle_timer.pbusy or 0):
+                        if self.engine.random.uniform(0, 1) < (self.mote.rpl.trickle_timer.pbusy or 0):
                             pkt = None
 
         if self.use_sw and cell.is_minimal_cell() and pkt:
@@ -694,7 +695,7 @@ class Tsch(object):
         # log
         self.log(
             SimEngine.SimLog.LOG_TSCH_TXDONE,
-            {
+            lambda: {
                 u'_mote_id':       self.mote.id,
                 u'channel':        channel,
                 u'slot_offset':    (
@@ -870,7 +871,7 @@ class Tsch(object):
             # log
             self.log(
                 SimEngine.SimLog.LOG_TSCH_RXDONE,
-                {
+                lambda: {
                     u'_mote_id':       self.mote.id,
                     u'channel':        channel,
                     u'slot_offset':    (
@@ -966,7 +967,7 @@ class Tsch(object):
         assert not self.getIsSync()
 
         # choose random channel
-        channel = random.choice(self.hopping_sequence)
+        channel = self.engine.random.choice(self.hopping_sequence)
 
         # start listening
         self.mote.radio.startRx(channel)
@@ -1280,6 +1281,11 @@ class Tsch(object):
         if self.mote.dagRoot:
             return
 
+        if self.log_enabled(SimEngine.SimLog.LOG_PER_SLOTFRAME):
+            self._log_per_slotframe()
+        self.per_slotframe_trigger()
+
+    def _log_per_slotframe(self):
         cell = self.get_minimal_cell()
         all_ops = cell.all_ops if cell else 0
 
@@ -1321,7 +1327,6 @@ class Tsch(object):
                 u'result': result,
             }
         )
-        self.per_slotframe_trigger()
 
     def per_slotframe_trigger(self):
         tag_ = str(self.mote.id) + u'per_slotframe'
@@ -1390,7 +1395,7 @@ class Tsch(object):
 
         # following the Bayesian broadcasting algorithm
         return (
-            (random.random() <= self.eb_used_prob)
+            (self.engine.random.random() <= self.eb_used_prob)
             and
             self.iAmSendingEBs
         )
@@ -1476,7 +1481,7 @@ class Tsch(object):
         # Section 6.2.5.3 of IEEE 802.15.4-2015: "The MAC sublayer shall delay
         # for a random number in the range 0 to (2**BE - 1) shared links (on
         # any slotframe) before attempting a retransmission on a shared link."
-        return random.randint(0, pow(2, self.backoff_exponent) - 1)
+        return self.engine.random.randint(0, pow(2, self.backoff_exponent) - 1)
 
     def _reset_backoff_state(self):
         old_be = self.backoff_exponent
@@ -1608,7 +1613,7 @@ class Tsch(object):
             #
             # the keep-alive interval should be configured in config.json with
             # "tsch_keep_alive_interval".
-            self.engine.scheduleIn(
+            self.engine.scheduleTimerIn(
                 delay=self.settings.tsch_keep_alive_interval,
                 cb=self._send_keep_alive_message,
                 uniqueTag=self._get_event_tag(u'tsch.keep_alive_event'),
@@ -1646,7 +1651,7 @@ class Tsch(object):
             def _desync():
                 self.setIsSync(False)
 
-            self.engine.scheduleAtAsn(
+            self.engine.scheduleTimerAtAsn(
                 asn=target_asn,
                 cb=_desync,
                 uniqueTag=self._get_event_tag(u'tsch.synchronization_timer'),
@@ -1738,9 +1743,9 @@ class Tsch(object):
 
 class Clock(object):
     def __init__(self, mote):
-        # singleton
-        self.engine = SimEngine.SimEngine.SimEngine()
-        self.settings = SimEngine.SimSettings.SimSettings()
+        # shorthands to the simulation context of the mote
+        self.engine = mote.engine
+        self.settings = mote.settings
 
         # local variables
         self.mote = mote
@@ -1754,10 +1759,8 @@ class Clock(object):
 
         self.desync()
 
-    @staticmethod
-    def get_clock_by_mac_addr(mac_addr):
-        engine = SimEngine.SimEngine.SimEngine()
-        mote = engine.get_mote_by_mac_addr(mac_addr)
+    def get_clock_by_mac_addr(self, mac_addr):
+        mote = self.engine.get_mote_by_mac_addr(mac_addr)
         return mote.tsch.clock
 
     def desync(self):
@@ -1781,7 +1784,7 @@ class Clock(object):
             # from the clock source when 32.768 Hz oscillators are used on the
             # both sides. in addition, the clock source also off from a certain
             # amount of time from its source.
-            off_from_source = random.random() * self._clock_interval
+            off_from_source = self.engine.random.random() * self._clock_interval
             source_clock = self.get_clock_by_mac_addr(self.source)
             self._clock_off_on_sync = off_from_source + source_clock.get_drift()
 
@@ -1829,12 +1832,12 @@ class Clock(object):
         max_drift = (
             float(self.settings.tsch_clock_max_drift_ppm) / pow(10, 6)
         )
-        return random.uniform(-1 * max_drift * 2, max_drift * 2)
+        return self.engine.random.uniform(-1 * max_drift * 2, max_drift * 2)
 
 
 class SlotFrame(object):
-    def __init__(self, mote_id, slotframe_handle, num_slots):
-        self.log = SimEngine.SimLog.SimLog().log
+    def __init__(self, mote_id, slotframe_handle, num_slots, log):
+        self.log = log
 
         self.mote_id = mote_id
         self.slotframe_handle = slotframe_handle
@@ -1868,7 +1871,7 @@ class SlotFrame(object):
         # log
         self.log(
             SimEngine.SimLog.LOG_TSCH_ADD_CELL,
-            {
+            lambda: {
                 u'_mote_id':        self.mote_id,
                 u'slotFrameHandle': self.slotframe_handle,
                 u'slotOffset':      cell.slot_offset,
@@ -1892,7 +1895,7 @@ class SlotFrame(object):
         # log
         self.log(
             SimEngine.SimLog.LOG_TSCH_DELETE_CELL,
-            {
+            lambda: {
                 u'_mote_id':        self.mote_id,
                 u'slotFrameHandle': self.slotframe_handle,
                 u'slotOffset':      cell.slot_offset,
@@ -2006,7 +2009,6 @@ class Cell(object):
         self.options = options
         self.mac_addr = mac_addr
         self.link_type = link_type
-        self.log = SimEngine.SimLog.SimLog().log
         self.mote = mote
         self.engine = engine
 
@@ -2047,9 +2049,9 @@ class Cell(object):
             if is_rcv:
                 type_ += '_rcv'
 
-            self.log(
+            self.mote.log(
                 SimEngine.SimLog.LOG_MC_TR,
-                {
+                lambda: {
                     "_mote_id":   self.mote.id,
                     "packet_type": type_
                 }
@@ -143,6 +143,11 @@ class SimConfig(dict):
     def get_startTime(cls):
         return cls._startTime
 
+    @classmethod
+    def set_log_directory_name(cls, log_directory_name):
+        # use an existing log directory, e.g. to resume a sweep
+        cls._log_directory_name = log_directory_name
+
     @staticmethod
     def generate_config(settings_dict, random_seed):
         regular_field = settings_dict
@@ -0,0 +1,43 @@
+"""
+\brief Context of a simulation.
+
+The context holds the objects of one simulation: its settings, its log, its
+engine, its connectivity and its random number generator. The engine creates
+the motes with its context, and the motes hand it down to their layers, which
+then never look up the singletons.
+
+The engine created by SimEngine() builds a context out of the SimSettings and
+SimLog singletons and of the module-level random number generator. Several
+independent simulations can live in the same process (a thread pool, tests)
+when each one is built with its own context:
+
+    settings = SimSettings.SimSettings.create(cpuID=0, run_id=0, **params)
+    settings.setLogDirectory(log_directory)
+    settings.setCombinationKeys(combination_keys)
+    sim_log  = SimLog.SimLog.create(settings)
+    context  = SimContext.SimContext(settings, sim_log)
+    engine   = SimEngine.SimEngine.create(context, run_id=0)
+"""
+from __future__ import absolute_import
+
+# =========================== imports =========================================
+
+from builtins import object
+import random
+
+# =========================== body ============================================
+
+class SimContext(object):
+
+    def __init__(self, settings, sim_log, rng=None):
+        """
+        rng is the random number generator of the simulation; it's seeded by
+        the engine. A new random.Random is used by default.
+        """
+        self.settings     = settings
+        self.sim_log      = sim_log
+        self.log          = sim_log.log
+        self.log_enabled  = sim_log.is_enabled
+        self.random       = rng if rng is not None else random.Random()
+        self.engine       = None # set by the engine
+        self.connectivity = None # set by the engine
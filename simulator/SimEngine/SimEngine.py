@@ -12,7 +12,9 @@ from builtins import str
 from builtins import range
 from past.utils import old_div
 from collections import OrderedDict
+import bisect
 import hashlib
+import heapq
 import platform
 import random
 import sys
@@ -26,16 +28,277 @@ from . import SimSettings
 from . import SimLog
 from . import Connectivity
 from . import SimConfig
+from . import SimContext
+from . import SimSnapshot
 
 # =========================== defines =========================================
 
 # =========================== body ============================================
 
+class NullLock(object):
+    """
+    Lock which does nothing, used in place of threading.RLock when the
+    simulation is never accessed from another thread.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def acquire(self, blocking=True, timeout=-1):
+        return True
+
+    def release(self):
+        pass
+
+class TimerWheel(object):
+    """
+    Hierarchical timer wheel holding the recurring timers of the motes.
+
+    Level 0 holds the timers expiring in the window of SLOTS_PER_LEVEL ASNs
+    starting at self.base, grouped by (asn, intraSlotOrder); each group
+    fires in a single engine event. Level L > 0 has SLOTS_PER_LEVEL buckets
+    of SLOTS_PER_LEVEL**L ASNs each; its buckets are cascaded down to the
+    lower levels each time the wheel enters the window they cover. Arming,
+    cancelling and re-arming a timer are O(1).
+    """
+
+    LEVEL_BITS                 = 8
+    SLOTS_PER_LEVEL            = 1 << LEVEL_BITS
+    INTRASLOTORDER_CASCADE     = -1 # before any other event of the slot
+
+    def __init__(self, engine):
+
+        # store params
+        self.engine            = engine
+
+        # local variables
+        self.base              = 0  # first ASN of the window of level 0
+        self.batches           = {} # (asn, intraSlotOrder) -> OrderedDict(uniqueTag -> cb)
+        self.levels            = {} # level -> index -> OrderedDict(uniqueTag -> (asn, intraSlotOrder, cb))
+        self.timers            = {} # uniqueTag -> (level, batch key or bucket index)
+        self.numUpperTimers    = 0  # number of timers in the levels above 0
+
+    #======================== public ==========================================
+
+    def arm(self, asn, cb, uniqueTag, intraSlotOrder):
+        if self.numUpperTimers == 0:
+            # nothing to cascade: no cascade event kept the window up to
+            # date while the engine was skipping ASNs
+            self.base = self.engine.getAsn() & ~(self.SLOTS_PER_LEVEL - 1)
+
+        self._place(asn, cb, uniqueTag, intraSlotOrder)
+
+    def cancel(self, uniqueTag):
+        (level, key) = self.timers.pop(uniqueTag)
+
+        if level == 0:
+            # the engine event of the batch is left; it fires what remains
+            del self.batches[key][uniqueTag]
+        else:
+            bucket = self.levels[level][key]
+            del bucket[uniqueTag]
+            if not bucket:
+                del self.levels[level][key]
+            self.numUpperTimers -= 1
+
+    #======================== private =========================================
+
+    def _place(self, asn, cb, uniqueTag, intraSlotOrder):
+
+        # find the lowest level whose window contains the ASN, from the
+        # highest bit differing between the ASN and the base
+        level = ((asn ^ self.base).bit_length() - 1) // self.LEVEL_BITS
+
+        if level <= 0:
+            key = (asn, intraSlotOrder)
+            batch = self.batches.get(key)
+            if batch is None:
+                batch = self.batches[key] = OrderedDict()
+                self._schedule_batch(asn, intraSlotOrder)
+            batch[uniqueTag] = cb
+            self.timers[uniqueTag] = (0, key)
+        else:
+            index = (asn >> (self.LEVEL_BITS * level)) & (self.SLOTS_PER_LEVEL - 1)
+            if level not in self.levels:
+                self.levels[level] = {}
+            if index not in self.levels[level]:
+                self.levels[level][index] = OrderedDict()
+            self.levels[level][index][uniqueTag] = (asn, intraSlotOrder, cb)
+            self.timers[uniqueTag] = (level, index)
+            if self.numUpperTimers == 0:
+                self._schedule_cascade()
+            self.numUpperTimers += 1
+
+    def _schedule_batch(self, asn, intraSlotOrder):
+
+        def _fire():
+            self._fire(asn, intraSlotOrder)
+
+        uniqueTag = (u'TimerWheel', asn, intraSlotOrder)
+        if asn == self.engine.getAsn():
+            # cascaded down while entering the window
+            self.engine.scheduleInCurrentSlot(
+                cb               = _fire,
+                uniqueTag        = uniqueTag,
+                intraSlotOrder   = intraSlotOrder,
+            )
+        else:
+            self.engine.scheduleAtAsn(
+                asn              = asn,
+                cb               = _fire,
+                uniqueTag        = uniqueTag,
+                intraSlotOrder   = intraSlotOrder,
+            )
+
+    def _schedule_cascade(self):
+        self.engine.scheduleAtAsn(
+            asn                  = self.base + self.SLOTS_PER_LEVEL,
+            cb                   = self._cascade,
+            uniqueTag            = (u'TimerWheel', u'_cascade'),
+            intraSlotOrder       = self.INTRASLOTORDER_CASCADE,
+        )
+
+    def _fire(self, asn, intraSlotOrder):
+        # the timers can no longer be cancelled once their batch fires
+        batch = self.batches.pop((asn, intraSlotOrder))
+        for uniqueTag in batch:
+            del self.timers[uniqueTag]
+
+        profiler = self.engine.profiler
+        if profiler is None:
+            for cb in batch.values():
+                cb()
+        else:
+            for cb in batch.values():
+                profiler.call(cb, asn, intraSlotOrder)
+
+    def _cascade(self):
+        self.base = self.engine.getAsn()
+        assert self.base % self.SLOTS_PER_LEVEL == 0
+
+        # from the highest level down, so that a timer can go down several
+        # levels at once
+        for level in sorted(self.levels, reverse=True):
+            if self.base % (1 << (self.LEVEL_BITS * level)):
+                continue
+            index = (self.base >> (self.LEVEL_BITS * level)) & (self.SLOTS_PER_LEVEL - 1)
+            bucket = self.levels[level].pop(index, None)
+            if not bucket:
+                continue
+            self.numUpperTimers -= len(bucket)
+            for (uniqueTag, (asn, intraSlotOrder, cb)) in bucket.items():
+                self._place(asn, cb, uniqueTag, intraSlotOrder)
+
+        if self.numUpperTimers:
+            self._schedule_cascade()
+
+class EventProfiler(object):
+    """
+    Wall time spent in the callbacks executed by the engine, keyed by the
+    qualified name of the callback and its intraSlotOrder.
+
+    The time of a callback excludes the time of the profiled callbacks it
+    calls, so that the timers fired by a batch of the timer wheel are
+    accounted for separately from the batch, and the times of all the keys
+    add up to the time spent in callbacks.
+    """
+
+    def __init__(self):
+
+        # local variables
+        self.stats             = {} # (qualname, intraSlotOrder) -> [count, total_s, max_s, num_asns, last_asn]
+        self.numAsns           = 0  # number of ASNs executed
+        self.numEvents         = 0  # number of callbacks executed
+        self.maxEventsPerAsn   = 0
+        self.asn               = None
+        self.asnEvents         = 0  # number of callbacks executed at self.asn
+        self.childTime         = 0  # time of the profiled callbacks called by the running one
+
+    #======================== public ==========================================
+
+    def call(self, cb, asn, intraSlotOrder):
+        """
+        Call cb, executed at asn with intraSlotOrder, and account for it.
+        """
+        if asn != self.asn:
+            self.asn            = asn
+            self.asnEvents      = 0
+            self.numAsns       += 1
+        self.asnEvents         += 1
+        self.numEvents         += 1
+        if self.asnEvents > self.maxEventsPerAsn:
+            self.maxEventsPerAsn = self.asnEvents
+
+        parentChildTime         = self.childTime
+        self.childTime          = 0
+        startTime               = time.perf_counter()
+        try:
+            cb()
+        finally:
+            elapsed             = time.perf_counter() - startTime
+            duration            = elapsed - self.childTime
+            self.childTime      = parentChildTime + elapsed
+
+            key = (self._get_qualname(cb), intraSlotOrder)
+            stat = self.stats.get(key)
+            if stat is None:
+                stat = self.stats[key] = [0, 0.0, 0.0, 0, None]
+            stat[0] += 1
+            stat[1] += duration
+            if duration > stat[2]:
+                stat[2] = duration
+            if stat[4] != asn:
+                stat[3] += 1
+                stat[4]  = asn
+
+    def get_summary(self):
+        """
+        Return the statistics collected so far, the callbacks sorted by
+        decreasing total time.
+        """
+        callbacks = []
+        for ((qualname, intraSlotOrder), stat) in self.stats.items():
+            (count, total_s, max_s, num_asns, _) = stat
+            callbacks.append({
+                u'name':           qualname,
+                u'intraSlotOrder': intraSlotOrder,
+                u'count':          count,
+                u'total_s':        total_s,
+                u'max_s':          max_s,
+                u'events_per_asn': float(count) / num_asns,
+            })
+        callbacks.sort(key=lambda callback: callback[u'total_s'], reverse=True)
+
+        return {
+            u'num_asns':           self.numAsns,
+            u'num_events':         self.numEvents,
+            u'events_per_asn':     (
+                float(self.numEvents) / self.numAsns if self.numAsns else 0.0
+            ),
+            u'max_events_per_asn': self.maxEventsPerAsn,
+            u'total_s':            sum(callback[u'total_s'] for callback in callbacks),
+            u'callbacks':          callbacks,
+        }
+
+    #======================== private =========================================
+
+    @staticmethod
+    def _get_qualname(cb):
+        qualname = getattr(cb, u'__qualname__', None)
+        if qualname is None:
+            # functools.partial and other callable objects
+            qualname = type(cb).__qualname__
+        return qualname
+
 class DiscreteEventEngine(threading.Thread):
 
     #===== start singleton
     _instance      = None
     _init          = False
+    _independent   = False # set on instances returned by create()
 
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
@@ -53,26 +316,7 @@ class DiscreteEventEngine(threading.Thread):
         #===== singleton
 
         try:
-            # store params
-            self.cpuID                          = cpuID
-            self.run_id                         = run_id
-            self.verbose                        = verbose
-
-            # local variables
-            self.dataLock                       = threading.RLock()
-            self.pauseSem                       = threading.Semaphore(0)
-            self.simPaused                      = False
-            self.goOn                           = True
-            self.asn                            = 0
-            self.exc                            = None
-            self.events                         = {}
-            self.uniqueTagSchedule              = {}
-            self.random_seed                    = None
-            self._init_additional_local_variables()
-
-            # initialize parent class
-            threading.Thread.__init__(self)
-            self.name                           = u'DiscreteEventEngine'
+            self._initialize(cpuID, run_id, verbose, context=None)
         except:
             # an exception happened when initializing the instance
 
@@ -81,9 +325,71 @@ class DiscreteEventEngine(threading.Thread):
             cls._init             = False
             raise
 
+    @classmethod
+    def create(cls, context, cpuID=None, run_id=None, verbose=False):
+        """
+        Return a new engine running the simulation of context (see
+        SimContext), independent of the singleton.
+        """
+        self = super(DiscreteEventEngine, cls).__new__(cls)
+        self._independent = True
+        self._initialize(cpuID, run_id, verbose, context)
+        return self
+
+    def _initialize(self, cpuID, run_id, verbose, context):
+        # store params
+        self.cpuID                          = cpuID
+        self.run_id                         = run_id
+        self.verbose                        = verbose
+        self.context                        = context # None for the singleton
+
+        # local variables
+        self.lockFree                       = False
+        self.dataLock                       = threading.RLock()
+        self.pauseSem                       = threading.Semaphore(0)
+        self.simPaused                      = False
+        self.goOn                           = True
+        self.asn                            = 0
+        self.exc                            = None
+        self.events                         = {}
+        self.eventAsns                      = [] # min-heap of the ASNs in self.events
+        self.uniqueTagSchedule              = {}
+        self.slotEvents                     = {} # events of the ASN being executed
+        self.slotIntraSlotOrders            = [] # intraSlotOrders of slotEvents not executed yet
+        self.intraSlotOrder                 = None # intraSlotOrder being executed
+        self.numEventsProcessed             = 0
+        self.profiler                       = None # EventProfiler when profiling
+        self.timerWheel                     = TimerWheel(self)
+        self.snapshotRequests               = [] # (asn, file_path), sorted by ASN
+        self.restored                       = False # restored from a snapshot
+        self.random_seed                    = None
+        self._init_additional_local_variables()
+
+        # initialize parent class
+        threading.Thread.__init__(self)
+        self.name                           = u'DiscreteEventEngine'
+
+    def __getstate__(self):
+        # drop the internals of threading.Thread and the synchronization
+        # primitives; they are re-created by __setstate__
+        state = dict(
+            (k, v) for (k, v) in self.__dict__.items() if not k.startswith(u'_')
+        )
+        del state[u'dataLock']
+        del state[u'pauseSem']
+        return state
+
+    def __setstate__(self, state):
+        threading.Thread.__init__(self)
+        self.__dict__.update(state)
+        self.name                           = u'DiscreteEventEngine'
+        self.dataLock                       = self.create_lock()
+        self.pauseSem                       = threading.Semaphore(0)
+        self.restored                       = True
+
     def destroy(self):
         cls = type(self)
-        if cls._init:
+        if self._independent or cls._init:
             # initialization finished without exception
 
             if self.is_alive():
@@ -92,7 +398,7 @@ class DiscreteEventEngine(threading.Thread):
                 self._actionEndSim()  # causes self.gOn to be set to False
                 # wait until thread is dead
                 self.join(self.DESTORY_WAITING_SECONDS)
-            else:
+            elif not self._independent:
                 # thread NOT start'ed yet, or crashed
 
                 # destroy the singleton
@@ -119,25 +425,53 @@ class DiscreteEventEngine(threading.Thread):
                     if not self.events:
                         break
 
-                    # update the current ASN
-                    self.asn += 1
+                    # jump to the next ASN having events; the heap may
+                    # hold stale ASNs whose events were all removed
+                    nextAsn = heapq.heappop(self.eventAsns)
+                    if nextAsn not in self.events:
+                        continue
 
-                    if self.asn not in self.events:
+                    # take a snapshot requested before this ASN
+                    if (
+                            self.snapshotRequests
+                            and
+                            self.snapshotRequests[0][0] <= nextAsn
+                        ):
+                        heapq.heappush(self.eventAsns, nextAsn)
+                        (_, file_path) = self.snapshotRequests.pop(0)
+                        SimSnapshot.save(self, file_path)
                         continue
 
-                    intraSlotOrderKeys = list(self.events[self.asn].keys())
-                    intraSlotOrderKeys.sort()
+                    # update the current ASN
+                    self.asn = nextAsn
 
-                    cbs = []
-                    for intraSlotOrder in intraSlotOrderKeys:
-                        for uniqueTag, cb in list(self.events[self.asn][intraSlotOrder].items()):
-                            cbs += [cb]
+                    # take all the events of this ASN; they can no longer
+                    # be removed
+                    self.slotEvents = self.events.pop(self.asn)
+                    for uniqueTags in self.slotEvents.values():
+                        for uniqueTag in uniqueTags:
                             del self.uniqueTagSchedule[uniqueTag]
-                    del self.events[self.asn]
+                    self.slotIntraSlotOrders = sorted(self.slotEvents.keys())
+
+                # call the callbacks (outside the dataLock), one intraSlotOrder
+                # at a time; callbacks may add events to a later intraSlotOrder
+                # of this ASN (see scheduleInCurrentSlot)
+                while self.slotIntraSlotOrders:
+                    with self.dataLock:
+                        self.intraSlotOrder = self.slotIntraSlotOrders.pop(0)
+                        cbs = list(self.slotEvents[self.intraSlotOrder].values())
+                        self.numEventsProcessed += len(cbs)
+
+                    if self.profiler is None:
+                        for cb in cbs:
+                            cb()
+                    else:
+                        for cb in cbs:
+                            self.profiler.call(cb, self.asn, self.intraSlotOrder)
 
-                # call the callbacks (outside the dataLock)
-                for cb in cbs:
-                    cb()
+                with self.dataLock:
+                    self.slotEvents          = {}
+                    self.intraSlotOrder      = None
 
         except Exception as e:
             # thread crashed
@@ -180,7 +514,7 @@ class DiscreteEventEngine(threading.Thread):
             sys.stderr.write(output)
 
             # flush all the buffered log data
-            SimLog.SimLog().flush()
+            self.context.sim_log.flush()
 
         else:
             # thread ended (gracefully)
@@ -194,9 +528,10 @@ class DiscreteEventEngine(threading.Thread):
         finally:
 
             # destroy this singleton
-            cls = type(self)
-            cls._instance                      = None
-            cls._init                          = False
+            if not self._independent:
+                cls = type(self)
+                cls._instance                  = None
+                cls._init                      = False
 
     def join(self, timeout=None):
         super(DiscreteEventEngine, self).join(timeout)
@@ -216,6 +551,17 @@ class DiscreteEventEngine(threading.Thread):
                 return mote
         return None
 
+    #=== locking
+
+    def create_lock(self):
+        """
+        Return a new reentrant lock, or a NullLock when running lock-free.
+        """
+        if self.lockFree:
+            return NullLock()
+        else:
+            return threading.RLock()
+
     #=== scheduling
 
     def scheduleAtAsn(self, asn, cb, uniqueTag, intraSlotOrder, auto_correct = False):
@@ -240,6 +586,7 @@ class DiscreteEventEngine(threading.Thread):
                 self.events[asn] = {
                     intraSlotOrder: OrderedDict([(uniqueTag, cb)])
                 }
+                heapq.heappush(self.eventAsns, asn)
 
             elif intraSlotOrder not in self.events[asn]:
                 self.events[asn][intraSlotOrder] = (
@@ -254,6 +601,25 @@ class DiscreteEventEngine(threading.Thread):
 
             self.uniqueTagSchedule[uniqueTag] = (asn, intraSlotOrder)
 
+    def scheduleInCurrentSlot(self, cb, uniqueTag, intraSlotOrder):
+        """
+        Schedule an event at the ASN being executed, after the callbacks of
+        the intraSlotOrder being executed.
+        The event cannot be removed.
+        """
+
+        with self.dataLock:
+
+            # make sure we are scheduling later in the slot
+            assert self.intraSlotOrder is not None
+            assert intraSlotOrder > self.intraSlotOrder
+
+            if intraSlotOrder not in self.slotEvents:
+                self.slotEvents[intraSlotOrder] = OrderedDict()
+                bisect.insort(self.slotIntraSlotOrders, intraSlotOrder)
+
+            self.slotEvents[intraSlotOrder][uniqueTag] = cb
+
     def scheduleIn(self, delay, cb, uniqueTag, intraSlotOrder):
         """
         Schedule an event 'delay' seconds into the future.
@@ -265,6 +631,39 @@ class DiscreteEventEngine(threading.Thread):
 
             self.scheduleAtAsn(asn, cb, uniqueTag, intraSlotOrder)
 
+    def scheduleTimerAtAsn(self, asn, cb, uniqueTag, intraSlotOrder):
+        """
+        Arm a timer at a particular ASN in the future, in the timer wheel.
+        Meant for the recurring tasks of the motes, which are re-armed or
+        cancelled often.
+        Also removes all future events with the same uniqueTag.
+        """
+
+        # make sure we are scheduling in the future
+        assert asn > self.asn
+
+        with self.dataLock:
+
+            # remove all events with same uniqueTag (the timer will be re-armed)
+            timerWheel = self.timerWheel
+            if uniqueTag in timerWheel.timers:
+                timerWheel.cancel(uniqueTag)
+            elif uniqueTag in self.uniqueTagSchedule:
+                self.removeFutureEvent(uniqueTag)
+
+            timerWheel.arm(asn, cb, uniqueTag, intraSlotOrder)
+
+    def scheduleTimerIn(self, delay, cb, uniqueTag, intraSlotOrder):
+        """
+        Arm a timer 'delay' seconds into the future, in the timer wheel.
+        Also removes all future events with the same uniqueTag.
+        """
+
+        with self.dataLock:
+            asn = int(self.asn + (float(delay) / float(self.settings.tsch_slotDuration)))
+
+            self.scheduleTimerAtAsn(asn, cb, uniqueTag, intraSlotOrder)
+
     # === play/pause
 
     def play(self):
@@ -278,14 +677,38 @@ class DiscreteEventEngine(threading.Thread):
             intraSlotOrder   = Mote.MoteDefines.INTRASLOTORDER_ADMINTASKS,
         )
 
+    # === snapshot
+
+    def snapshotAtAsn(self, asn, file_path):
+        """
+        Save a snapshot of the simulation into 'file_path' once all the
+        events before 'asn' are executed. See SimSnapshot.restore().
+        """
+
+        with self.dataLock:
+
+            # make sure we are taking it in the future
+            assert asn > self.asn
+
+            self.snapshotRequests.append((asn, file_path))
+            self.snapshotRequests.sort(key=lambda request: request[0])
+
     # === misc
 
     def is_scheduled(self, uniqueTag):
         with self.dataLock:
-            return uniqueTag in self.uniqueTagSchedule
+            return (
+                (uniqueTag in self.uniqueTagSchedule)
+                or
+                (uniqueTag in self.timerWheel.timers)
+            )
 
     def removeFutureEvent(self, uniqueTag):
         with self.dataLock:
+            if uniqueTag in self.timerWheel.timers:
+                self.timerWheel.cancel(uniqueTag)
+                return
+
             if uniqueTag not in self.uniqueTagSchedule:
                 # new event, not need to delete old instances
                 return
@@ -401,16 +824,16 @@ class SimEngine(DiscreteEventEngine):
             self.log(SimLog.LOG_ALL_JOINED, {"result": result})
             
 
-    def _init_additional_local_variables(self):
-        self.settings                   = SimSettings.SimSettings()
-
-        # set random seed
+    def get_random_seed(self):
+        """
+        Return the random seed of the run given by exec_randomSeed.
+        """
         if   self.settings.exec_randomSeed == u'random':
-            self.random_seed = random.randint(0, sys.maxsize)
+            random_seed = self.random.randint(0, sys.maxsize)
         elif   self.settings.exec_randomSeed == u'run_id':
-            self.random_seed = int(self.run_id)
+            random_seed = int(self.run_id)
             if hasattr(self.settings, 'exec_randomSeed_add'):
-                self.random_seed += self.settings.exec_randomSeed_add
+                random_seed += self.settings.exec_randomSeed_add
         elif self.settings.exec_randomSeed == u'context':
             # with context for exec_randomSeed, an MD5 value of
             # 'startTime-hostname-run_id' is used for a random seed
@@ -420,12 +843,50 @@ class SimEngine(DiscreteEventEngine):
             context = (platform.uname()[1], str(startTime), str(self.run_id))
             md5 = hashlib.md5()
             md5.update(u'-'.join(context).encode('utf-8'))
-            self.random_seed = int(md5.hexdigest(), 16) % sys.maxsize
+            random_seed = int(md5.hexdigest(), 16) % sys.maxsize
         else:
-            self.random_seed = int(self.settings.exec_randomSeed)
+            random_seed = int(self.settings.exec_randomSeed)
+        return random_seed
+
+    def reseed(self):
+        """
+        Draw the random values of the rest of the run from the random seed
+        given by the settings, e.g. once a snapshot is restored with another
+        exec_randomSeed or run_id.
+        """
+        self.random_seed = self.get_random_seed()
+        self.random.seed(a=self.random_seed)
+        self.connectivity.reseed()
+        self.log(
+            SimLog.LOG_SIMULATOR_RANDOM_SEED,
+            {
+                u'value': self.random_seed
+            }
+        )
+
+    def _init_additional_local_variables(self):
+        # the singleton engine runs the simulation of the singletons
+        singleton = self.context is None
+        if singleton:
+            self.context = SimContext.SimContext(
+                settings = SimSettings.SimSettings(),
+                sim_log  = SimLog.SimLog(),
+                rng      = random
+            )
+        self.context.engine             = self
+        self.settings                   = self.context.settings
+        self.random                     = self.context.random
+
+        # drop the locks of the engine and the motes when nothing but the
+        # simulation thread accesses them (headless runs)
+        self.lockFree                   = getattr(self.settings, u'exec_lockFree', False)
+        self.dataLock                   = self.create_lock()
+
+        # set random seed
+        self.random_seed = self.get_random_seed()
 
         # apply the random seed; log the seed after self.log is initialized
-        random.seed(a=self.random_seed)
+        self.random.seed(a=self.random_seed)
 
         if self.settings.motes_eui64:
             eui64_table = self.settings.motes_eui64[:]
@@ -437,7 +898,7 @@ class SimEngine(DiscreteEventEngine):
             eui64_table = [None] * self.settings.exec_numMotes
 
         self.motes = [
-            Mote.Mote.Mote(id, eui64)
+            Mote.Mote.Mote(id, self.context, eui64)
             for id, eui64 in zip(
                     list(range(self.settings.exec_numMotes)),
                     eui64_table
@@ -449,9 +910,13 @@ class SimEngine(DiscreteEventEngine):
             assert len(eui64_list) < len(self.motes)
             raise ValueError(u'given motes_eui64 causes dulicates')
 
-        self.connectivity               = Connectivity.Connectivity(self)
-        self.log                        = SimLog.SimLog().log
-        SimLog.SimLog().set_simengine(self)
+        if singleton:
+            self.connectivity           = Connectivity.Connectivity(self)
+        else:
+            self.connectivity           = Connectivity.Connectivity.create(self)
+        self.context.connectivity       = self.connectivity
+        self.log                        = self.context.log
+        self.context.sim_log.set_simengine(self)
 
         # log the random seed
         self.log(
@@ -464,13 +929,28 @@ class SimEngine(DiscreteEventEngine):
         # 'random_seed' lines, right now. This could help, for instance, when a
         # simulation is stuck by an infinite loop without writing these
         # 'config' and 'random_seed' to a log file.
-        SimLog.SimLog().flush()
+        self.context.sim_log.flush()
 
         # select dagRoot
         self.motes[self.DAGROOT_ID].setDagRoot()
 
         self.is_addremove = getattr(self.settings, "algo_simulate_addremove", 0)
         self.addremove_ratio = getattr(self.settings, "algo_addremove_ratio", 0.1)
+
+        # end the run once the network converged: all motes joined and the
+        # metrics of _get_convergence_sample() stable over two consecutive
+        # windows of exec_convergenceNumSlotframes slotframes (disabled when
+        # null)
+        self.convergence_num_slotframes = getattr(self.settings, u'exec_convergenceNumSlotframes', None)
+        self.convergence_tolerance = getattr(self.settings, u'exec_convergenceTolerance', 0.1)
+        self.convergence_samples = [] # one per slotframe, once all motes joined
+
+        # profile the callbacks of the event loop; the summary is logged at
+        # the end of the run, and every exec_profileDumpSlotframes slotframes
+        # when set
+        if getattr(self.settings, u'exec_profile', False):
+            self.profiler = EventProfiler()
+        self.profile_dump_slotframes = getattr(self.settings, u'exec_profileDumpSlotframes', None)
         
         # TODO DZAKY 
         # 0 NO / 1 Add / 2 Remove
@@ -489,7 +969,7 @@ class SimEngine(DiscreteEventEngine):
         if self.is_addremove in [1, 2]:
             k = int(self.addremove_ratio * len(self.motes))
             self.addrem_motes = np.copy(all_motes[1:]).tolist()
-            random.shuffle(self.addrem_motes)
+            self.random.shuffle(self.addrem_motes)
             self.addrem_motes = self.addrem_motes[:k]
             print(f"\nSimulate Add/Remove on {k} motes:", self.addrem_motes)
             assert len(set(self.addrem_motes)) == k
@@ -509,6 +989,15 @@ class SimEngine(DiscreteEventEngine):
 
         end_slotframe = self.settings.exec_numSlotframesPerRun - 1
 
+        if (
+                self.profiler is not None
+                and
+                self.profile_dump_slotframes
+                and
+                (slotframe_iteration + 1) % self.profile_dump_slotframes == 0
+            ):
+            self._log_profile(final=False)
+
         if self.is_addremove and slotframe_iteration == int(end_slotframe / 2):
             k = len(self.addrem_motes)
             if self.is_addremove == 1:
@@ -521,17 +1010,101 @@ class SimEngine(DiscreteEventEngine):
                     self.motes[i].kill()
 
         elif slotframe_iteration == end_slotframe:
-            time_m = self.asn * self.settings.tsch_slotDuration / 60
-            diff_ops = self.all_ops-self.all_joined_ops
-            result = {
-                'slotframe': slotframe_iteration,
-                'time_m': time_m,
-                'all_ops': self.all_ops / self.settings.exec_numMotes,
-                'diff_ops': diff_ops / self.settings.exec_numMotes,
-                'mbr_diff_ops': diff_ops / slotframe_iteration / self.settings.exec_numMotes,
-                'mbr_all_ops': self.all_ops / slotframe_iteration / self.settings.exec_numMotes
-            }
-            self.log(SimLog.LOG_SIMULATOR_END, {"result": result})
+            self._log_simulator_end(slotframe_iteration)
+
+        else:
+            reason = self._check_convergence(slotframe_iteration)
+            if reason is not None:
+                # end the run early, with the logs of the end of a run
+                self.log(SimLog.LOG_SIMULATOR_CONVERGED, {"result": reason})
+                for mote in self.motes:
+                    mote.rpl.last_slotframe_callback()
+                self._log_simulator_end(slotframe_iteration)
+                self._actionEndSim()
+
+    def _log_profile(self, final):
+        summary = self.profiler.get_summary()
+        summary[u'slotframe'] = int(old_div(self.asn, self.settings.tsch_slotframeLength))
+        summary[u'final']     = final
+        self.log(SimLog.LOG_SIMULATOR_PROFILE, summary)
+
+    def _log_simulator_end(self, slotframe_iteration):
+        time_m = self.asn * self.settings.tsch_slotDuration / 60
+        diff_ops = self.all_ops-self.all_joined_ops
+        result = {
+            'slotframe': slotframe_iteration,
+            'time_m': time_m,
+            'all_ops': self.all_ops / self.settings.exec_numMotes,
+            'diff_ops': diff_ops / self.settings.exec_numMotes,
+            'mbr_diff_ops': diff_ops / slotframe_iteration / self.settings.exec_numMotes,
+            'mbr_all_ops': self.all_ops / slotframe_iteration / self.settings.exec_numMotes
+        }
+        self.log(SimLog.LOG_SIMULATOR_END, {"result": result})
+
+    def _get_convergence_sample(self):
+        # number of DIOs sent so far, mean txQueue length and mean trickle
+        # pbusy of the motes
+        return (
+            sum(mote.rpl.count_dio for mote in self.motes),
+            float(sum(len(mote.tsch.txQueue) for mote in self.motes)) / len(self.motes),
+            float(sum(
+                getattr(mote.rpl.trickle_timer, u'pbusy', None) or 0
+                for mote in self.motes
+            )) / len(self.motes),
+        )
+
+    def _check_convergence(self, slotframe_iteration):
+        """
+        Return the reason to end the run early, None when the network has not
+        converged (or when early termination is disabled).
+        """
+        num_slotframes = self.convergence_num_slotframes
+        if not num_slotframes:
+            return None
+
+        if self.joined_motes < self.settings.exec_numMotes:
+            return None
+
+        if (
+                self.is_addremove
+                and
+                slotframe_iteration <= int((self.settings.exec_numSlotframesPerRun - 1) / 2)
+            ):
+            # motes are still to be added or removed
+            return None
+
+        self.convergence_samples.append(self._get_convergence_sample())
+        if len(self.convergence_samples) < 2 * num_slotframes + 1:
+            return None
+        del self.convergence_samples[:-(2 * num_slotframes + 1)]
+
+        # the metrics over the previous and the last windows
+        windows = []
+        for samples in [
+                self.convergence_samples[:num_slotframes + 1],
+                self.convergence_samples[num_slotframes:]
+            ]:
+            windows.append({
+                u'dio_rate': float(samples[-1][0] - samples[0][0]) / num_slotframes,
+                u'queue':    sum(sample[1] for sample in samples[1:]) / num_slotframes,
+                u'pbusy':    sum(sample[2] for sample in samples[1:]) / num_slotframes,
+            })
+
+        for (metric, value) in windows[1].items():
+            previous_value = windows[0][metric]
+            if (
+                    abs(value - previous_value)
+                    >
+                    self.convergence_tolerance * max(abs(value), abs(previous_value))
+                ):
+                return None
+
+        return {
+            u'slotframe':      slotframe_iteration,
+            u'num_slotframes': num_slotframes,
+            u'tolerance':      self.convergence_tolerance,
+            u'metrics':        windows[1],
+        }
 
     def _routine_thread_started(self):
         # log
@@ -539,11 +1112,12 @@ class SimEngine(DiscreteEventEngine):
             SimLog.LOG_SIMULATOR_STATE,
             {
                 u'name':   self.name,
-                u'state':  u'started'
+                u'state':  u'restored' if self.restored else u'started'
             }
         )
 
-        # schedule end of simulation
+        # schedule end of simulation; the run length may have been changed
+        # when restoring a snapshot
         self.scheduleAtAsn(
             asn              = self.settings.tsch_slotframeLength*self.settings.exec_numSlotframesPerRun,
             cb               = self._actionEndSim,
@@ -551,6 +1125,10 @@ class SimEngine(DiscreteEventEngine):
             intraSlotOrder   = Mote.MoteDefines.INTRASLOTORDER_ADMINTASKS,
         )
 
+        if self.restored:
+            # the other events are in the restored event queue
+            return
+
         # schedule action at every end of slotframe_iteration
         self.scheduleAtAsn(
             asn              = self.asn + self.settings.tsch_slotframeLength - 1,
@@ -570,6 +1148,9 @@ class SimEngine(DiscreteEventEngine):
         )
 
     def _routine_thread_ended(self):
+        if self.profiler is not None:
+            self._log_profile(final=True)
+
         # log
         self.log(
             SimLog.LOG_SIMULATOR_STATE,
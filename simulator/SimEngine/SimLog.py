@@ -18,9 +18,13 @@ from __future__ import absolute_import
 from builtins import str
 from builtins import object
 import copy
-import json
+import os
+import queue
+import threading
 import traceback
 
+from . import LogColumns
+from . import LogFormat
 from . import SimSettings
 
 # =========================== defines =========================================
@@ -33,6 +37,11 @@ LOG_SIMULATOR_RANDOM_SEED = {
 
 LOG_ALL_JOINED = {u'type': u'simulator.all_joined', u'keys': [u'result']}
 LOG_SIMULATOR_END = {u'type': u'simulator.end', u'keys': [u'result']}
+LOG_SIMULATOR_CONVERGED = {u'type': u'simulator.converged', u'keys': [u'result']}
+LOG_SIMULATOR_PROFILE = {u'type': u'simulator.profile',
+                         u'keys': [u'slotframe', u'final', u'num_asns', u'num_events',
+                                   u'events_per_asn', u'max_events_per_asn',
+                                   u'total_s', u'callbacks']}
 
 # === packet drops
 LOG_PACKET_DROPPED = {u'type': u'packet_dropped',
@@ -167,7 +176,95 @@ LOG_PROP_DROP_LOCKON = {u'type': u'prop.drop_lockon',         u'keys': [
 
 # === connectivity matrix
 LOG_CONN_MATRIX_K7_UPDATE = {u'type': u'conn.matrix.update',        u'keys': [
-    u'start_trace_position', u'end_trace_position', u'asn_of_next_update']}
+    u'start_trace_position', u'end_trace_position', u'read_ahead_position',
+    u'asn_of_next_update']}
+LOG_CONN_MATRIX_FADING_UPDATE = {u'type': u'conn.matrix.fading_update', u'keys': [
+    u'block_position', u'asn_of_next_update']}
+
+# ============================ writers ========================================
+
+class AsyncLogWriter(object):
+    """
+    Write the lines of a log file from a background thread.
+
+    The lines are grouped in batches of batch_size lines, handed to the
+    thread over a queue of at most queue_size batches; write() blocks while
+    the queue is full, so that the simulation never runs too far ahead of
+    the writes. flush() returns once all the lines written so far are in the
+    file. An error of the thread is raised by the next write() or flush().
+
+    It has the methods of the log file used by SimLog.
+    """
+
+    def __init__(self, file_path, mode=u'a', batch_size=1000, queue_size=16,
+                 compression=None):
+        self.file = LogFormat.open_output_file(file_path, mode, compression)
+        self.empty = b'' if u'b' in mode else u''
+        self.name = self.file.name
+        self.batch_size = batch_size
+        self.batch = []
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.exc = None
+        self.thread = threading.Thread(
+            target=self._run,
+            name=u'AsyncLogWriter',
+            daemon=True
+        )
+        self.thread.start()
+
+    @property
+    def closed(self):
+        return self.file.closed
+
+    def write(self, line):
+        self.batch.append(line)
+        if len(self.batch) >= self.batch_size:
+            self._put_batch()
+
+    def flush(self):
+        if self.batch:
+            self._put_batch()
+        self.queue.join()
+        self._raise_thread_error()
+        self.file.flush()
+
+    def tell(self):
+        self.flush()
+        return self.file.tell()
+
+    def close(self):
+        # the thread is stopped and the file closed, also when flush()
+        # raises the error of the thread
+        try:
+            self.flush()
+        finally:
+            self.queue.put(None)
+            self.thread.join()
+            self.file.close()
+
+    # ============================== private ==================================
+
+    def _put_batch(self):
+        self._raise_thread_error()
+        self.queue.put(self.batch)
+        self.batch = []
+
+    def _raise_thread_error(self):
+        if self.exc is not None:
+            raise self.exc
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            try:
+                if batch is None:
+                    return
+                if self.exc is None:
+                    self.file.write(self.empty.join(batch))
+            except Exception as err:
+                self.exc = err
+            finally:
+                self.queue.task_done()
 
 # ============================ SimLog =========================================
 
@@ -177,6 +274,7 @@ class SimLog(object):
     # ==== start singleton
     _instance = None
     _init = False
+    _independent = False # set on instances returned by create()
 
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
@@ -197,42 +295,42 @@ class SimLog(object):
         # ==== end singleton
 
         try:
-            # get singletons
-            self.settings = SimSettings.SimSettings()
-            self.engine = None  # will be defined by set_simengine
-
-            # local variables
-            self.log_filters = []
-
-            # open log file
-            self.log_output_file = open(self.settings.getOutputFile(), u'a')
-
-            # write config to log file; if a file with the same file name exists,
-            # append logs to the file. this happens if you multiple runs on the
-            # same CPU. And amend config line; config line in log file should have
-            # '_type' field. And 'run_id' type should be '_run_id'
-            config_line = copy.deepcopy(self.settings.__dict__)
-            config_line[u'_type'] = u'config'
-            config_line[u'_run_id'] = config_line[u'run_id']
-            del config_line[u'run_id']
-            json_string = json.dumps(config_line)
-            self.log_output_file.write(json_string + u'\n')
+            self._initialize(SimSettings.SimSettings())
         except:
             # destroy the singleton
             cls._instance = None
             cls._init = False
             raise
 
+    @classmethod
+    def create(cls, settings):
+        """
+        Return a new log of the given settings, independent of the singleton
+        (see SimContext).
+        """
+        self = super(SimLog, cls).__new__(cls)
+        self._independent = True
+        self._initialize(settings)
+        return self
+
     def log(self, simlog, content):
         """
         :param dict simlog:
-        :param dict content:
+        :param content: dict, or a function returning it, which is only
+            called when the type of simlog is enabled
         """
 
         # ignore types that are not listed in the simulation config
-        if (self.log_filters != u'all') and (simlog[u'type'] not in self.log_filters):
+        if (
+                (self.enabled_types is not None)
+                and
+                (simlog[u'type'] not in self.enabled_types)
+            ):
             return
 
+        if callable(content):
+            content = content()
+
         # if a key is passed but is not listed in the log definition, raise error
         if (u'keys' in simlog) and (sorted(simlog[u'keys']) != sorted(content.keys())):
             raise Exception(
@@ -261,8 +359,7 @@ class SimLog(object):
 
         # write line
         try:
-            json_string = json.dumps(content, sort_keys=True)
-            self.log_output_file.write(json_string + u'\n')
+            self.log_output_file.write(self.encoder.encode(content))
         except Exception as err:
             output = []
             output += [u'----------------------']
@@ -279,24 +376,177 @@ class SimLog(object):
             print(output)
             raise
 
+        if self.columns is not None:
+            self.columns.append(content)
+
     def flush(self):
         # flush the internal buffer, write data to the file
         assert not self.log_output_file.closed
         self.log_output_file.flush()
 
+    def get_run_logs(self):
+        """
+        Return the lines logged by this run after its config line.
+        """
+        self.flush()
+        if self.compression is not None:
+            # the lines of this run are in the gzip member it writes
+            data = LogFormat.read_segment(
+                self.log_output_file.name,
+                self.segment_offset
+            )[self.log_start_position:]
+            return data if self.encoder.mode else data.decode(u'utf-8')
+        with open(self.log_output_file.name, u'r' + self.encoder.mode) as f:
+            f.seek(self.log_start_position)
+            return f.read()
+
+    def resume(self, run_logs):
+        """
+        Reopen the log file, after a snapshot is restored, and write a new
+        config line followed by the lines logged before the snapshot.
+        """
+        self.log_output_file = self._open_output_file()
+        self._write_config_line()
+        self.log_output_file.write(run_logs)
+
     def set_simengine(self, engine):
         self.engine = engine
 
     def set_log_filters(self, log_filters):
         self.log_filters = log_filters
+        if log_filters == u'all':
+            self.enabled_types = None
+        else:
+            self.enabled_types = frozenset(log_filters)
+
+    def is_enabled(self, simlog):
+        """
+        Return whether the lines of simlog are logged; use it to skip work
+        only done for a line.
+        """
+        return (
+            (self.enabled_types is None)
+            or
+            (simlog[u'type'] in self.enabled_types)
+        )
 
     def destroy(self):
         # close log file
         if not self.log_output_file.closed:
             self.log_output_file.close()
 
-        cls = type(self)
-        cls._instance = None
-        cls._init = False
+            if self.compression is not None:
+                LogFormat.append_index(
+                    self.log_output_file.name,
+                    [
+                        {
+                            u'run_id': self.settings.run_id,
+                            u'offset': self.segment_offset,
+                            u'length': (
+                                os.path.getsize(self.log_output_file.name)
+                                - self.segment_offset
+                            ),
+                        }
+                    ]
+                )
+
+        if self.columns is not None:
+            self.columns.write(
+                self.settings.getOutputFile(),
+                self.settings.run_id
+            )
+
+        if not self._independent:
+            cls = type(self)
+            cls._instance = None
+            cls._init = False
+
+    def __getstate__(self):
+        # the log file is reopened by resume()
+        state = self.__dict__.copy()
+        del state[u'log_output_file']
+        return state
 
     # ============================== private ==================================
+
+    def _initialize(self, settings):
+        self.settings = settings
+        self.engine = None  # will be defined by set_simengine
+
+        # local variables
+        self.set_log_filters([])
+
+        # with log_format 'binary', the lines are written as binary records
+        # (see LogFormat)
+        self.encoder = LogFormat.get_encoder(
+            getattr(self.settings, u'log_format', LogFormat.FORMAT_JSON)
+        )
+
+        # with log_columnar, the lines are also stored by log type, in
+        # chunks of columns put together at the end of the run (see
+        # LogColumns)
+        if getattr(self.settings, u'log_columnar', False):
+            self.columns = LogColumns.ColumnarLogSink(
+                chunk_size=getattr(
+                    self.settings,
+                    u'log_columnar_chunk_size',
+                    LogColumns.DEFAULT_CHUNK_SIZE
+                )
+            )
+        else:
+            self.columns = None
+
+        # with log_compression, the lines of the run are compressed into a
+        # gzip member of their own, listed in the index of the log file (see
+        # LogFormat)
+        self.compression = getattr(self.settings, u'log_compression', None)
+
+        # open log file
+        self.log_output_file = self._open_output_file()
+
+        # write config to log file
+        self._write_config_line()
+
+    def _open_output_file(self):
+        # with log_async_writer, the lines are serialized by log() but
+        # written to the file by a background thread (see AsyncLogWriter).
+        # The content of a line is serialized right away, since the objects
+        # it refers to (packets, ...) change once logged
+        file_path = self.settings.getOutputFile()
+        mode = u'a' + self.encoder.mode
+        if os.path.exists(file_path):
+            self.segment_offset = os.path.getsize(file_path)
+        else:
+            self.segment_offset = 0
+        if getattr(self.settings, u'log_async_writer', False):
+            log_output_file = AsyncLogWriter(
+                file_path,
+                mode=mode,
+                batch_size=getattr(self.settings, u'log_writer_batch_size', 1000),
+                queue_size=getattr(self.settings, u'log_writer_queue_size', 16),
+                compression=self.compression
+            )
+        else:
+            log_output_file = LogFormat.open_output_file(
+                file_path,
+                mode,
+                self.compression
+            )
+        log_output_file.write(self.encoder.header())
+        return log_output_file
+
+    def _write_config_line(self):
+        # if a file with the same file name exists, append logs to the
+        # file. this happens if you multiple runs on the same CPU. And amend
+        # config line; config line in log file should have '_type'
+        # field. And 'run_id' type should be '_run_id'
+        config_line = copy.deepcopy(self.settings.__dict__)
+        config_line[u'_type'] = u'config'
+        config_line[u'_run_id'] = config_line[u'run_id']
+        del config_line[u'run_id']
+        self.log_output_file.write(
+            self.encoder.encode(config_line, sort_keys=False)
+        )
+
+        # position of the first line logged by this run
+        self.log_start_position = self.log_output_file.tell()
@@ -12,6 +12,7 @@ from __future__ import division
 # =========================== imports =========================================
 
 from builtins import object
+import errno
 import math
 import os
 import re
@@ -55,50 +56,29 @@ class SimSettings(object):
         # ==== end singleton
 
         try:
-            # store params
-            self.cpuID                = cpuID
-            self.run_id               = run_id
-            self.logRootDirectoryPath = os.path.abspath(log_root_dir)
-
-            if kwargs:
-                self.__dict__.update(kwargs)
-                if self.exec_numSlotframesPerRun and self.exec_minutesPerRun:
-                    raise ValueError(
-                        'exec_numSlotframesPerRun should be null ' +
-                        'when exec_minutesPerRun is used'
-                    )
-                elif self.exec_minutesPerRun:
-                    assert self.exec_numSlotframesPerRun is None
-                    # convert "minutes" to "slot
-                    self.exec_numSlotframesPerRun = int(
-                        math.ceil(
-                            self.exec_minutesPerRun *
-                            60 /
-                            self.tsch_slotDuration /
-                            self.tsch_slotframeLength
-                        )
-                    )
-                    # invdalite self.exec_minutesPerRun for the sake
-                    # of extract_config_json.py and the exception
-                    # handler who generates config.json for
-                    # reproduction
-                    self.exec_minutesPerRun = None
-                elif self.exec_numSlotframesPerRun:
-                    assert self.exec_minutesPerRun is None
-                    self.exec_numSlotframesPerRun = int(
-                        self.exec_numSlotframesPerRun
-                    )
-                else:
-                    raise ValueError(
-                        'either exec_numSlotframesPerRun or ' +
-                        'exec_minutesPerRun should be specified'
-                    )
+            self._initialize(cpuID, run_id, log_root_dir, **kwargs)
         except:
             # destroy the singleton
             cls._instance = None
             cls._init = False
             raise
 
+    @classmethod
+    def create(
+            cls,
+            cpuID=None,
+            run_id=None,
+            log_root_dir=DEFAULT_LOG_ROOT_DIR,
+            **kwargs
+        ):
+        """
+        Return new settings, independent of the singleton (see SimContext).
+        They are not destroyed.
+        """
+        self = super(SimSettings, cls).__new__(cls)
+        self._initialize(cpuID, run_id, log_root_dir, **kwargs)
+        return self
+
     def setLogDirectory(self, log_directory_name):
         self.logDirectory = log_directory_name
 
@@ -122,7 +102,7 @@ class SimSettings(object):
             try:
                 os.makedirs(dirname)
             except OSError as e:
-                if e.errno == os.errno.EEXIST:
+                if e.errno == errno.EEXIST:
                     # FIXME: handle this race condition properly
                     # Another core/CPU has already made this directory
                     pass
@@ -138,7 +118,63 @@ class SimSettings(object):
 
         return datafilename
 
+    def update(self, **kwargs):
+        """
+        Change settings of an existing instance, e.g. when restoring a
+        snapshot. The run length can be changed with either
+        exec_numSlotframesPerRun or exec_minutesPerRun.
+        """
+        if u'exec_minutesPerRun' in kwargs:
+            self.exec_numSlotframesPerRun = None
+        self.__dict__.update(kwargs)
+        self._set_num_slotframes_per_run()
+
     def destroy(self):
         cls = type(self)
         cls._instance = None
         cls._init     = False
+
+    # ======================== private ========================================
+
+    def _initialize(self, cpuID, run_id, log_root_dir, **kwargs):
+        # store params
+        self.cpuID                = cpuID
+        self.run_id               = run_id
+        self.logRootDirectoryPath = os.path.abspath(log_root_dir)
+
+        if kwargs:
+            self.__dict__.update(kwargs)
+            self._set_num_slotframes_per_run()
+
+    def _set_num_slotframes_per_run(self):
+        if self.exec_numSlotframesPerRun and self.exec_minutesPerRun:
+            raise ValueError(
+                'exec_numSlotframesPerRun should be null ' +
+                'when exec_minutesPerRun is used'
+            )
+        elif self.exec_minutesPerRun:
+            assert self.exec_numSlotframesPerRun is None
+            # convert "minutes" to "slot
+            self.exec_numSlotframesPerRun = int(
+                math.ceil(
+                    self.exec_minutesPerRun *
+                    60 /
+                    self.tsch_slotDuration /
+                    self.tsch_slotframeLength
+                )
+            )
+            # invdalite self.exec_minutesPerRun for the sake
+            # of extract_config_json.py and the exception
+            # handler who generates config.json for
+            # reproduction
+            self.exec_minutesPerRun = None
+        elif self.exec_numSlotframesPerRun:
+            assert self.exec_minutesPerRun is None
+            self.exec_numSlotframesPerRun = int(
+                self.exec_numSlotframesPerRun
+            )
+        else:
+            raise ValueError(
+                'either exec_numSlotframesPerRun or ' +
+                'exec_minutesPerRun should be specified'
+            )
@@ -0,0 +1,164 @@
+"""
+\brief Snapshot of a running simulation.
+
+A snapshot holds the whole state of a simulation: the settings, the engine
+with its event queue and timer wheel, the motes, the connectivity, the state
+of the random number generators and the lines logged so far by the run. It is
+taken between two ASNs (see SimEngine.snapshotAtAsn) and restored in a fresh
+process by restore(), typically to run several simulations from a network
+which already went through its formation phase.
+
+Callbacks which are nested functions or lambdas are saved by value (code
+object and closure). A snapshot can only be restored with the same Python
+version and the same simulator code as the ones which took it.
+"""
+from __future__ import absolute_import
+
+# =========================== imports =========================================
+
+import importlib
+import marshal
+import pickle
+import threading
+import types
+
+import numpy as np
+
+from . import SimSettings
+from . import SimLog
+from . import Connectivity
+from . import SimEngine
+
+# =========================== defines =========================================
+
+_RLOCK_TYPE = type(threading.RLock())
+
+# =========================== helpers =========================================
+
+def _make_function(code, module_name, name, qualname, defaults, kwdefaults, closure):
+    function = types.FunctionType(
+        marshal.loads(code),
+        importlib.import_module(module_name).__dict__,
+        name,
+        defaults,
+        closure
+    )
+    function.__qualname__  = qualname
+    function.__kwdefaults__ = kwdefaults
+    return function
+
+def _make_cell():
+    return types.CellType()
+
+def _set_cell_contents(cell, contents):
+    cell.cell_contents = contents
+
+class _Pickler(pickle.Pickler):
+
+    def reducer_override(self, obj):
+        if isinstance(obj, types.FunctionType) and (
+                u'<locals>' in obj.__qualname__
+                or
+                obj.__name__ == u'<lambda>'
+            ):
+            # nested function or lambda; save it by value
+            return (
+                _make_function,
+                (
+                    marshal.dumps(obj.__code__),
+                    obj.__module__,
+                    obj.__name__,
+                    obj.__qualname__,
+                    obj.__defaults__,
+                    obj.__kwdefaults__,
+                    obj.__closure__,
+                )
+            )
+        elif isinstance(obj, types.CellType):
+            # the content is set after the cell is memoized, which supports
+            # a function referring to itself through its closure
+            try:
+                contents = obj.cell_contents
+            except ValueError:
+                # empty cell
+                return (_make_cell, ())
+            return (_make_cell, (), contents, None, None, _set_cell_contents)
+        elif isinstance(obj, _RLOCK_TYPE):
+            return (threading.RLock, ())
+        elif isinstance(obj, types.ModuleType):
+            # the module-level random number generator of the singleton
+            # context; its state is saved separately
+            return (importlib.import_module, (obj.__name__,))
+        else:
+            return NotImplemented
+
+# =========================== public ==========================================
+
+def save(engine, file_path):
+    """
+    Save the state of the simulation run by engine into file_path.
+    """
+    context = engine.context
+
+    state = {
+        u'settings':           context.settings,
+        u'sim_log':            context.sim_log,
+        u'connectivity':       context.connectivity,
+        u'engine':             engine,
+        u'random_state':       context.random.getstate(),
+        u'numpy_random_state': np.random.get_state(),
+        u'run_logs':           context.sim_log.get_run_logs(),
+    }
+
+    with open(file_path, u'wb') as f:
+        _Pickler(f, pickle.HIGHEST_PROTOCOL).dump(state)
+
+def restore(file_path, **settings):
+    """
+    Restore the simulation saved into file_path, in place of the singletons
+    SimSettings, SimLog, Connectivity and SimEngine, which must not exist.
+    The given settings override the ones of the snapshot, for instance
+    the run length, the log directory (logDirectory) or settings only used
+    after the network formation. With exec_randomSeed or run_id, the rest of
+    the run draws its random values from the random seed they give, so that
+    the runs restored from a snapshot differ; otherwise it draws the ones
+    the run which took the snapshot drew.
+    Return the engine, which is ready to be started.
+    """
+    for cls in [
+            SimSettings.SimSettings,
+            SimLog.SimLog,
+            Connectivity.Connectivity,
+            SimEngine.SimEngine
+        ]:
+        if cls._init:
+            raise EnvironmentError(
+                u'{0} singleton already initialized.'.format(cls.__name__)
+            )
+
+    with open(file_path, u'rb') as f:
+        state = pickle.load(f)
+
+    # install the singletons, also when the snapshot was taken by an engine
+    # independent of them (see SimContext)
+    for name in [u'settings', u'sim_log', u'connectivity', u'engine']:
+        cls           = type(state[name])
+        cls._instance = state[name]
+        cls._init     = True
+        vars(state[name]).pop(u'_independent', None)
+
+    state[u'settings'].update(**settings)
+    engine = state[u'engine']
+    if u'run_id' in settings:
+        engine.run_id = settings[u'run_id']
+
+    engine.random.setstate(state[u'random_state'])
+    np.random.set_state(state[u'numpy_random_state'])
+
+    state[u'sim_log'].resume(state[u'run_logs'])
+
+    if (u'exec_randomSeed' in settings) or (u'run_id' in settings):
+        engine.reseed()
+        np.random.seed(engine.random_seed % (1 << 32))
+
+    return engine
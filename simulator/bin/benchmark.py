@@ -0,0 +1,171 @@
+#!/usr/bin/python
+"""
+\brief Measures the throughput of the simulation engine.
+
+Runs one simulation per number of motes, on a single CPU, and prints the
+wall-clock time, the number of events executed and the resulting events per
+second. Nothing is logged apart from the 'config' line. With --profile, it
+also prints the callbacks of the event loop taking the most time.
+"""
+from __future__ import print_function
+
+# =========================== adjust path =====================================
+
+import os
+import sys
+
+if __name__ == '__main__':
+    here = sys.path[0]
+    sys.path.insert(0, os.path.join(here, '..'))
+
+# =========================== imports =========================================
+
+import argparse
+import json
+import time
+
+from SimEngine import SimEngine,   \
+                      SimLog,      \
+                      SimSettings, \
+                      Connectivity
+
+# =========================== helpers =========================================
+
+def parseCliParams():
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        '--config',
+        dest       = 'config',
+        action     = 'store',
+        default    = 'base_config/config_ori.json',
+        help       = 'Location of the configuration file.',
+    )
+
+    parser.add_argument(
+        '--numMotes',
+        dest       = 'numMotes',
+        action     = 'store',
+        nargs      = '+',
+        type       = int,
+        default    = [50, 100],
+        help       = 'Numbers of motes to benchmark.',
+    )
+
+    parser.add_argument(
+        '--numSlotframes',
+        dest       = 'numSlotframes',
+        action     = 'store',
+        type       = int,
+        default    = 300,
+        help       = 'Number of slotframes per run.',
+    )
+
+    parser.add_argument(
+        '--seed',
+        dest       = 'seed',
+        action     = 'store',
+        type       = int,
+        default    = 0,
+        help       = 'Random seed of every run.',
+    )
+
+    parser.add_argument(
+        '--profile',
+        dest       = 'profile',
+        action     = 'store',
+        type       = int,
+        default    = 0,
+        help       = 'Number of callbacks of the profile to print (0 to not profile).',
+    )
+
+    cliparams      = parser.parse_args()
+    return cliparams.__dict__
+
+def runBenchmark(config, numMotes, numSlotframes, seed, profile=False):
+
+    simParam = dict(config['settings']['regular'])
+    simParam['exec_numMotes']            = numMotes
+    simParam['exec_numSlotframesPerRun'] = numSlotframes
+    simParam['exec_minutesPerRun']       = None
+    simParam['exec_randomSeed']          = seed
+    simParam['exec_profile']             = profile
+
+    settings         = SimSettings.SimSettings(cpuID=0, run_id=0, **simParam)
+    settings.setLogDirectory('benchmark')
+    settings.setCombinationKeys(['exec_numMotes'])
+    simlog           = SimLog.SimLog()
+    simlog.set_log_filters([])
+
+    startTime        = time.time()
+    simengine        = SimEngine.SimEngine(run_id=0)
+    initTime         = time.time() - startTime
+
+    startTime        = time.time()
+    simengine.start()
+    simengine.join()
+    runTime          = time.time() - startTime
+
+    result = {
+        'numMotes':    numMotes,
+        'initTime':    initTime,
+        'runTime':     runTime,
+        'numEvents':   simengine.numEventsProcessed,
+        'eventsPerS':  simengine.numEventsProcessed / runTime,
+        'profile':     (
+            simengine.profiler.get_summary() if simengine.profiler else None
+        ),
+    }
+
+    # destroy singletons
+    simlog.destroy()
+    simengine.destroy()
+    Connectivity.Connectivity().destroy()
+    settings.destroy()
+
+    return result
+
+def printProfile(profile, numCallbacks):
+
+    print('{0:>10} {1:>10} {2:>10} {3:>8} {4:>4}  {5}'.format(
+        'total (s)', 'max (ms)', 'count', 'per ASN', 'ISO', 'callback'
+    ))
+    for callback in profile['callbacks'][:numCallbacks]:
+        print('{total_s:>10.2f} {max_ms:>10.3f} {count:>10} {events_per_asn:>8.2f} {intraSlotOrder:>4}  {name}'.format(
+            max_ms = callback['max_s'] * 1000,
+            **callback
+        ))
+    print('{0} events over {1} ASNs, {2:.2f} per ASN, at most {3}'.format(
+        profile['num_events'],
+        profile['num_asns'],
+        profile['events_per_asn'],
+        profile['max_events_per_asn'],
+    ))
+
+# =========================== main ============================================
+
+def main():
+
+    cliparams = parseCliParams()
+
+    with open(cliparams['config'], 'r') as f:
+        config = json.load(f)
+
+    print('{0:>8} {1:>10} {2:>10} {3:>12} {4:>12}'.format(
+        'motes', 'init (s)', 'run (s)', 'events', 'events/s'
+    ))
+    for numMotes in cliparams['numMotes']:
+        result = runBenchmark(
+            config        = config,
+            numMotes      = numMotes,
+            numSlotframes = cliparams['numSlotframes'],
+            seed          = cliparams['seed'],
+            profile       = cliparams['profile'] > 0,
+        )
+        print('{numMotes:>8} {initTime:>10.2f} {runTime:>10.2f} {numEvents:>12} {eventsPerS:>12.0f}'.format(**result))
+        if result['profile']:
+            printProfile(result['profile'], cliparams['profile'])
+
+if __name__ == '__main__':
+    main()
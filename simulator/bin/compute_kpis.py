@@ -22,7 +22,7 @@ import json
 import glob
 import numpy as np
 
-from SimEngine import SimLog
+from SimEngine import SimLog, LogFormat
 import SimEngine.Mote.MoteDefines as d
 
 # =========================== defines =========================================
@@ -36,9 +36,9 @@ N_default = 5
 
 
 def openfile(func):
+    # func gets the lines of the log file, in JSON or binary format
     def inner(inputfile):
-        with open(inputfile, 'r') as f:
-            return func(f)
+        return func(LogFormat.read_log_file(inputfile))
     return inner
 
 # =========================== helpers =========================================
@@ -78,7 +78,7 @@ def kpis_all(inputfile):
     allstats = {}  # indexed by run_id, mote_id
 
     # first line contains settings
-    file_settings = json.loads(inputfile.readline())
+    file_settings = next(inputfile)
 
     trickle_keys = []
     last_slotframe_keys = []
@@ -88,9 +88,7 @@ def kpis_all(inputfile):
 
     # === gather raw stats
 
-    for line in inputfile:
-        logline = json.loads(line)
-
+    for logline in inputfile:
         # shorthands
         run_id = logline['_run_id']
         if '_asn' in logline:  # TODO this should be enforced in each line
@@ -166,6 +164,9 @@ def kpis_all(inputfile):
         elif logline['_type'] == SimLog.LOG_SIMULATOR_END['type']:
             all_joined['end_slotframe'] = logline['result']
 
+        elif logline['_type'] == SimLog.LOG_SIMULATOR_CONVERGED['type']:
+            all_joined['converged'] = logline['result']
+
         elif logline['_type'] == SimLog.LOG_PACKET_DROPPED['type']:
             # only log non-dagRoot sync times
             if mote_id == DAGROOT_ID:
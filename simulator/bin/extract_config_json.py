@@ -11,6 +11,7 @@ if __name__ == '__main__':
     sys.path.insert(0, os.path.join(here, '..'))
 
 from SimEngine.SimConfig import SimConfig
+from SimEngine import LogFormat
 
 
 def main():
@@ -40,24 +41,22 @@ def main():
     # identify config_line and random_seed
     config_line = None
     random_seed = None
-    with open(args.log_file_path, 'r') as f:
-        for line in f:
-            log = json.loads(line)
+    for log in LogFormat.read_log_file(args.log_file_path):
 
-            if log['_run_id'] != args.target_run_id:
-                continue
-            else:
-                if log['_type'] == 'config':
-                    config_line = log
-                elif log['_type'] == 'simulator.random_seed':
-                    random_seed = log['value']
+        if log['_run_id'] != args.target_run_id:
+            continue
+        else:
+            if log['_type'] == 'config':
+                config_line = log
+            elif log['_type'] == 'simulator.random_seed':
+                random_seed = log['value']
 
-                if (
-                        (config_line is not None)
-                        and
-                        (random_seed is not None)
-                    ):
-                    break
+            if (
+                    (config_line is not None)
+                    and
+                    (random_seed is not None)
+                ):
+                break
 
     if (
             (config_line is None)
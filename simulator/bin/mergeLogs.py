@@ -4,6 +4,15 @@ This script merges log files under 'hostname' based log directory
 """
 from __future__ import print_function
 
+# =========================== adjust path =====================================
+
+import os
+import sys
+
+if __name__ == '__main__':
+    here = sys.path[0]
+    sys.path.insert(0, os.path.join(here, '..'))
+
 # =========================== imports =========================================
 from builtins import zip
 from builtins import input
@@ -11,11 +20,12 @@ from builtins import range
 import argparse
 import filecmp
 import json
-import os
 import re
 import shutil
 import time
 
+from SimEngine import LogFormat
+
 # =========================== helpers =========================================
 
 
@@ -118,6 +128,29 @@ def getTargetSubDirs(logRootDir):
     return targetSubDirs
 
 
+def read_log_lines(infile_path, skipped_lines):
+    if (
+            LogFormat.is_compressed(infile_path)
+            or
+            LogFormat.get_file_format(infile_path) == LogFormat.FORMAT_BINARY
+        ):
+        for log in LogFormat.read_log_file(infile_path):
+            yield log
+        return
+
+    with open(infile_path, 'r') as infile:
+        for line in infile:
+            # read a log line
+            try:
+                log = json.loads(line)
+            except ValueError:
+                # input line cannot be parsed as a json
+                # string. it may be corrupted
+                skipped_lines.append((infile_path, line))
+                continue
+            yield log
+
+
 def getTotalTargetFileNum(targetSubDirs):
     returnVal = 0
 
@@ -189,37 +222,32 @@ def mergeLogFiles(logDir, targetSubDirs, dryRun):
             ))
 
             if not dryRun:
-                # actual merger happens here
-                with open(infile_path, 'r') as infile:
-                    with open(outfile_path, 'a') as outfile:
-
-                        for line in infile:
-                            # read a log line
-                            try:
-                                log = json.loads(line)
-                            except ValueError:
-                                # input line cannot be parsed as a json
-                                # string. it may be corrupted
-                                skipped_lines.append((infile_path, line))
-                                continue
-
-                            # collect cpuID and _runid that are used to compute
-                            # cpu_id_offset and run_id_offset
-                            if log['_type'] == 'config':
-                                if not log['cpuID'] in cpu_id_list:
-                                    cpu_id_list.append(log['cpuID'])
-
-                                if not log['_run_id'] in run_id_list:
-                                    run_id_list.append(log['_run_id'])
-
-                            # update cpuID and _run_id fields accordingly
-                            if 'cpuID' in log:
-                                log['cpuID'] += cpu_id_offset
-                            if '_run_id' in log:
-                                log['_run_id'] += run_id_offset
-
-                            # write the log line to outfile
-                            outfile.write(json.dumps(log) + "\n")
+                # actual merger happens here; the merged lines are written in
+                # the format of the input file
+                encoder = LogFormat.get_encoder(
+                    LogFormat.get_file_format(infile_path)
+                )
+                with open(outfile_path, 'a' + encoder.mode) as outfile:
+                    outfile.write(encoder.header())
+
+                    for log in read_log_lines(infile_path, skipped_lines):
+                        # collect cpuID and _runid that are used to compute
+                        # cpu_id_offset and run_id_offset
+                        if log['_type'] == 'config':
+                            if not log['cpuID'] in cpu_id_list:
+                                cpu_id_list.append(log['cpuID'])
+
+                            if not log['_run_id'] in run_id_list:
+                                run_id_list.append(log['_run_id'])
+
+                        # update cpuID and _run_id fields accordingly
+                        if 'cpuID' in log:
+                            log['cpuID'] += cpu_id_offset
+                        if '_run_id' in log:
+                            log['_run_id'] += run_id_offset
+
+                        # write the log line to outfile
+                        outfile.write(encoder.encode(log, sort_keys=False))
 
             total_processed_file_num += 1
 
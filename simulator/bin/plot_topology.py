@@ -0,0 +1,96 @@
+"""
+Render the topologies placed by the Random connectivity matrix.
+
+The simulations save the topologies they place in the topology cache
+(conn_topology_cache_dir, topologies/.cache by default) without rendering
+them, so that they never import matplotlib. This script renders each cached
+topology into a PNG file next to it.
+
+Example:
+    python plot_topology.py
+    python plot_topology.py ../topologies/.cache/topology-grid-50-<hash>.npz
+"""
+from __future__ import print_function
+
+# =========================== adjust path =====================================
+
+import os
+import sys
+
+if __name__ == '__main__':
+    here = sys.path[0]
+    sys.path.insert(0, os.path.join(here, '..'))
+
+# =========================== imports =========================================
+
+# standard
+import argparse
+import glob
+import numpy as np
+
+# third party
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+# project
+from SimEngine.Connectivity import TOPOLOGY_CACHE_DIR
+
+# ============================ main ===========================================
+
+def plot_topology(cache_path, png_path):
+    with np.load(cache_path) as topology:
+        coordinates = topology['coordinates']
+
+    (x, y) = coordinates.T
+    plt.scatter(x, y)
+    # the root
+    plt.scatter(coordinates[0][0], coordinates[0][1], color='r')
+    for (mote_id, coordinate) in enumerate(coordinates):
+        plt.annotate(mote_id, (coordinate[0], coordinate[1]))
+
+    plt.savefig(
+        png_path,
+        bbox_inches     = 'tight',
+        pad_inches      = 0,
+        format          = 'png',
+    )
+    plt.close()
+
+def main(options):
+    cache_paths = []
+    for path in options.paths:
+        if os.path.isdir(path):
+            cache_paths += sorted(glob.glob(os.path.join(path, '*.npz')))
+        else:
+            cache_paths.append(path)
+
+    for cache_path in cache_paths:
+        png_path = os.path.splitext(cache_path)[0] + '.png'
+        if os.path.exists(png_path) and not options.force:
+            continue
+        plot_topology(cache_path, png_path)
+        print('{0} created'.format(png_path))
+
+def parse_args():
+    # parse options
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'paths',
+        help       = 'Cached topologies, or directories holding them.',
+        nargs      = '*',
+        default    = [TOPOLOGY_CACHE_DIR],
+    )
+    parser.add_argument(
+        '--force',
+        help       = 'Render the topologies which already have a PNG file.',
+        action     = 'store_true',
+        default    = False,
+    )
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    options = parse_args()
+
+    main(options)
@@ -23,19 +23,29 @@ if __name__ == '__main__':
 import time
 import subprocess
 import itertools
-import threading
-import math
 import multiprocessing
 import argparse
 import json
 import glob
+import hashlib
+import queue
 import shutil
 
 from SimEngine import SimConfig,   \
+                      SimContext,  \
                       SimEngine,   \
                       SimLog, \
                       SimSettings, \
-                      Connectivity
+                      LogColumns,  \
+                      LogFormat
+
+# =========================== defines =========================================
+
+# wall times of past runs, under the log root directory (see RunCostModel)
+RUN_TIMES_FILE_NAME = 'run_times.json'
+
+# completed runs of a sweep, in its log directory (see SweepManifest)
+MANIFEST_FILE_NAME  = 'manifest.jsonl'
 
 # =========================== helpers =========================================
 
@@ -51,6 +61,14 @@ def parseCliParams():
         help       = 'Location of the configuration file.',
     )
 
+    parser.add_argument(
+        '--resume',
+        dest       = 'resume',
+        action     = 'store',
+        default    = None,
+        help       = 'Name of the log directory of a sweep to resume; completed runs are skipped.',
+    )
+
     parser.add_argument(
         '--algo',
         dest       = 'algo',
@@ -200,25 +218,11 @@ def printOrLog(cpuID, pid, output, verbose):
     else:
         print(output)
 
-def runSimCombinations(params):
+def getSimParams(simconfig):
     """
-    Runs simulations for all combinations of simulation settings.
-    This function may run independently on different CPUs.
+    Return the combination keys and the settings of every parameter
+    combination.
     """
-
-    cpuID              = params['cpuID']
-    pid                = params['pid']
-    numRuns            = params['numRuns']
-    first_run          = params['first_run']
-    verbose            = params['verbose']
-    config_data        = params['config_data']
-
-    simconfig = SimConfig.SimConfig(configdata=config_data)
-
-    # record simulation start time
-    simStartTime        = time.time()
-
-    # compute all the simulation parameter combinations
     combinationKeys     = list(simconfig.settings.combination.keys())
     simParams           = []
     for p in itertools.product(*[simconfig.settings.combination[k] for k in combinationKeys]):
@@ -229,79 +233,344 @@ def runSimCombinations(params):
             if k not in simParam:
                 simParam[k] = v
         simParams      += [simParam]
+    return (combinationKeys, simParams)
 
-    # run a simulation for each set of simParams
+def getTasks(simconfig, first_run, numRuns):
+    """
+    Return one task per (parameter combination, run_id).
+    """
+    (combinationKeys, simParams) = getSimParams(simconfig)
+    tasks = []
     for (simParamNum, simParam) in enumerate(simParams):
-
-        # run the simulation runs
         for run_id in range(first_run, first_run+numRuns):
+            tasks += [{
+                'simParamNum':        simParamNum,
+                'simParam':           simParam,
+                'run_id':             run_id,
+                'combinationKeys':    combinationKeys,
+                'log_directory_name': simconfig.get_log_directory_name(),
+                'log_filters':        simconfig.logging,
+            }]
+    return tasks
+
+def runTask(cpuID, task, verbose):
+    """
+    Run the simulation run of a task; its logs go to the output file of cpuID.
+    Return the random seed of the run, the output file and the positions
+    of the logs of the run in it.
+    """
 
-            # printOrLog
-            output  = 'parameters {0}/{1}, run {2}/{3}'.format(
-               simParamNum+1,
-               len(simParams),
-               run_id+1-first_run,
-               numRuns
-            )
-            printOrLog(cpuID, pid, output, verbose)
-
-            # create singletons
-            settings         = SimSettings.SimSettings(cpuID=cpuID, run_id=run_id, **simParam)
-            settings.setLogDirectory(simconfig.get_log_directory_name())
-            settings.setCombinationKeys(combinationKeys)
-            simlog           = SimLog.SimLog()
-            simlog.set_log_filters(simconfig.logging)
-            simengine        = SimEngine.SimEngine(run_id=run_id, verbose=verbose)
+    # create the simulation context
+    settings         = SimSettings.SimSettings.create(cpuID=cpuID, run_id=task['run_id'], **task['simParam'])
+    settings.setLogDirectory(task['log_directory_name'])
+    settings.setCombinationKeys(task['combinationKeys'])
+    outputFile       = settings.getOutputFile()
+    start            = os.path.getsize(outputFile) if os.path.exists(outputFile) else 0
+    simlog           = SimLog.SimLog.create(settings)
+    simlog.set_log_filters(task['log_filters'])
+    context          = SimContext.SimContext(settings, simlog)
+    simengine        = SimEngine.SimEngine.create(context, run_id=task['run_id'], verbose=verbose)
+
+    # start simulation run
+    simengine.start()
+
+    # wait for simulation run to end
+    simengine.join()
+
+    # close the log file
+    simlog.destroy()
+
+    return {
+        'seed':       simengine.random_seed,
+        'outputFile': outputFile,
+        'start':      start,
+        'end':        os.path.getsize(outputFile),
+    }
 
+def runSimCombinations(tasks, numSimParams, numRuns, manifest, costModel):
+    """
+    Runs the tasks one after the other, on a single CPU.
+    """
 
-            # start simulation run
-            simengine.start()
+    cpuID              = 0
+    pid                = os.getpid()
+    verbose            = True
 
-            # wait for simulation run to end
-            simengine.join()
+    # record simulation start time
+    simStartTime        = time.time()
 
-            # destroy singletons
-            simlog.destroy()
-            simengine.destroy()
-            Connectivity.Connectivity().destroy()
-            settings.destroy() # destroy last, Connectivity needs it
+    # run a simulation for each task
+    for task in tasks:
 
         # printOrLog
-        output  = 'simulation ended after {0:.0f}s ({1} runs).'.format(
-            time.time()-simStartTime,
-            numRuns * len(simParams)
+        output  = 'parameters {0}/{1}, run {2}/{3}'.format(
+           task['simParamNum']+1,
+           numSimParams,
+           task['run_id']+1,
+           numRuns
         )
         printOrLog(cpuID, pid, output, verbose)
 
-keep_printing_progress = True
-def printProgressPerCpu(cpuIDs, pid, clear_console=True):
-    while keep_printing_progress:
-        time.sleep(1)
-        output     = []
-        for cpuID in cpuIDs:
+        startTime = time.time()
+        result    = runTask(cpuID, task, verbose)
+        manifest.record(task, result)
+        costModel.record(task, time.time() - startTime)
+        costModel.save()
+
+    # printOrLog
+    output  = 'simulation ended after {0:.0f}s ({1} runs).'.format(
+        time.time()-simStartTime,
+        len(tasks)
+    )
+    printOrLog(cpuID, pid, output, verbose)
+
+# ==== shared task queue (multiple CPUs)
+
+class RunCostModel(object):
+    """
+    Expected wall time of the run of a task, proportional to its number of
+    motes times its number of slotframes. The time per mote-slotframe is
+    learned from the wall times of past runs, per group of the settings
+    which change it (COST_KEYS), and kept in a file across sweeps, which
+    the sweeps running at the same time share.
+    """
+
+    COST_KEYS = [
+        'conn_class',
+        'sf_class',
+        'trickle_method',
+        'algo_simulate_addremove',
+    ]
+
+    def __init__(self, file_path):
+        self.file_path  = file_path
+        self.history    = {} # cost group -> [seconds, mote-slotframes]
+        if os.path.exists(self.file_path):
             try:
-                with open(getTemplogFileName(cpuID, pid), 'r') as f:
-                    output += ['[cpu {0}] {1}'.format(cpuID, f.read())]
-            except IOError:
-                output += ['[cpu {0}] no info (yet?)'.format(cpuID)]
-        allDone = True
-        for line in output:
-            if line.count('ended') == 0:
-                allDone = False
-        output = '\n'.join(output)
-        if clear_console:
-            os.system('cls' if os.name == 'nt' else 'clear')
-        print(output)
-        if allDone:
-            break
+                with open(self.file_path, 'r') as f:
+                    self.history = json.load(f)
+            except (OSError, ValueError):
+                # unreadable history; the estimates are learned again
+                self.history = {}
+
+    def estimate(self, task):
+        """
+        Return the expected wall time of the run, in seconds; in
+        mote-slotframes when no run was recorded yet.
+        """
+        group = self.history.get(self._get_group(task))
+        if group is None:
+            # average over all the groups
+            group = [sum(x) for x in zip(*self.history.values())] or None
+        if group is None or group[1] == 0:
+            rate = 1.0
+        else:
+            rate = float(group[0]) / group[1]
+        return rate * self._get_units(task)
+
+    def record(self, task, wallTime):
+        group = self.history.setdefault(self._get_group(task), [0.0, 0])
+        group[0] += wallTime
+        group[1] += self._get_units(task)
+
+    def save(self):
+        # write into a temporary file which then replaces the history, so
+        # that another sweep never reads a partial history
+        tmp_path = '{0}.{1}.tmp'.format(self.file_path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(self.history, f, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.file_path)
+
+    # ======================== private ========================================
+
+    def _get_group(self, task):
+        return json.dumps(
+            [task['simParam'].get(k) for k in self.COST_KEYS]
+        )
 
-def merge_output_files(folder_path):
+    def _get_units(self, task):
+        if 'units' not in task:
+            settings = SimSettings.SimSettings.create(**task['simParam'])
+            task['units'] = (
+                settings.exec_numMotes * settings.exec_numSlotframesPerRun
+            )
+        return task['units']
+
+class SweepManifest(object):
+    """
+    Runs completed by a sweep, one JSON line per run in the log directory,
+    which lets an interrupted sweep be resumed (see --resume). A run is
+    identified by its run_id and a hash of its effective settings, which
+    include its parameter combination; the line also holds its random seed
+    and the positions of its logs in its output file.
+
+    Output files are merged at the end of a sweep, one subfolder after the
+    other; the merge of a subfolder is recorded by a 'merge' line, with the
+    end of the merged file. The logs after the last completed run of an
+    output file not merged yet are the ones of an interrupted run, and the
+    end of a merged file after its last recorded merge is the one of an
+    interrupted merge; they are discarded before resuming.
+    """
+
+    def __init__(self, file_path):
+        self.file_path  = file_path
+        self.dir_path   = os.path.dirname(file_path)
+        self.done       = set() # (config hash, run_id)
+        self.ends       = {}    # output file not merged yet -> end of its last run
+        self.merged     = {}    # merged file -> end of its last merge
+        if os.path.exists(self.file_path):
+            with open(self.file_path, 'r') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if entry['type'] == 'run':
+                        self.done.add((entry['config_hash'], entry['run_id']))
+                        self.ends[entry['outputFile']] = max(
+                            entry['end'],
+                            self.ends.get(entry['outputFile'], 0)
+                        )
+                    elif entry['type'] == 'merge':
+                        self.ends = dict(
+                            (output_file, end)
+                            for (output_file, end) in self.ends.items()
+                            if os.path.dirname(output_file) != entry['subfolder']
+                        )
+                        self.merged[entry['mergedFile']] = entry['end']
+
+    @staticmethod
+    def get_config_hash(task):
+        md5 = hashlib.md5()
+        md5.update(json.dumps(task['simParam'], sort_keys=True).encode('utf-8'))
+        return md5.hexdigest()
+
+    def is_done(self, task):
+        return (self.get_config_hash(task), task['run_id']) in self.done
+
+    def discard_interrupted_runs(self):
+        for file_path in glob.glob(os.path.join(glob.escape(self.dir_path), '*', 'output_cpu*.dat')):
+            end = self.ends.get(os.path.relpath(file_path, self.dir_path), 0)
+            if os.path.getsize(file_path) > end:
+                with open(file_path, 'r+') as f:
+                    f.truncate(end)
+                LogFormat.truncate_index(file_path, end)
+
+    def record(self, task, result):
+        self._write({
+            'type':        'run',
+            'combination': dict(
+                (k, task['simParam'][k]) for k in task['combinationKeys']
+            ),
+            'run_id':      task['run_id'],
+            'seed':        result['seed'],
+            'config_hash': self.get_config_hash(task),
+            'outputFile':  os.path.relpath(result['outputFile'], self.dir_path),
+            'start':       result['start'],
+            'end':         result['end'],
+        })
+
+    def discard_interrupted_merge(self, merged_file_path):
+        if not os.path.exists(merged_file_path):
+            return
+        end = self.merged.get(os.path.relpath(merged_file_path, self.dir_path), 0)
+        if os.path.getsize(merged_file_path) > end:
+            with open(merged_file_path, 'r+') as f:
+                f.truncate(end)
+            LogFormat.truncate_index(merged_file_path, end)
+
+    def record_merge(self, subfolder, merged_file_path):
+        self._write({
+            'type':       'merge',
+            'subfolder':  subfolder,
+            'mergedFile': os.path.relpath(merged_file_path, self.dir_path),
+            'end':        os.path.getsize(merged_file_path),
+        })
+
+    # ======================== private ========================================
+
+    def _write(self, entry):
+        with open(self.file_path, 'a') as f:
+            f.write(json.dumps(entry, sort_keys=True) + '\n')
+
+workerID = None
+def initWorker(workerCounter):
+    # number the workers of the pool; each one writes its own output file
+    global workerID
+    with workerCounter.get_lock():
+        workerID = workerCounter.value
+        workerCounter.value += 1
+
+def runTaskInWorker(task):
+    startTime = time.time()
+    result    = runTask(workerID, task, verbose=False)
+    return (task, result, time.time() - startTime)
+
+def runTasks(tasks, numCPUs, manifest, costModel):
+    """
+    Run the tasks on a pool of numCPUs processes. Every idle worker gets the
+    pending task with the longest expected wall time, estimated with the
+    wall times of the tasks completed so far.
+    """
+    simStartTime = time.time()
+    pending      = list(tasks)
+    completed    = queue.Queue()
+    numRunning   = 0
+    numDone      = 0
+    pool         = multiprocessing.Pool(
+        numCPUs,
+        initializer = initWorker,
+        initargs    = (multiprocessing.Value('i', 0),)
+    )
+    try:
+        while pending or numRunning:
+            while pending and numRunning < numCPUs:
+                pending.sort(key=costModel.estimate)
+                pool.apply_async(
+                    runTaskInWorker,
+                    (pending.pop(),),
+                    callback       = completed.put,
+                    error_callback = completed.put
+                )
+                numRunning += 1
+
+            result      = completed.get()
+            numRunning -= 1
+            if isinstance(result, BaseException):
+                raise result
+            (task, result, wallTime) = result
+            manifest.record(task, result)
+            costModel.record(task, wallTime)
+            numDone    += 1
+
+            print('[{0}/{1}] parameters {2}, run {3}: {4:.1f}s'.format(
+                numDone,
+                len(tasks),
+                task['simParamNum']+1,
+                task['run_id'],
+                wallTime
+            ))
+    finally:
+        pool.terminate()
+        pool.join()
+        costModel.save()
+
+    print('simulation ended after {0:.0f}s ({1} runs).'.format(
+        time.time()-simStartTime,
+        len(tasks)
+    ))
+
+def merge_output_files(folder_path, manifest):
     """
     Read the dataset folders and merge the datasets (usefull when using multiple CPUs).
+    The datasets are appended to the ones merged before, if any (see --resume);
+    the merge of each dataset is recorded in the manifest.
     :param string folder_path:
+    :param SweepManifest manifest:
     """
 
     for subfolder in os.listdir(folder_path):
+        if not os.path.isdir(os.path.join(folder_path, subfolder)):
+            # merged datasets, config.json, manifest
+            continue
+
         # subfolder could have '[' in its name, which is a special character
         # for glob. This needs to be escaped.
         file_path_list = sorted(
@@ -314,13 +583,30 @@ def merge_output_files(folder_path):
             )
         )
 
-        # read files and concatenate results
-        with open(os.path.join(folder_path, subfolder + ".dat"), 'w') as outputfile:
+        # read files and concatenate results; binary and compressed log files
+        # are concatenated as they are (see LogFormat)
+        merged_file_path = os.path.join(folder_path, subfolder + ".dat")
+        manifest.discard_interrupted_merge(merged_file_path)
+        with open(merged_file_path, 'ab') as outputfile:
             for file_path in file_path_list:
-                with open(file_path, 'r') as inputfile:
-                    config = json.loads(inputfile.readline())
-                    outputfile.write(json.dumps(config) + "\n")
-                    outputfile.write(inputfile.read())
+                # columns of the runs, with log_columnar (see LogColumns)
+                LogColumns.merge_columns(file_path, merged_file_path)
+                if LogFormat.is_compressed(file_path):
+                    LogFormat.append_log_file(file_path, outputfile)
+                    continue
+                if LogFormat.get_file_format(file_path) == LogFormat.FORMAT_BINARY:
+                    with open(file_path, 'rb') as inputfile:
+                        shutil.copyfileobj(inputfile, outputfile)
+                    continue
+                with open(file_path, 'rb') as inputfile:
+                    line = inputfile.readline()
+                    if not line:
+                        # only had logs of interrupted runs
+                        continue
+                    config = json.loads(line)
+                    outputfile.write((json.dumps(config) + "\n").encode('utf-8'))
+                    shutil.copyfileobj(inputfile, outputfile)
+        manifest.record_merge(subfolder, merged_file_path)
         p_ = os.path.join(folder_path, subfolder)
         if os.path.isdir(p_):
             shutil.rmtree(p_, ignore_errors=True)
@@ -379,6 +665,10 @@ def main():
     
         print(json.dumps(changed_param,indent = 4))
 
+    # resume a sweep in its log directory
+    if cliparams['resume']:
+        SimConfig.SimConfig.set_log_directory_name(cliparams['resume'])
+
     # sim config
     simconfig = SimConfig.SimConfig(configfile=config_file, changed_param=changed_param, map_param=map_param)
     assert simconfig.version == 0
@@ -394,94 +684,49 @@ def main():
         numCPUs = simconfig.execution.numCPUs
     assert numCPUs <= max_numCPUs
 
+    # skip the runs completed by an interrupted sweep being resumed
+    folder_path = os.path.join('simData', simconfig.get_log_directory_name())
+    if not os.path.exists(folder_path):
+        os.makedirs(folder_path)
+    manifest  = SweepManifest(os.path.join(folder_path, MANIFEST_FILE_NAME))
+    manifest.discard_interrupted_runs()
+    allTasks  = getTasks(simconfig, 0, simconfig.execution.numRuns)
+    tasks     = [task for task in allTasks if not manifest.is_done(task)]
+    if len(tasks) < len(allTasks):
+        print('resuming {0}: {1}/{2} runs already completed'.format(
+            folder_path,
+            len(allTasks) - len(tasks),
+            len(allTasks)
+        ))
+
+    costModel = RunCostModel(
+        os.path.join(
+            SimSettings.SimSettings.DEFAULT_LOG_ROOT_DIR,
+            RUN_TIMES_FILE_NAME
+        )
+    )
+
     if numCPUs == 1:
         # run on single CPU
-
-        runSimCombinations({
-            'cpuID':              0,
-            'pid':                os.getpid(),
-            'numRuns':            simconfig.execution.numRuns,
-            'first_run':          0,
-            'verbose':            True,
-            'config_data':        simconfig.get_config_data()
-        })
-
-    else:
-        # distribute runs on different CPUs
-        runsPerCPU = [
-            int(
-                math.floor(float(simconfig.execution.numRuns) / float(numCPUs))
-            )
-        ]*numCPUs
-        idx         = 0
-        while sum(runsPerCPU) < simconfig.execution.numRuns:
-            runsPerCPU[idx] += 1
-            idx              += 1
-
-        # distribute run ids on different CPUs (transform runsPerCPU into a list of tuples)
-        first_run = 0
-        for cpuID in range(numCPUs):
-            runs = runsPerCPU[cpuID]
-            runsPerCPU[cpuID] = (runs, first_run)
-            first_run += runs
-
-        # print progress, wait until done
-        cpuIDs                = [i for i in range(numCPUs)]
-        if simconfig.log_directory_name == 'hostname':
-            # We assume the simulator run over a cluster system when
-            # 'log_directory_name' is 'hostname'. Under a cluster system, we
-            # disable "clear" on console because it could cause "'unknown': I
-            # need something more specific." error.
-            clear_console = False
-        else:
-            clear_console = True
-        print_progress_thread = threading.Thread(
-            target = printProgressPerCpu,
-            args   = (cpuIDs, os.getpid(), clear_console)
+        runSimCombinations(
+            tasks        = tasks,
+            numSimParams = len(allTasks) // simconfig.execution.numRuns,
+            numRuns      = simconfig.execution.numRuns,
+            manifest     = manifest,
+            costModel    = costModel
         )
 
-        print_progress_thread.start()
-
-        # wait for the thread ready
-        while print_progress_thread.is_alive() == False:
-            time.sleep(0.5)
-
-        # start simulations
-        pool = multiprocessing.Pool(numCPUs)
-        async_result = pool.map_async(
-            runSimCombinations,
-            [
-                {
-                    'cpuID':              cpuID,
-                    'pid':                os.getpid(),
-                    'numRuns':            runs,
-                    'first_run':          first_run,
-                    'verbose':            False,
-                    'config_data':        simconfig.get_config_data()
-                } for [cpuID, (runs, first_run)] in enumerate(runsPerCPU)
-            ]
+    else:
+        # one task per (combination, run_id), in a queue shared by the CPUs
+        runTasks(
+            tasks     = tasks,
+            numCPUs   = numCPUs,
+            manifest  = manifest,
+            costModel = costModel
         )
 
-        # get() raises an exception raised by a thread if any
-        try:
-            async_result.get()
-        except Exception:
-            raise
-        finally:
-            # stop print_proress_thread if it's alive
-            if print_progress_thread.is_alive():
-                global keep_printing_progress
-                keep_printing_progress = False
-                print_progress_thread.join()
-
-        # cleanup
-        hostname = platform.uname()[1]
-        for i in range(numCPUs):
-            os.remove(getTemplogFileName(i, os.getpid()))
-
-    # merge output files
-    folder_path = os.path.join('simData', simconfig.get_log_directory_name())
-    merge_output_files(folder_path)
+    # merge output files into the datasets of the sweep
+    merge_output_files(folder_path, manifest)
 
     # copy config file into output directory
     with open(os.path.join(folder_path, 'config.json'), 'w') as f:
@@ -236,11 +236,13 @@ def start(settings, log_notification_filter='all', stderr_redirect=True):
         }
 
     try:
+        # the engine is paused and resumed from another greenlet; keep the
+        # locks of the engine and the motes
         sim_settings = SimSettings.SimSettings(
             cpuID        = 0,
             run_id       = 0,
             log_root_dir = backend.SIM_DATA_PATH,
-            **settings
+            **dict(settings, exec_lockFree=False)
         )
         start_time = time.time()
         sim_settings.setLogDirectory(
@@ -13,12 +13,21 @@ import os
 import random
 import types
 
+import numpy as np
 import pytest
 
 from . import test_utils as u
 import SimEngine.Mote.MoteDefines as d
 from SimEngine import SimLog
-from SimEngine.Connectivity import ConnectivityMatrixK7
+from SimEngine.Connectivity import ConnectivityMatrixK7,     \
+                                   ConnectivityMatrixLinear, \
+                                   ConnectivityMatrixRandom, \
+                                   ConnectivityMatrixFading, \
+                                   MoteGrid,                 \
+                                   PisterHackModel,          \
+                                   RssiPdrTable,             \
+                                   SparseLinkTable,          \
+                                   DUST_RSSI_PDR_TABLE
 
 #============================ helpers =========================================
 
@@ -62,6 +71,144 @@ def test_linear_matrix(sim_engine):
                     assert matrix.get_pdr(c, p, channel)  ==  0.00
                     assert matrix.get_rssi(c, p, channel) == -1000
 
+def test_set_links(sim_engine):
+    """ verify the bulk setters of the connectivity matrix """
+
+    engine = sim_engine(
+        diff_config = {
+            'exec_numMotes': 4,
+            'conn_class':    'Linear',
+        }
+    )
+    matrix = engine.connectivity.matrix
+    channels = d.TSCH_HOPPING_SEQUENCE[:engine.settings.phy_numChans]
+
+    # one value per link, on all the channels
+    matrix.set_links([0, 1], [2, 3], [0.25, 0.5], [-80, -90])
+    for channel in channels:
+        assert matrix.get_pdr(0, 2, channel)  == 0.25
+        assert matrix.get_rssi(0, 2, channel) == -80
+        assert matrix.get_pdr(1, 3, channel)  == 0.5
+        assert matrix.get_rssi(1, 3, channel) == -90
+        assert matrix.get_pdr(2, 0, channel)  == 0.00
+
+    # one channel per link, both directions
+    matrix.set_links_both_directions(
+        [0], [3], 0.75, -85, channels=[channels[1]]
+    )
+    for channel in channels:
+        if channel == channels[1]:
+            expected = (0.75, -85)
+        else:
+            expected = (0.00, -1000)
+        for (src_id, dst_id) in [(0, 3), (3, 0)]:
+            assert matrix.get_pdr(src_id, dst_id, channel)  == expected[0]
+            assert matrix.get_rssi(src_id, dst_id, channel) == expected[1]
+
+def test_sparse_links(sim_engine, monkeypatch):
+    """ verify the sparse connectivity matrix """
+
+    engine = sim_engine(
+        diff_config = {
+            'exec_numMotes'           : 3,
+            'exec_numSlotframesPerRun': 100,
+            'conn_class'              : 'Linear',
+        }
+    )
+    channels = d.TSCH_HOPPING_SEQUENCE[:engine.settings.phy_numChans]
+
+    # conn_sparse
+    engine.settings.conn_sparse = True
+    matrix = ConnectivityMatrixLinear(engine.connectivity)
+    engine.connectivity.matrix = matrix
+    assert isinstance(matrix.links, SparseLinkTable)
+
+    # only the links of the line are stored
+    assert len(matrix.links.rows) == 4
+    assert matrix.get_neighbors(0).tolist() == [1]
+    assert matrix.get_neighbors(1).tolist() == [0, 2]
+    assert matrix.get_neighbors(2).tolist() == [1]
+    for channel in channels:
+        assert matrix.get_pdr(0, 1, channel)  == 1.00
+        assert matrix.get_pdr(0, 2, channel)  == 0.00
+        assert matrix.get_rssi(0, 2, channel) == -1000
+    assert matrix.get_pdr_array([0, 1], [1, 2], channels[0]).tolist() == [
+        [1.00, 0.00],
+        [0.00, 1.00],
+    ]
+
+    # a link below the floor is not created; a stored link is updated
+    matrix.set_links([0, 0], [2, 1], 0.00, -1000, channels=channels[:2])
+    assert len(matrix.links.rows) == 4
+    assert matrix.get_pdr(0, 1, channels[1]) == 0.00
+    assert matrix.get_pdr(0, 1, channels[0]) == 1.00
+    matrix.set_pdr(0, 1, channels[1], 1.00)
+
+    # the arrays give the values of the links, whatever the order of the ids
+    src_ids = [2, 0, 1, 1]
+    dst_ids = [1, 2, 0, 0, 2]
+    for channel in channels:
+        assert matrix.get_rssi_array(src_ids, dst_ids, channel).tolist() == [
+            [matrix.get_rssi(src_id, dst_id, channel) for dst_id in dst_ids]
+            for src_id in src_ids
+        ]
+
+    # the table grows past its initial capacity
+    monkeypatch.setattr(SparseLinkTable, 'INITIAL_CAPACITY', 2)
+    matrix = ConnectivityMatrixLinear(engine.connectivity)
+    engine.connectivity.matrix = matrix
+    assert len(matrix.links.pdr) == 4
+    assert matrix.get_neighbors(1).tolist() == [0, 2]
+    for (src_id, dst_id) in [(0, 1), (1, 0), (1, 2), (2, 1)]:
+        assert matrix.get_pdr(src_id, dst_id, channels[-1]) == 1.00
+
+    u.run_until_end(engine)
+
+    assert len(u.read_log_file([SimLog.LOG_TSCH_TXDONE['type']])) > 0
+
+#=== verify the RSSI in mW follows the RSSI of the links
+
+@pytest.fixture(params=['dense', 'sparse'])
+def link_table(request):
+    return request.param
+
+def test_rssi_mW(sim_engine, link_table):
+    engine = sim_engine(
+        diff_config = {
+            'exec_numMotes': 3,
+            'conn_class'   : 'Linear',
+        }
+    )
+    matrix = engine.connectivity.matrix
+    channels = d.TSCH_HOPPING_SEQUENCE[:engine.settings.phy_numChans]
+
+    # conn_sparse
+    if link_table == 'sparse':
+        engine.settings.conn_sparse = True
+        matrix = ConnectivityMatrixLinear(engine.connectivity)
+        engine.connectivity.matrix = matrix
+
+    matrix.set_links([0, 2], [1, 1], 0.50, [-73.3, -91.7])
+    matrix.set_rssi(1, 0, channels[0], -88.1)
+
+    for channel in channels:
+        for (src_id, dst_id) in itertools.permutations(range(3), 2):
+            rssi = matrix.get_rssi(src_id, dst_id, channel)
+            # the same value as the one computed out of the RSSI
+            assert (
+                matrix.get_rssi_mW(src_id, dst_id, channel)
+                ==
+                engine.connectivity._dBm_to_mW(rssi)
+            )
+        assert (
+            matrix.get_rssi_mW_array([0, 1, 2], [0, 1, 2], channel).tolist()
+            ==
+            [
+                [matrix.get_rssi_mW(src_id, dst_id, channel)
+                 for dst_id in range(3)]
+                for src_id in range(3)
+            ]
+        )
 
 #=== verify propagate function doesn't raise exception
 
@@ -70,6 +217,332 @@ def test_propagate(sim_engine):
     engine.connectivity.propagate()
 
 
+#=== verify the vectorized propagation decides as the per-listener one
+
+def test_resolve_receptions(sim_engine):
+    num_motes = 8
+    engine = sim_engine(
+        diff_config = {
+            'exec_numMotes': num_motes,
+            'conn_class'   : 'FullyMeshed',
+        }
+    )
+    connectivity = engine.connectivity
+    channel = d.TSCH_HOPPING_SEQUENCE[0]
+    rng = random.Random(1)
+
+    # random links; some of them below the noise level
+    src_ids = []
+    dst_ids = []
+    for (src_id, dst_id) in itertools.permutations(range(num_motes), 2):
+        src_ids.append(src_id)
+        dst_ids.append(dst_id)
+    connectivity.matrix.set_links(
+        src_ids,
+        dst_ids,
+        [rng.uniform(0.2, 1.0) for _ in src_ids],
+        [rng.uniform(-110, -70) for _ in src_ids]
+    )
+
+    tx_ids = [0, 1, 2, 3]
+    listener_ids = [4, 5, 6, 7]
+    for num_transmissions in [1, len(tx_ids)]:
+        transmissions = [
+            {
+                u'channel':    channel,
+                u'tx_mote_id': tx_id,
+                u'packet':     None,
+                u'txTime':     rng.choice([0, 1, 2]),
+                u'numACKs':    0,
+            }
+            for tx_id in tx_ids[:num_transmissions]
+        ]
+
+        for _ in range(50):
+            random_values = [
+                [rng.random() for _ in transmissions] for _ in listener_ids
+            ]
+            (heard, lockon_indexes, interferers, packet_pdr) = (
+                connectivity._resolve_receptions(
+                    channel,
+                    transmissions,
+                    listener_ids,
+                    np.array(random_values)
+                )
+            )
+
+            # what _propagate_channel() decides with the same random values
+            for (i, listener_id) in enumerate(listener_ids):
+                if num_transmissions == 1:
+                    assert heard[i]
+                    assert lockon_indexes[i] == 0
+                    assert packet_pdr[i] == connectivity.get_pdr(
+                        tx_ids[0], listener_id, channel
+                    )
+                    continue
+
+                detected = [
+                    j for (j, t) in enumerate(transmissions)
+                    if random_values[i][j] <= connectivity.get_pdr(
+                        t[u'tx_mote_id'], listener_id, channel
+                    )
+                ]
+                assert heard[i] == (len(detected) > 0)
+                if not detected:
+                    continue
+                lockon_index = min(
+                    detected,
+                    key=lambda j: transmissions[j][u'txTime']
+                )
+                assert lockon_indexes[i] == lockon_index
+                assert list(np.flatnonzero(interferers[i])) == detected[1:]
+                assert packet_pdr[i] == pytest.approx(
+                    connectivity._compute_pdr_with_interference(
+                        listener_id=listener_id,
+                        lockon_transmission=transmissions[lockon_index],
+                        interfering_transmissions=[
+                            transmissions[j] for j in detected[1:]
+                        ]
+                    )
+                )
+
+def test_rssi_pdr_table(tmpdir):
+    table = DUST_RSSI_PDR_TABLE
+    assert table.get_pdr(-1000) == 0.0
+    assert table.get_pdr(-97.5) == 0.0
+    assert table.get_pdr(-96) == 0.1494
+    assert table.get_pdr(-95.5) == pytest.approx((0.1494 + 0.2340) / 2)
+    assert table.get_pdr(-79) == 1.0
+    assert table.get_pdr(-10) == 1.0
+
+    # the array version gives the same values
+    rssi = np.array([-1000, -97.5, -96, -95.5, -93.6, -79, -10])
+    assert table.get_pdr_array(rssi).tolist() == [
+        table.get_pdr(value) for value in rssi.tolist()
+    ]
+
+    # another dataset, loaded from a JSON file, with a gap between its points
+    file_path = str(tmpdir.join('rssi_pdr.json'))
+    with open(file_path, 'w') as f:
+        json.dump({'-90': 0.0, '-88': 0.5, '-87': 0.9}, f)
+    table = RssiPdrTable.load(file_path)
+    assert table.min_rssi == -90
+    assert table.get_pdr(-91) == 0.0
+    assert table.get_pdr(-89) == 0.25
+    assert table.get_pdr(-87.5) == pytest.approx(0.7)
+    assert table.get_pdr(-80) == 0.9
+    assert table.get_pdr_array(np.array([-89.5])).tolist() == [0.125]
+
+    # the points between integers are kept
+    table = RssiPdrTable({-90.5: 0.0, -90.25: 0.5, -89.5: 1.0})
+    assert table.get_pdr(-90.75) == 0.0
+    assert table.get_pdr(-90.25) == 0.5
+    assert table.get_pdr(-90.375) == pytest.approx(0.25)
+    assert table.get_pdr(-89.875) == pytest.approx(0.75)
+    assert table.get_pdr(-89) == 1.0
+    rssi = np.array([-91, -90.375, -90.25, -89.875, -89])
+    assert table.get_pdr_array(rssi).tolist() == pytest.approx([
+        table.get_pdr(value) for value in rssi.tolist()
+    ])
+
+def test_topology_cache(sim_engine, tmpdir):
+    """ verify a cached topology gives the same run as a placed one """
+
+    engine = sim_engine(
+        diff_config = {
+            'exec_numMotes': 10,
+            'conn_class'   : 'Random',
+        }
+    )
+
+    # conn_topology_cache_dir
+    engine.settings.conn_topology_cache_dir = str(tmpdir)
+    random_state = engine.random.getstate()
+    placed = ConnectivityMatrixRandom(engine.connectivity)
+    placed_random_state = engine.random.getstate()
+    assert len(tmpdir.listdir()) == 1
+
+    engine.random.setstate(random_state)
+    cached = ConnectivityMatrixRandom(engine.connectivity)
+    assert len(tmpdir.listdir()) == 1
+    assert engine.random.getstate() == placed_random_state
+    assert cached.coordinates == placed.coordinates
+    assert (cached.links.pdr == placed.links.pdr).all()
+    assert (cached.links.rssi == placed.links.rssi).all()
+
+    # another random state, or other placement settings, place another
+    # topology
+    engine.random.seed(12345)
+    ConnectivityMatrixRandom(engine.connectivity)
+    assert len(tmpdir.listdir()) == 2
+
+    engine.random.setstate(random_state)
+    engine.settings.conn_random_init_min_pdr /= 2
+    ConnectivityMatrixRandom(engine.connectivity)
+    assert len(tmpdir.listdir()) == 3
+
+def test_fading(sim_engine):
+    """ verify the links of the fading connectivity vary over time """
+
+    engine = sim_engine(
+        diff_config = {
+            'exec_numMotes'           : 10,
+            'exec_numSlotframesPerRun': 10,
+            'conn_class'              : 'Fading',
+        }
+    )
+    channels = d.TSCH_HOPPING_SEQUENCE[:engine.settings.phy_numChans]
+
+    # conn_fading_period, conn_fading_block_size
+    engine.settings.conn_fading_period = 50
+    engine.settings.conn_fading_block_size = 4
+    matrix = ConnectivityMatrixFading(engine.connectivity)
+    engine.connectivity.matrix = matrix
+    num_links = len(matrix.mean_rssi)
+    assert num_links > 0
+    src_ids = matrix.link_src_ids[:num_links]
+    dst_ids = matrix.link_dst_ids[:num_links]
+
+    rssi = []
+    for _ in range(200):
+        values = np.array([
+            [matrix.get_rssi(src_id, dst_id, channel) for channel in channels]
+            for (src_id, dst_id) in zip(src_ids.tolist(), dst_ids.tolist())
+        ])
+        # the same values in both directions; the PDR is the one of the RSSI
+        for (i, (src_id, dst_id)) in enumerate(zip(src_ids, dst_ids)):
+            for (j, channel) in enumerate(channels):
+                assert matrix.get_rssi(dst_id, src_id, channel) == values[i, j]
+                assert matrix.get_pdr(src_id, dst_id, channel) == pytest.approx(
+                    matrix.rssi_pdr_table.get_pdr(values[i, j])
+                )
+        rssi.append(values)
+        matrix._update()
+    assert matrix.block_position <= 4
+
+    # an AR(1) process around the mean RSSI of each link
+    fading = np.array(rssi) - matrix.mean_rssi[np.newaxis, :, np.newaxis]
+    assert fading.mean() == pytest.approx(0.0, abs=0.5)
+    assert fading.std() == pytest.approx(matrix.fading_std, rel=0.1)
+    correlation = np.corrcoef(fading[:-1].ravel(), fading[1:].ravel())[0, 1]
+    assert correlation == pytest.approx(matrix.fading_correlation, abs=0.05)
+
+    # reseeding draws the next updates again, from the last one
+    last_rssi = matrix.fading_block['rssi'][matrix.block_position - 1].copy()
+    matrix.reseed()
+    assert matrix.fading_block is None
+    np.testing.assert_allclose(
+        matrix.fading_state + matrix.mean_rssi[:, np.newaxis],
+        last_rssi,
+        atol=1e-3
+    )
+    matrix._update()
+    assert matrix.block_position == 1
+
+    # the matrix is updated every conn_fading_period slots
+    u.run_until_end(engine)
+    logs = u.read_log_file([SimLog.LOG_CONN_MATRIX_FADING_UPDATE['type']])
+    assert len(logs) > 1
+    for log in logs:
+        assert log['asn_of_next_update'] % 50 == 0
+
+def test_pister_hack_max_distance(sim_engine):
+    # beyond get_max_distance(), the PDR is 0 even with the highest random
+    # part of the RSSI; the random topology only evaluates the motes within
+    # that distance
+    engine = sim_engine(diff_config={'exec_numMotes': 2})
+    pister_hack = PisterHackModel(engine)
+    src = {u'mote': engine.motes[0], u'coordinate': (0, 0)}
+    max_distance = pister_hack.get_max_distance(engine.motes)
+
+    rssi = pister_hack.compute_rssi_array(
+        src,
+        [engine.motes[1]] * 2,
+        np.array([[max_distance * 0.99, 0], [max_distance * 1.01, 0]]),
+        np.array([1.0, 1.0])
+    )
+    pdr = pister_hack.convert_rssi_to_pdr_array(rssi)
+    assert pdr[0] > 0
+    assert pdr[1] == 0
+
+    # same values as compute_rssi() for the same random value
+    engine.random.seed(1)
+    expected = pister_hack.compute_rssi(
+        src,
+        {u'mote': engine.motes[1], u'coordinate': (0.1, 0.2)}
+    )
+    engine.random.seed(1)
+    rssi = pister_hack.compute_rssi_array(
+        src,
+        [engine.motes[1]],
+        np.array([[0.1, 0.2]]),
+        np.array([engine.random.random()])
+    )
+    assert rssi[0] == pytest.approx(expected)
+    assert pister_hack.convert_rssi_to_pdr_array(rssi)[0] == pytest.approx(
+        pister_hack.convert_rssi_to_pdr(expected)
+    )
+
+    # the grid returns the values within a cell of the coordinate
+    grid = MoteGrid(max_distance)
+    grid.add((0, 0), 'near')
+    grid.add((max_distance * 2.5, 0), 'far')
+    assert grid.get_neighbor_candidates((max_distance * 0.9, 0)) == ['near']
+
+def test_vectorized_propagation(sim_engine):
+    sim_engine = sim_engine(
+        diff_config = {
+            'exec_numMotes'           : 3,
+            'exec_numSlotframesPerRun': 100,
+            'conn_class'              : 'Linear',
+        }
+    )
+    # conn_vectorized_propagation
+    sim_engine.connectivity.vectorized_propagation = True
+    sim_engine.connectivity.np_random = np.random.default_rng(0)
+
+    u.run_until_end(sim_engine)
+
+    assert len(u.read_log_file([SimLog.LOG_TSCH_TXDONE['type']])) > 0
+
+#=== verify propagate only runs in slots where some radio is active
+
+def test_propagate_active_slots_only(sim_engine):
+    sim_engine = sim_engine(
+        diff_config = {
+            'exec_numMotes'           : 2,
+            'exec_numSlotframesPerRun': 10,
+            'conn_class'              : 'Linear',
+            'secjoin_enabled'         : False,
+        }
+    )
+
+    # short-hands
+    root  = sim_engine.motes[0]
+    hop_1 = sim_engine.motes[1]
+
+    # force hop_1 to synchronize, so that it stops listening in every slot
+    eb = root.tsch._create_EB()
+    hop_1.tsch._action_receiveEB(eb)
+    hop_1.tsch._perform_synchronization()
+    hop_1.engine.removeFutureEvent((hop_1.id, 'tsch', 'wait_eb'))
+
+    # count the calls to propagate, and the active radios in each call
+    num_active_radios = []
+    _propagate = sim_engine.connectivity.propagate
+    def propagate():
+        num_active_radios.append(len(sim_engine.connectivity.active_mote_ids))
+        _propagate()
+    sim_engine.connectivity.propagate = propagate
+
+    u.run_until_end(sim_engine)
+
+    # propagate is never called without an active radio, and not in every slot
+    assert len(num_active_radios) > 0
+    assert min(num_active_radios) > 0
+    assert len(num_active_radios) < sim_engine.getAsn()
+
+
 #=== test for ConnectivityRandom
 class TestRandom(object):
 
@@ -6,6 +6,7 @@ import datetime as dt
 import gzip
 import json
 import os
+import pickle
 
 import pytest
 
@@ -85,6 +86,91 @@ def test_free_run(sim_engine):
                 assert ConnectivityMatrixBase.LINK_NONE['rssi'] <= rssi <= 0
 
 
+def test_trace_cache(sim_engine, tmpdir):
+    """ verify the converted trace is cached and gives the same matrix """
+
+    engine = sim_engine(
+        diff_config = {
+            'exec_numMotes': get_num_motes(),
+            'conn_class'   : 'K7',
+            'conn_trace'   : TRACE_FILE_PATH,
+            'phy_numChans' : len(get_channels())
+        }
+    )
+    matrix = engine.connectivity.matrix
+
+    # conn_trace_cache_dir
+    engine.settings.conn_trace_cache_dir = str(tmpdir)
+    converted = ConnectivityMatrixK7(engine.connectivity)
+    assert len(tmpdir.listdir()) == 1
+    cached = ConnectivityMatrixK7(engine.connectivity)
+    assert len(tmpdir.listdir()) == 1
+
+    for name in converted.trace:
+        assert (cached.trace[name] == converted.trace[name]).all()
+    for new_matrix in [converted, cached]:
+        assert (new_matrix.links.pdr == matrix.links.pdr).all()
+        assert (new_matrix.links.rssi == matrix.links.rssi).all()
+        assert new_matrix.trace_position == matrix.trace_position
+
+    # the rows of the first update are the first appearance of each link
+    assert (matrix.trace['asn'][:matrix.trace_position] == 0).all()
+    assert matrix.asn_of_next_update > 0
+
+    # another slot duration gives other ASNs, in another cache
+    engine.settings.tsch_slotDuration *= 2
+    ConnectivityMatrixK7(engine.connectivity)
+    assert len(tmpdir.listdir()) == 2
+
+
+def test_trace_streaming(sim_engine):
+    """ verify the streamed trace gives the same matrix as the whole trace """
+
+    engine = sim_engine(
+        diff_config = {
+            'exec_numMotes': get_num_motes(),
+            'conn_class'   : 'K7',
+            'conn_trace'   : TRACE_FILE_PATH,
+            'phy_numChans' : len(get_channels())
+        }
+    )
+    matrix = engine.connectivity.matrix
+
+    # conn_trace_streaming, conn_trace_read_ahead
+    engine.settings.conn_trace_streaming = True
+    engine.settings.conn_trace_read_ahead = 100
+    streamed = ConnectivityMatrixK7(engine.connectivity)
+    assert len(streamed.trace['asn']) == 100
+    assert (streamed.links.pdr == matrix.links.pdr).all()
+    assert streamed.trace_position == matrix.trace_position
+
+    # a pickled reader goes on from the same row
+    reader = pickle.loads(pickle.dumps(streamed.trace_reader))
+    rows = reader.read(10)
+    assert rows['src_id'].tolist() == (
+        matrix.trace['src_id'][
+            streamed.trace_offset + 100:streamed.trace_offset + 110
+        ].tolist()
+    )
+
+    for _ in range(50):
+        assert streamed.asn_of_next_update == matrix.asn_of_next_update
+        engine.asn = matrix.asn_of_next_update
+        for m in [matrix, streamed]:
+            m._update()
+        assert (streamed.links.pdr == matrix.links.pdr).all()
+        assert (streamed.links.rssi == matrix.links.rssi).all()
+        assert streamed.trace_position == matrix.trace_position
+
+    # the streamed matrix only holds the rows read ahead
+    logs = u.read_log_file([SimLog.LOG_CONN_MATRIX_K7_UPDATE['type']])
+    assert logs[-1]['read_ahead_position'] == (
+        streamed.trace_offset + len(streamed.trace['asn'])
+    )
+    assert logs[-1]['read_ahead_position'] <= logs[-1]['end_trace_position'] + 100
+    assert len(streamed.trace['asn']) <= 100
+
+
 @pytest.fixture(params=['short', 'equal', 'long'])
 def fixture_test_type(request):
     return request.param
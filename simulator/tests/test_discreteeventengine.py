@@ -1,7 +1,14 @@
 from __future__ import absolute_import
 from builtins import range
 from builtins import object
-from SimEngine import SimEngine
+import json
+import random
+
+from SimEngine import SimConfig,   \
+                      SimContext,  \
+                      SimEngine,   \
+                      SimLog,      \
+                      SimSettings
 import SimEngine.Mote.MoteDefines as d
 from . import test_utils as u
 
@@ -98,3 +105,313 @@ def test_event_order_at_same_asn():
         engine.join()
 
         assert result == [1, 2, 3]
+
+def test_idle_asns_are_skipped():
+    # the engine jumps straight to the next ASN having events instead of
+    # visiting every ASN in between
+    result = []
+
+    def _callback():
+        result.append(engine.getAsn())
+
+    engine = SimEngine.DiscreteEventEngine()
+    engine.scheduleAtAsn(10, _callback, 'first_event', 0)
+    engine.scheduleAtAsn(10**9, _callback, 'second_event', 0)
+
+    engine.start()
+    engine.join()
+
+    assert result == [10, 10**9]
+    assert engine.numEventsProcessed == 2
+
+def test_removed_and_rescheduled_events():
+    # removing or rescheduling events leaves stale ASNs behind in the
+    # heap; they must not be executed nor executed twice
+    result = []
+
+    def _callback_1():
+        result.append((engine.getAsn(), 1))
+
+    def _callback_2():
+        result.append((engine.getAsn(), 2))
+
+    engine = SimEngine.DiscreteEventEngine()
+    engine.scheduleAtAsn(5, _callback_1, 'event_1', 0)
+    engine.scheduleAtAsn(3, _callback_2, 'event_2', 0)
+    # reschedule event_1 later, then back at the same ASN
+    engine.scheduleAtAsn(8, _callback_1, 'event_1', 0)
+    engine.scheduleAtAsn(5, _callback_1, 'event_1', 0)
+    # remove event_2
+    engine.removeFutureEvent('event_2')
+    assert engine.is_scheduled('event_1')
+    assert not engine.is_scheduled('event_2')
+
+    engine.start()
+    engine.join()
+
+    assert result == [(5, 1)]
+
+def test_schedule_in_current_slot():
+    # an event scheduled in the ASN being executed runs after the
+    # callbacks of the current intraSlotOrder, at its own intraSlotOrder
+    result = []
+
+    def _callback_0():
+        result.append(0)
+        engine.scheduleInCurrentSlot(_callback_2, 'event_2', 2)
+
+    def _callback_1():
+        result.append(1)
+
+    def _callback_2():
+        result.append(2)
+
+    def _callback_3():
+        result.append(3)
+
+    engine = SimEngine.DiscreteEventEngine()
+    engine.scheduleAtAsn(1, _callback_0, 'event_0', 0)
+    engine.scheduleAtAsn(1, _callback_1, 'event_1', 1)
+    engine.scheduleAtAsn(1, _callback_3, 'event_3', 3)
+
+    engine.start()
+    engine.join()
+
+    assert result == [0, 1, 2, 3]
+    assert engine.numEventsProcessed == 4
+
+def test_lock_free():
+    # in lock-free mode the engine hands out NullLocks, and events are
+    # executed as usual
+    result = []
+
+    def _callback():
+        result.append(engine.getAsn())
+
+    engine = SimEngine.DiscreteEventEngine()
+    assert not isinstance(engine.create_lock(), SimEngine.NullLock)
+    engine.lockFree = True
+    engine.dataLock = engine.create_lock()
+    assert isinstance(engine.dataLock, SimEngine.NullLock)
+
+    engine.scheduleAtAsn(1, _callback, 'first_event', 0)
+    engine.scheduleAtAsn(2, _callback, 'second_event', 0)
+
+    engine.start()
+    engine.join()
+
+    assert result == [1, 2]
+
+def test_timer_wheel():
+    # timers fire at their ASN and intraSlotOrder, from any level of the
+    # wheel; re-armed and cancelled timers fire once or not at all
+    result = []
+
+    def _callback(name):
+        def _cb():
+            result.append((engine.getAsn(), name))
+        return _cb
+
+    engine = SimEngine.DiscreteEventEngine()
+    engine.scheduleAtAsn(300, _callback('event'), 'event', 2)
+    engine.scheduleTimerAtAsn(300, _callback('timer_300'), 'timer_300', 1)
+    engine.scheduleTimerAtAsn(5, _callback('timer_5'), 'timer_5', 0)
+    engine.scheduleTimerAtAsn(256, _callback('timer_256'), 'timer_256', 0)
+    engine.scheduleTimerAtAsn(70000, _callback('timer_70000'), 'timer_70000', 0)
+    engine.scheduleTimerAtAsn(10**7, _callback('timer_10**7'), 'timer_10**7', 3)
+    # re-arm, cancel
+    engine.scheduleTimerAtAsn(6, _callback('rearmed'), 'rearmed', 0)
+    engine.scheduleTimerAtAsn(65536, _callback('rearmed'), 'rearmed', 0)
+    engine.scheduleTimerAtAsn(1000, _callback('cancelled'), 'cancelled', 0)
+    assert engine.is_scheduled('cancelled')
+    engine.removeFutureEvent('cancelled')
+    assert not engine.is_scheduled('cancelled')
+    # a regular event replaces a timer with the same tag
+    engine.scheduleTimerAtAsn(7, _callback('replaced'), 'replaced', 0)
+    engine.scheduleAtAsn(8, _callback('replaced'), 'replaced', 0)
+
+    engine.start()
+    engine.join()
+
+    assert result == [
+        (5,       'timer_5'),
+        (8,       'replaced'),
+        (256,     'timer_256'),
+        (300,     'timer_300'),
+        (300,     'event'),
+        (65536,   'rearmed'),
+        (70000,   'timer_70000'),
+        (10**7,   'timer_10**7'),
+    ]
+
+def test_timer_wheel_batches():
+    # timers expiring at the same ASN and intraSlotOrder fire in a single
+    # engine event, in the order they were armed
+    result = []
+
+    def _callback(i):
+        def _cb():
+            result.append(i)
+            if engine.getAsn() < 1000:
+                engine.scheduleTimerAtAsn(engine.getAsn() + 100, _cb, i, 0)
+        return _cb
+
+    engine = SimEngine.DiscreteEventEngine()
+    for i in range(10):
+        engine.scheduleTimerAtAsn(100, _callback(i), i, 0)
+
+    engine.start()
+    engine.join()
+
+    assert result == list(range(10)) * 10
+    # one event per batch, and the cascades of the wheel
+    assert engine.numEventsProcessed < 20
+
+def create_engine(log_root_dir, **settings):
+    # an engine with its own context, whatever singletons earlier tests left
+    sim_config = SimConfig.SimConfig(u.CONFIG_FILE_PATH)
+    config = sim_config.settings['regular']
+    config['exec_numMotes']   = 3
+    config['exec_randomSeed'] = 1
+    config['conn_class']      = 'Linear'
+    config.update(**settings)
+
+    sim_settings = SimSettings.SimSettings.create(
+        log_root_dir = log_root_dir,
+        **config
+    )
+    sim_settings.setLogDirectory('convergence')
+    sim_settings.setCombinationKeys([])
+    sim_log = SimLog.SimLog.create(sim_settings)
+    sim_log.set_log_filters('all')
+    context = SimContext.SimContext(sim_settings, sim_log)
+
+    return SimEngine.SimEngine.create(context, run_id=0)
+
+def run_and_read_logs(engine):
+    engine.start()
+    engine.join()
+    engine.context.sim_log.destroy()
+    with open(engine.settings.getOutputFile(), 'r') as f:
+        return [json.loads(line) for line in f]
+
+def filter_logs(logs, log_type):
+    return [log for log in logs if log['_type'] == log_type['type']]
+
+def test_convergence_early_termination(tmpdir, monkeypatch):
+    # the run ends once every mote joined and the network is stable over two
+    # windows of exec_convergenceNumSlotframes slotframes
+
+    # an earlier test may have left random.random() returning a constant
+    monkeypatch.setattr(random, 'random', random._inst.random)
+
+    num_slotframes = 5
+    engine = create_engine(
+        str(tmpdir),
+        exec_numSlotframesPerRun      = 1000,
+        exec_convergenceNumSlotframes = num_slotframes,
+        exec_convergenceTolerance     = 0.1,
+    )
+    logs = run_and_read_logs(engine)
+
+    converged = filter_logs(logs, SimLog.LOG_SIMULATOR_CONVERGED)
+
+    assert len(converged) == 1
+    result = converged[0]['result']
+    assert result['slotframe'] < 1000
+    assert result['num_slotframes'] == num_slotframes
+    assert result['tolerance'] == 0.1
+    assert sorted(result['metrics']) == ['dio_rate', 'pbusy', 'queue']
+
+    end = filter_logs(logs, SimLog.LOG_SIMULATOR_END)
+    assert len(end) == 1
+    assert end[0]['result']['slotframe'] == result['slotframe']
+    assert engine.getAsn() < 1000 * engine.settings.tsch_slotframeLength
+
+def test_convergence_not_joined(tmpdir, monkeypatch):
+    # the run goes on to its end while a mote has not joined
+
+    # an earlier test may have left random.random() returning a constant
+    monkeypatch.setattr(random, 'random', random._inst.random)
+
+    num_slotframes_per_run = 300
+    engine = create_engine(
+        str(tmpdir),
+        exec_numSlotframesPerRun      = num_slotframes_per_run,
+        exec_convergenceNumSlotframes = 5,
+        exec_convergenceTolerance     = 0.1,
+    )
+    # mote 2 can't hear mote 1, the only one in its range
+    engine.connectivity.matrix.set_links_both_directions([1], [2], 0.0, -1000)
+
+    logs = run_and_read_logs(engine)
+
+    assert filter_logs(logs, SimLog.LOG_SIMULATOR_CONVERGED) == []
+    assert len(filter_logs(logs, SimLog.LOG_SIMULATOR_END)) == 1
+    assert engine.joined_motes < engine.settings.exec_numMotes
+    assert engine.getAsn() == (
+        num_slotframes_per_run * engine.settings.tsch_slotframeLength
+    )
+
+def test_convergence_unstable(tmpdir):
+    # the windows must be within exec_convergenceTolerance of each other
+    num_slotframes = 5
+    engine = create_engine(
+        str(tmpdir),
+        exec_convergenceNumSlotframes = num_slotframes,
+        exec_convergenceTolerance     = 0.1,
+    )
+    engine.joined_motes = engine.settings.exec_numMotes
+
+    # (DIOs sent so far, mean queue length, mean pbusy) of each slotframe
+    samples = []
+    engine._get_convergence_sample = lambda: samples[-1]
+    def check(sample):
+        samples.append(sample)
+        return engine._check_convergence(len(samples))
+
+    # the mean queue length triples after slotframe 6: the network is only
+    # stable once both windows are past it
+    reasons = [
+        check((i, 1.0 if i <= num_slotframes else 3.0, 0.5))
+        for i in range(3 * num_slotframes + 1)
+    ]
+    assert reasons[:-1] == [None] * 3 * num_slotframes
+    assert reasons[-1]['metrics'] == {'dio_rate': 1.0, 'queue': 3.0, 'pbusy': 0.5}
+    engine.context.sim_log.destroy()
+
+class ProfiledCallbacks(object):
+    def event(self):
+        pass
+    def timer(self):
+        pass
+
+def test_event_profiler():
+    # the callbacks are accounted for by qualified name and intraSlotOrder;
+    # the timers of a batch of the timer wheel separately from the batch
+    callbacks = ProfiledCallbacks()
+    engine = SimEngine.DiscreteEventEngine()
+    engine.profiler = SimEngine.EventProfiler()
+    for asn in [10, 20]:
+        engine.scheduleAtAsn(asn, callbacks.event, ('event', asn), 1)
+        for i in range(3):
+            engine.scheduleTimerAtAsn(asn, callbacks.timer, ('timer', asn, i), 2)
+
+    engine.start()
+    engine.join()
+
+    summary = engine.profiler.get_summary()
+    stats = dict(
+        ((callback['name'], callback['intraSlotOrder']), callback)
+        for callback in summary['callbacks']
+    )
+    assert stats[('ProfiledCallbacks.event', 1)]['count'] == 2
+    assert stats[('ProfiledCallbacks.timer', 2)]['count'] == 6
+    assert stats[('ProfiledCallbacks.timer', 2)]['events_per_asn'] == 3
+    assert stats[('TimerWheel._schedule_batch.<locals>._fire', 2)]['count'] == 2
+    assert summary['num_asns'] == 2
+    assert summary['num_events'] == 10
+    assert summary['max_events_per_asn'] == 5
+    assert summary['total_s'] == sum(
+        callback['total_s'] for callback in summary['callbacks']
+    )
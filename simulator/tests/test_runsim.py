@@ -1,8 +1,78 @@
+import json
 import os
+import shutil
 import subprocess
 
+import pytest
+
+from . import test_utils as u
+from SimEngine import SimLog
+from bin import runSim
+
 #============================ helpers =========================================
 
+BIN_DIR = os.path.join(u.ROOT_DIR, 'bin')
+
+def write_config(tmpdir, numRuns):
+    with open(u.CONFIG_FILE_PATH, 'r') as f:
+        config = json.load(f)
+    config['execution']['numRuns'] = numRuns
+    config['settings']['combination'] = {'exec_numMotes': [2, 3]}
+    config['settings']['regular']['exec_numSlotframesPerRun'] = 20
+    config['settings']['regular']['exec_randomSeed'] = 'run_id'
+    config_path = str(tmpdir.join('config.json'))
+    with open(config_path, 'w') as f:
+        json.dump(config, f)
+    return config_path
+
+def run_sweep(config_path, log_directory_name):
+    # runSim.py with --resume runs a sweep in the given log directory, which
+    # is created when it doesn't exist yet
+    output = subprocess.check_output(
+        [
+            'python', 'runSim.py',
+            '--config', config_path,
+            '--resume', log_directory_name
+        ],
+        cwd = BIN_DIR,
+    )
+    return output.decode('utf-8')
+
+def read_manifest(folder_path):
+    with open(os.path.join(folder_path, 'manifest.jsonl'), 'r') as f:
+        return [json.loads(line) for line in f]
+
+def read_run_ids(file_path):
+    # run_id of each run of a merged dataset, given by its random seed line
+    with open(file_path, 'r') as f:
+        logs = [json.loads(line) for line in f]
+    return [
+        log['_run_id'] for log in logs
+        if log.get('_type') == SimLog.LOG_SIMULATOR_RANDOM_SEED['type']
+    ]
+
+def create_task(conn_class, units, run_id=0):
+    # 'units' saves RunCostModel from creating the settings of the task
+    return {
+        'simParam':    {'conn_class': conn_class},
+        'simParamNum': 0,
+        'run_id':      run_id,
+        'units':       units,
+    }
+
+class RecordedRuns(object):
+    # stands for the SweepManifest of runTasks()
+    def __init__(self):
+        self.tasks = []
+    def record(self, task, result):
+        self.tasks.append(task)
+
+def run_task_in_test(cpuID, task, verbose):
+    # stands for runTask() in the workers of runTasks()
+    if task['simParam']['conn_class'] == 'Failing':
+        raise ValueError('run {0} failed'.format(task['run_id']))
+    return {'seed': 0, 'outputFile': None, 'start': 0, 'end': 0}
+
 #============================ tests ===========================================
 
 def test_runSim():
@@ -14,3 +84,142 @@ def test_runSim():
     )
     os.chdir(wd)
     assert rc==0
+
+def test_runSim_resume(tmpdir):
+    log_directory_name = 'test_resume_{0}'.format(os.getpid())
+    folder_path = os.path.join(BIN_DIR, 'simData', log_directory_name)
+    try:
+        # a sweep of two runs per combination
+        run_sweep(write_config(tmpdir, numRuns=2), log_directory_name)
+        assert len(read_manifest(folder_path)) == 2 * 2 + 2
+        merged = {} # merged dataset -> content after the first sweep
+        for num_motes in [2, 3]:
+            file_path = os.path.join(
+                folder_path,
+                'exec_numMotes_{0}.dat'.format(num_motes)
+            )
+            assert read_run_ids(file_path) == [0, 1]
+            with open(file_path, 'rb') as f:
+                merged[file_path] = f.read()
+
+        # a run interrupted partway through its output file
+        content = merged[os.path.join(folder_path, 'exec_numMotes_2.dat')]
+        tail = content[:len(content) // 2]
+        os.makedirs(os.path.join(folder_path, 'exec_numMotes_3'))
+        output_file_path = os.path.join(
+            folder_path,
+            'exec_numMotes_3',
+            'output_cpu0.dat'
+        )
+        with open(output_file_path, 'wb') as f:
+            f.write(tail)
+
+        # a merge interrupted partway through the merged dataset
+        with open(os.path.join(folder_path, 'exec_numMotes_2.dat'), 'ab') as f:
+            f.write(tail)
+
+        # resume with a third run per combination
+        output = run_sweep(write_config(tmpdir, numRuns=3), log_directory_name)
+        assert '4/6 runs already completed' in output
+
+        # only the missing runs were simulated
+        manifest = read_manifest(folder_path)
+        runs = [
+            (entry['combination']['exec_numMotes'], entry['run_id'])
+            for entry in manifest[2 * 2 + 2:] if entry['type'] == 'run'
+        ]
+        assert sorted(runs) == [(2, 2), (3, 2)]
+
+        # the partial tails were removed: the merged datasets go on from
+        # their last merge and have each run once
+        for (file_path, content) in merged.items():
+            with open(file_path, 'rb') as f:
+                assert f.read(len(content)) == content
+            assert read_run_ids(file_path) == [0, 1, 2]
+        assert not os.path.exists(os.path.dirname(output_file_path))
+    finally:
+        shutil.rmtree(folder_path, ignore_errors=True)
+
+def test_run_cost_model_file(tmpdir):
+    file_path = str(tmpdir.join('run_times.json'))
+    task = {'simParam': {'conn_class': 'Linear'}, 'units': 10}
+
+    # the history is written as a whole, and read back
+    cost_model = runSim.RunCostModel(file_path)
+    cost_model.record(task, 5.0)
+    cost_model.save()
+    assert tmpdir.listdir() == [tmpdir.join('run_times.json')]
+    assert runSim.RunCostModel(file_path).estimate(task) == 5.0
+
+    # an unreadable history, such as one cut off, is an empty one
+    with open(file_path, 'r') as f:
+        content = f.read()
+    with open(file_path, 'w') as f:
+        f.write(content[:len(content) // 2])
+    cost_model = runSim.RunCostModel(file_path)
+    assert cost_model.history == {}
+    assert cost_model.estimate(task) == 10
+
+def test_run_cost_model(tmpdir):
+    cost_model = runSim.RunCostModel(str(tmpdir.join('run_times.json')))
+
+    # without any run recorded, the estimate is the number of units
+    assert cost_model.estimate(create_task('Linear', 5)) == 5
+
+    # the time per unit of each group of settings
+    cost_model.record(create_task('Linear', 10), 10.0)
+    cost_model.record(create_task('K7', 10), 1.0)
+    assert cost_model.estimate(create_task('Linear', 5)) == 5.0
+    assert cost_model.estimate(create_task('K7', 20)) == 2.0
+    # a group without runs gets the time per unit of all the runs
+    assert cost_model.estimate(create_task('Random', 30)) == 30 * 11.0 / 20
+
+    # a recorded run updates the time per unit of its group
+    cost_model.record(create_task('Linear', 10), 20.0)
+    assert cost_model.history[json.dumps(['Linear', None, None, None])] == [30.0, 20]
+    assert cost_model.estimate(create_task('Linear', 5)) == 7.5
+    assert cost_model.estimate(create_task('K7', 20)) == 2.0
+
+def test_run_tasks_order(tmpdir, monkeypatch):
+    # the task with the longest expected wall time runs first
+    monkeypatch.setattr(runSim, 'runTask', run_task_in_test)
+    cost_model = runSim.RunCostModel(str(tmpdir.join('run_times.json')))
+    cost_model.record(create_task('Linear', 10), 10.0)
+    cost_model.record(create_task('K7', 10), 1.0)
+    tasks = [
+        create_task('K7',     20, run_id=0), # 2s
+        create_task('Linear',  5, run_id=1), # 5s
+        create_task('Random', 30, run_id=2), # 16.5s
+        create_task('Linear',  1, run_id=3), # 1s
+    ]
+    recorded_runs = RecordedRuns()
+
+    runSim.runTasks(
+        tasks     = tasks,
+        numCPUs   = 1,
+        manifest  = recorded_runs,
+        costModel = cost_model
+    )
+
+    assert [task['run_id'] for task in recorded_runs.tasks] == [2, 1, 0, 3]
+    # the runs were recorded, and saved
+    assert runSim.RunCostModel(cost_model.file_path).history == cost_model.history
+    assert cost_model.history[json.dumps(['Random', None, None, None])][1] == 30
+
+def test_run_tasks_error(tmpdir, monkeypatch):
+    # the exception of a run in a worker is raised by runTasks()
+    monkeypatch.setattr(runSim, 'runTask', run_task_in_test)
+    cost_model = runSim.RunCostModel(str(tmpdir.join('run_times.json')))
+    recorded_runs = RecordedRuns()
+
+    with pytest.raises(ValueError, match='run 1 failed'):
+        runSim.runTasks(
+            tasks     = [
+                create_task('Linear', 10, run_id=0),
+                create_task('Failing', 5, run_id=1),
+            ],
+            numCPUs   = 2,
+            manifest  = recorded_runs,
+            costModel = cost_model
+        )
+    assert [task['run_id'] for task in recorded_runs.tasks] in [[], [0]]
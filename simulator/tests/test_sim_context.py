@@ -0,0 +1,72 @@
+from __future__ import absolute_import
+
+import json
+
+from . import test_utils as u
+from SimEngine import SimConfig,   \
+                      SimContext,  \
+                      SimEngine,   \
+                      SimLog,      \
+                      SimSettings, \
+                      Connectivity
+
+#============================ helpers =========================================
+
+def create_engine(log_root_dir, log_directory):
+    sim_config = SimConfig.SimConfig(u.CONFIG_FILE_PATH)
+    config = sim_config.settings['regular']
+    config['exec_numMotes']            = 3
+    config['exec_numSlotframesPerRun'] = 20
+    config['exec_randomSeed']          = 1
+    config['conn_class']               = 'Linear'
+
+    settings = SimSettings.SimSettings.create(
+        log_root_dir = log_root_dir,
+        **config
+    )
+    settings.setLogDirectory(log_directory)
+    settings.setCombinationKeys([])
+    sim_log = SimLog.SimLog.create(settings)
+    sim_log.set_log_filters('all')
+    context = SimContext.SimContext(settings, sim_log)
+
+    return SimEngine.SimEngine.create(context, run_id=0)
+
+def read_logs(engine):
+    with open(engine.settings.getOutputFile(), 'r') as f:
+        return [json.loads(line) for line in f]
+
+#============================ tests ===========================================
+
+def test_independent_engines(tmpdir):
+    # two engines with their own context run side by side in the same
+    # process, without creating any singleton
+    engines = [
+        create_engine(str(tmpdir), 'engine_{0}'.format(i)) for i in range(2)
+    ]
+
+    for cls in [
+            SimSettings.SimSettings,
+            SimLog.SimLog,
+            Connectivity.Connectivity,
+            SimEngine.SimEngine
+        ]:
+        assert cls._init is False
+
+    assert engines[0].motes[0].engine is engines[0]
+    assert engines[1].motes[0].engine is engines[1]
+    assert engines[0].connectivity is not engines[1].connectivity
+    assert engines[0].random is not engines[1].random
+
+    for engine in engines:
+        engine.start()
+    for engine in engines:
+        engine.join()
+        engine.context.sim_log.destroy()
+
+    # same settings, same seed: the same simulation
+    logs = [read_logs(engine) for engine in engines]
+    assert len(logs[0]) > 0
+    for log in logs:
+        del log[0][u'logDirectory']
+    assert logs[0] == logs[1]
@@ -0,0 +1,317 @@
+from __future__ import absolute_import
+
+import json
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from . import test_utils as u
+from SimEngine import SimConfig,   \
+                      SimContext,  \
+                      SimEngine,   \
+                      SimLog,      \
+                      SimSettings, \
+                      LogColumns,  \
+                      LogFormat
+
+#============================ helpers =========================================
+
+def create_engine(log_root_dir, log_directory, run_id=0, **diff_config):
+    sim_config = SimConfig.SimConfig(u.CONFIG_FILE_PATH)
+    config = sim_config.settings['regular']
+    config['exec_numMotes']            = 3
+    config['exec_numSlotframesPerRun'] = 20
+    config['exec_randomSeed']          = 1
+    config['conn_class']               = 'Linear'
+    config.update(**diff_config)
+
+    settings = SimSettings.SimSettings.create(
+        run_id       = run_id,
+        log_root_dir = log_root_dir,
+        **config
+    )
+    settings.setLogDirectory(log_directory)
+    settings.setCombinationKeys([])
+    sim_log = SimLog.SimLog.create(settings)
+    sim_log.set_log_filters('all')
+    context = SimContext.SimContext(settings, sim_log)
+
+    return SimEngine.SimEngine.create(context, run_id=run_id)
+
+def read_logs(engine):
+    with open(engine.settings.getOutputFile(), 'r') as f:
+        return [json.loads(line) for line in f]
+
+#============================ tests ===========================================
+
+def test_async_writer(tmpdir):
+    # the lines are in the file once flushed, in order
+    file_path = str(tmpdir.join('output.dat'))
+    writer = SimLog.AsyncLogWriter(file_path, batch_size=3, queue_size=1)
+    for i in range(10):
+        writer.write(u'{0}\n'.format(i))
+    writer.flush()
+    with open(file_path, 'r') as f:
+        assert f.read() == u''.join(u'{0}\n'.format(i) for i in range(10))
+    assert writer.tell() == 20
+
+    writer.close()
+    assert writer.closed
+
+def test_async_writer_error(tmpdir):
+    # an error of the writing thread is raised by flush()
+    writer = SimLog.AsyncLogWriter(str(tmpdir.join('output.dat')))
+    writer.write(b'not a line')
+    with pytest.raises(TypeError):
+        writer.flush()
+
+    # close() closes the file and raises the error again
+    with pytest.raises(TypeError):
+        writer.close()
+    assert writer.closed
+    assert not writer.thread.is_alive()
+
+def test_async_simlog(tmpdir):
+    # log_async_writer gives the same log file
+    engines = [
+        create_engine(str(tmpdir), 'sync'),
+        create_engine(str(tmpdir), 'async', log_async_writer=True),
+    ]
+    assert isinstance(
+        engines[1].context.sim_log.log_output_file,
+        SimLog.AsyncLogWriter
+    )
+
+    for engine in engines:
+        engine.start()
+        engine.join()
+        engine.context.sim_log.destroy()
+
+    logs = [read_logs(engine) for engine in engines]
+    assert len(logs[0]) > 0
+    for log in logs:
+        del log[0][u'logDirectory']
+    del logs[1][0][u'log_async_writer']
+    assert logs[0] == logs[1]
+
+def test_lazy_content(tmpdir):
+    # the content of a line is only built when its type is enabled
+    engine = create_engine(str(tmpdir), 'lazy')
+    sim_log = engine.context.sim_log
+    sim_log.set_log_filters([SimLog.LOG_APP_TX['type']])
+    assert sim_log.is_enabled(SimLog.LOG_APP_TX)
+    assert not sim_log.is_enabled(SimLog.LOG_APP_RX)
+    assert engine.motes[0].log_enabled(SimLog.LOG_APP_TX)
+
+    def content():
+        raise AssertionError('content of a disabled type')
+    sim_log.log(SimLog.LOG_APP_RX, content)
+
+    sim_log.log(
+        SimLog.LOG_APP_TX,
+        lambda: {u'_mote_id': 1, u'packet': {u'type': u'DATA'}}
+    )
+    sim_log.set_log_filters('all')
+    assert sim_log.is_enabled(SimLog.LOG_APP_RX)
+    sim_log.destroy()
+
+    logs = read_logs(engine)
+    assert logs[-1][u'_type'] == SimLog.LOG_APP_TX['type']
+    assert logs[-1][u'packet'] == {u'type': u'DATA'}
+    assert SimLog.LOG_APP_RX['type'] not in [log[u'_type'] for log in logs]
+
+def test_binary_log(tmpdir):
+    # log_format 'binary' gives the same lines
+    engines = [
+        create_engine(str(tmpdir), 'json'),
+        create_engine(str(tmpdir), 'binary', log_format='binary'),
+    ]
+    for engine in engines:
+        engine.start()
+        engine.join()
+        # values JSON doesn't give back as they are
+        engine.context.sim_log.log(
+            SimLog.LOG_APP_TX,
+            {
+                u'_mote_id': 1,
+                u'packet':   {u'd': {3: 4}, u't': (1, 2), u'f': (1.5,)},
+            }
+        )
+        engine.context.sim_log.destroy()
+
+    file_paths = [engine.settings.getOutputFile() for engine in engines]
+    assert LogFormat.get_file_format(file_paths[0]) == LogFormat.FORMAT_JSON
+    assert LogFormat.get_file_format(file_paths[1]) == LogFormat.FORMAT_BINARY
+    logs = [list(LogFormat.read_log_file(file_path)) for file_path in file_paths]
+    assert logs[0] == read_logs(engines[0])
+    for log in logs:
+        del log[0][u'logDirectory']
+    del logs[1][0][u'log_format']
+    assert logs[0] == logs[1]
+    assert logs[1][-1][u'packet'] == {
+        u'd': {u'3': 4},
+        u't': [1, 2],
+        u'f': [1.5],
+    }
+
+    # binary log files can be concatenated
+    concatenated = str(tmpdir.join('concatenated.dat'))
+    with open(concatenated, 'wb') as f:
+        for _ in range(2):
+            with open(file_paths[1], 'rb') as binary_file:
+                f.write(binary_file.read())
+    assert len(list(LogFormat.read_log_file(concatenated))) == 2 * len(logs[1])
+
+def test_compressed_log(tmpdir):
+    # log_compression writes a gzip member per run, listed in the index
+    def run(engine):
+        engine.start()
+        engine.join()
+        engine.context.sim_log.destroy()
+        return engine.settings.getOutputFile()
+
+    for log_format in ['json', 'binary']:
+        log_directory = 'gzip-' + log_format
+        plain_logs = list(LogFormat.read_log_file(run(create_engine(
+            str(tmpdir),
+            'plain-' + log_format,
+            log_format=log_format
+        ))))
+        for run_id in [0, 1]:
+            file_path = run(create_engine(
+                str(tmpdir),
+                log_directory,
+                run_id=run_id,
+                log_format=log_format,
+                log_compression='gzip'
+            ))
+        assert LogFormat.is_compressed(file_path)
+        assert LogFormat.get_file_format(file_path) == log_format
+
+        index = LogFormat.read_index(file_path)
+        assert [entry['run_id'] for entry in index] == [0, 1]
+        assert index[0]['offset'] == 0
+        assert index[1]['offset'] == index[0]['length']
+
+        logs = list(LogFormat.read_log_file(file_path, run_id=0))
+        for log in [plain_logs[0], logs[0]]:
+            del log[u'logDirectory']
+            del log[u'log_format']
+        del logs[0][u'log_compression']
+        assert logs == plain_logs
+        logs = list(LogFormat.read_log_file(file_path))
+        assert set(log[u'_run_id'] for log in logs) == set([0, 1])
+        assert list(LogFormat.read_log_file(file_path, run_id=1)) == [
+            log for log in logs if log[u'_run_id'] == 1
+        ]
+
+        # compressed log files are merged by appending them, and their index
+        merged_file_path = str(tmpdir.join('merged-' + log_format + '.dat'))
+        for _ in range(2):
+            with open(merged_file_path, 'ab') as merged_file:
+                LogFormat.append_log_file(file_path, merged_file)
+        assert len(LogFormat.read_index(merged_file_path)) == 4
+        assert list(LogFormat.read_log_file(merged_file_path, run_id=1)) == 2 * [
+            log for log in logs if log[u'_run_id'] == 1
+        ]
+
+def test_columnar_log(tmpdir):
+    # log_columnar stores the lines by log type, in columns
+    engine = create_engine(str(tmpdir), 'columnar', log_columnar=True)
+    engine.start()
+    engine.join()
+    engine.context.sim_log.destroy()
+
+    logs = read_logs(engine)[1:]
+    columns_dir = LogColumns.get_columns_dir(engine.settings.getOutputFile())
+    assert LogColumns.get_run_ids(columns_dir) == [0]
+
+    for log_type in set(log[u'_type'] for log in logs):
+        lines = [log for log in logs if log[u'_type'] == log_type]
+        columns = LogColumns.read_columns(columns_dir, log_type)
+        assert len(columns[u'_asn']) == len(lines)
+        assert list(columns[u'_asn']) == [line[u'_asn'] for line in lines]
+    assert u'_type' not in columns
+
+    # nested keys are flattened, and only the given keys are loaded
+    lines = [
+        log for log in logs
+        if log[u'_type'] == SimLog.LOG_TSCH_TXDONE[u'type']
+    ]
+    columns = LogColumns.read_columns(
+        columns_dir,
+        SimLog.LOG_TSCH_TXDONE[u'type'],
+        keys=[u'_mote_id', u'packet.type']
+    )
+    assert sorted(columns.keys()) == [u'_mote_id', u'packet.type']
+    assert columns[u'_mote_id'].dtype == np.int64
+    assert list(columns[u'packet.type']) == [
+        line[u'packet'][u'type'] for line in lines
+    ]
+
+    # merging moves the columns of the runs
+    merged_file_path = str(tmpdir.join('merged.dat'))
+    LogColumns.merge_columns(engine.settings.getOutputFile(), merged_file_path)
+    assert LogColumns.get_run_ids(columns_dir) == []
+    assert LogColumns.get_run_ids(
+        LogColumns.get_columns_dir(merged_file_path)
+    ) == [0]
+
+def test_columnar_chunks(tmpdir):
+    # the lines are moved to temporary files every log_columnar_chunk_size
+    # lines of a type, without changing the columns
+    engines = [
+        create_engine(str(tmpdir), 'one-chunk', log_columnar=True),
+        create_engine(
+            str(tmpdir),
+            'chunks',
+            log_columnar=True,
+            log_columnar_chunk_size=7
+        ),
+    ]
+    for engine in engines:
+        engine.start()
+        engine.join()
+    sink = engines[1].context.sim_log.columns
+    assert max(len(rows) for rows in sink.rows.values()) < 7
+    parts_dir = sink.parts_dir
+    assert len(os.listdir(parts_dir)) > 0
+
+    # a snapshot holds the chunks, not their temporary files
+    state = pickle.loads(pickle.dumps(sink)).__dict__
+    assert state['parts_dir'] is None
+    assert all(
+        isinstance(columns, dict)
+        for chunks in state['chunks'].values() for (columns, _) in chunks
+    )
+
+    for engine in engines:
+        engine.context.sim_log.destroy()
+    assert not os.path.exists(parts_dir)
+
+    columns_dirs = [
+        LogColumns.get_columns_dir(engine.settings.getOutputFile())
+        for engine in engines
+    ]
+    log_types = sorted(os.listdir(os.path.join(columns_dirs[0], '0')))
+    assert log_types == sorted(os.listdir(os.path.join(columns_dirs[1], '0')))
+    for file_name in log_types:
+        log_type = file_name[:-len(LogColumns.FILE_EXTENSION)]
+        columns = [
+            LogColumns.read_columns(columns_dir, log_type)
+            for columns_dir in columns_dirs
+        ]
+        assert sorted(columns[0]) == sorted(columns[1])
+        for key in columns[0]:
+            assert columns[0][key].dtype == columns[1][key].dtype
+            np.testing.assert_array_equal(columns[0][key], columns[1][key])
+
+def test_columns_types():
+    # the type of a column follows its values
+    assert LogColumns._to_array([True, False]).dtype == bool
+    assert LogColumns._to_array([1, True]).dtype == np.int64
+    assert np.isnan(LogColumns._to_array([1, 2.5, None])[2])
+    assert list(LogColumns._to_array([u'a', None])) == [u'"a"', u'null']
+    assert list(LogColumns._to_array([[1, 2]])) == [u'[1, 2]']
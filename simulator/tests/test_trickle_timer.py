@@ -111,8 +111,8 @@ def test_reset(sim_engine):
     trickle_timer.start()
 
     # get ASN of 't' and one of the end of the interval
-    original_event_at_t = sim_engine.uniqueTagSchedule[trickle_timer.unique_tag_base + '_at_t']
-    original_event_at_end_of_interval = sim_engine.uniqueTagSchedule[trickle_timer.unique_tag_base + '_at_i']
+    original_event_at_t = sim_engine.timerWheel.timers[trickle_timer.unique_tag_base + '_at_t']
+    original_event_at_end_of_interval = sim_engine.timerWheel.timers[trickle_timer.unique_tag_base + '_at_i']
 
     u.run_until_asn(sim_engine, sim_engine.getAsn() + 1)
 
@@ -123,8 +123,8 @@ def test_reset(sim_engine):
     assert trickle_timer.interval == Imin
     # events should be re-scheduled accordingly
 
-    assert original_event_at_t is not sim_engine.uniqueTagSchedule[trickle_timer.unique_tag_base + '_at_t']
-    assert original_event_at_end_of_interval is not sim_engine.uniqueTagSchedule[trickle_timer.unique_tag_base + '_at_i']
+    assert original_event_at_t is not sim_engine.timerWheel.timers[trickle_timer.unique_tag_base + '_at_t']
+    assert original_event_at_end_of_interval is not sim_engine.timerWheel.timers[trickle_timer.unique_tag_base + '_at_i']
 
 
 def test_stop(sim_engine):
@@ -137,10 +137,10 @@ def test_stop(sim_engine):
     def _callback():
         pass
 
-    # remove all the scheduled events
-    sim_engine.events = {}
     trickle_timer = TrickleTimer(Imin, Imax, K, _callback)
     trickle_timer.start()
-    assert len(list(sim_engine.events.keys())) == 2
+    assert sim_engine.is_scheduled(trickle_timer.unique_tag_base + '_at_t')
+    assert sim_engine.is_scheduled(trickle_timer.unique_tag_base + '_at_i')
     trickle_timer.stop()
-    assert len(list(sim_engine.events.keys())) == 0
+    assert not sim_engine.is_scheduled(trickle_timer.unique_tag_base + '_at_t')
+    assert not sim_engine.is_scheduled(trickle_timer.unique_tag_base + '_at_i')
@@ -26,7 +26,7 @@ def fixture_neighbor_mac_addr(request):
 def test_add(sim_engine, fixture_neighbor_mac_addr):
     sim_engine = sim_engine() # need for log
 
-    slotframe = SlotFrame(None, 1, 101)
+    slotframe = SlotFrame(None, 1, 101, sim_engine.log)
     cell = Cell(0, 0, all_options_on, fixture_neighbor_mac_addr)
     slotframe.add(cell)
 
@@ -51,7 +51,7 @@ def test_delete_cell(sim_engine):
     sim_engine = sim_engine() # need for log
 
     neighbor_mac_addr = 'test_mac_addr'
-    slotframe = SlotFrame(None, 1, 101)
+    slotframe = SlotFrame(None, 1, 101, sim_engine.log)
     cell = Cell(0, 0, all_options_on, neighbor_mac_addr)
 
     assert slotframe.get_cells_by_mac_addr(neighbor_mac_addr) == []
@@ -71,7 +71,7 @@ def test_delete_cell(sim_engine):
 def test_add_cells_for_same_mac_addr(sim_engine):
     sim_engine = sim_engine() # need for log
 
-    slotframe = SlotFrame(None, 1, 101)
+    slotframe = SlotFrame(None, 1, 101, sim_engine.log)
 
     cell_1 = Cell(1, 5, [d.CELLOPTION_TX], 'test_mac_addr_1')
     cell_2 = Cell(51, 10, [d.CELLOPTION_RX], 'test_mac_addr_1')
@@ -91,7 +91,7 @@ def test_add_cells_for_same_mac_addr(sim_engine):
 def test_add_cells_at_same_slot_offset(sim_engine):
     sim_engine = sim_engine() # need for log
 
-    slotframe = SlotFrame(None, 1, 101)
+    slotframe = SlotFrame(None, 1, 101, sim_engine.log)
 
     cell_1 = Cell(1, 5, [d.CELLOPTION_TX], 'test_mac_addr_1')
     cell_2 = Cell(1, 5, [d.CELLOPTION_RX], 'test_mac_addr_2')
@@ -233,7 +233,7 @@ def fixture_num_cells(request):
 def test_print_slotframe(sim_engine, fixture_num_cells):
     sim_engine = sim_engine() # need for log
 
-    slotframe = SlotFrame(None, 1, 101)
+    slotframe = SlotFrame(None, 1, 101, sim_engine.log)
     # install cells
     for i in range(fixture_num_cells):
         slot_offset = i
@@ -287,7 +287,7 @@ def test_slotframe_get_cells_filtered(sim_engine):
     neighbor_mac_addr_1 = 'test_mac_addr_1'
     neighbor_mac_addr_2 = 'test_mac_addr_2'
     neighbor_mac_addr_3 = None
-    slotframe = SlotFrame(None, 1, 101)
+    slotframe = SlotFrame(None, 1, 101, sim_engine.log)
 
     # create cells
     cell_tx_1 = Cell(0, 0, [d.CELLOPTION_TX], neighbor_mac_addr_1)
@@ -325,7 +325,7 @@ def test_slotframe_get_available_slots(sim_engine):
 
     neighbor_mac_addr_1 = 'test_mac_addr_1'
     neighbor_mac_addr_2 = 'test_mac_addr_2'
-    slotframe = SlotFrame(None, 1, 101)
+    slotframe = SlotFrame(None, 1, 101, sim_engine.log)
 
     # create cells
     cell_tx_1 = Cell(0, 0, [d.CELLOPTION_TX], neighbor_mac_addr_1)
@@ -345,7 +345,7 @@ def test_slotframe_set_length_without_cells(sim_engine):
     """
     sim_engine = sim_engine() # need for log
 
-    slotframe = SlotFrame(None, 1, 101)
+    slotframe = SlotFrame(None, 1, 101, sim_engine.log)
 
     # decrease the slotframe length
     new_length = 50
@@ -365,7 +365,7 @@ def test_slotframe_set_length_with_cells(sim_engine):
 
     neighbor_mac_addr_1 = 'test_mac_addr_1'
     neighbor_mac_addr_2 = 'test_mac_addr_2'
-    slotframe = SlotFrame(None, 1, 101)
+    slotframe = SlotFrame(None, 1, 101, sim_engine.log)
 
     # create cells
     cell_0  = Cell(0,  0, [d.CELLOPTION_TX], neighbor_mac_addr_1)